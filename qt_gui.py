@@ -11,20 +11,24 @@ from matplotlib.widgets import SpanSelector
 import matplotlib
 import matplotlib.patches
 import sys
-import wave
-import struct
+import math
+import collections
 import numpy as np
-import shutil
 import os
-import time
 from PyQt4 import QtGui, QtCore
-from tlm2wav_utils import Telemetry, LEFT, RIGHT, META, CALIB, TIME
+from tlm2wav_utils import Telemetry, LEFT, RIGHT, META, CALIB, TIME, STEREO, \
+    PITCH
+import tlm2wav_render
 import pyaudio
 import threading
-import enum
+import logging
 
 __author__ = 'Don D.S.'
 
+# Отладочные сообщения проигрывателя (в callback-функции PyAudio - не
+# выводятся: ввод-вывод там задерживает подачу фреймов)
+log = logging.getLogger(__name__)
+
 
 class MainWindow(QtGui.QWidget):
     """Главное окно программы
@@ -34,8 +38,19 @@ class MainWindow(QtGui.QWidget):
         # - родительский класс
         QtGui.QWidget.__init__(self)
 
-        # Имя аудиофайла по умолчанию
-        self._tmp_outfile = 'tmp_output.wav'
+        # Последний созданный звук (tlm2wav_render.Sound) - в памяти,
+        # в файл записывается только при сохранении
+        self.sound = None
+        # Кэш созданных звуков - повторно с теми же параметрами звук
+        # не создаётся
+        self.sound_cache = tlm2wav_render.SoundCache()
+        # Звук, вычисляемый во время воспроизведения, и его ключ
+        # (см. _sound_key)
+        self._live_sound = None
+        self._live_key = None
+        # Звук видимого участка графика (см. play_range) - воспроизводится
+        # вместо звука всей записи до остановки
+        self.preview = None
         # Размер иконок на кнопках
         btn_iconsize = 24
         # Высота progress-bar'а
@@ -58,7 +73,11 @@ class MainWindow(QtGui.QWidget):
             get_multiplier=lambda: self.multiplier,
             get_framerate=lambda: self.framerate,
             get_sampwidth=lambda: self.sampwidth,
-            get_outfile=lambda: self.tmp_outfile)
+            get_wave_format=lambda: self.wave_format,
+            get_interpolation=lambda: self.interpolation,
+            get_pitch=lambda: self.pitch,
+            get_previous=lambda: self.sound,
+            sound_cache=self.sound_cache)
         # Соединить сигналы завершения потока с обработкой
         self.connect(self.make_sound_thread,
                      QtCore.SIGNAL("finished()"), self._make_sound_finished)
@@ -69,9 +88,21 @@ class MainWindow(QtGui.QWidget):
         self.connect(self.make_sound_thread,
                      QtCore.SIGNAL("progress(QString)"), self.set_progress)
 
+        # Поток загрузки телеметрии
+        # --------------------------------------------
+        self.load_tlm_thread = LoadTlmThread()
+        self.connect(self.load_tlm_thread,
+                     QtCore.SIGNAL("started()"), self._load_tlm_start)
+        self.connect(self.load_tlm_thread,
+                     QtCore.SIGNAL("finished()"), self._load_tlm_finished)
+        self.connect(self.load_tlm_thread,
+                     QtCore.SIGNAL("progress(int)"), self.set_progress)
+        self.connect(self.load_tlm_thread,
+                     QtCore.SIGNAL("progress(QString)"), self.set_progress)
+
         # Установить параметры основного окна
         # ----------------------------------------------------------
-        self.setFixedSize(450, 400)  # вместо resize - чтобы запретить
+        self.setFixedSize(450, 430)  # вместо resize - чтобы запретить
         #  изменение размера окна
         self.setWindowTitle('Конвертер телеметрии')
         self.setWindowIcon(QtGui.QIcon('icons/Icon_34.ico'))
@@ -99,7 +130,7 @@ class MainWindow(QtGui.QWidget):
         self.btn_make_snd.setToolTip('Создать аудиофайл из телеметрической информации')
         self.btn_make_snd.setDisabled(True)
         self.connect(self.btn_make_snd,
-                     QtCore.SIGNAL('clicked()'), self.make_sound_thread.start)
+                     QtCore.SIGNAL('clicked()'), self.make_sound)
         # - прервать создание (перекрывает создать)
         self.btn_abort = QtGui.QPushButton('', self)
         self.btn_abort.setIcon(QtGui.QIcon(
@@ -146,6 +177,15 @@ class MainWindow(QtGui.QWidget):
         self.txt_multiplier = QtGui.QLineEdit('')
         self.txt_multiplier.setValidator(QtGui.QIntValidator(1, 9999))
         self.txt_multiplier.setText('200')
+        # - диапазон частот тона в режиме высоты тона, Гц
+        self.spn_pitch_min = QtGui.QSpinBox(self)
+        self.spn_pitch_max = QtGui.QSpinBox(self)
+        for spn, value in zip((self.spn_pitch_min, self.spn_pitch_max),
+                              tlm2wav_render.PITCH_RANGE):
+            spn.setRange(20, 20000)
+            spn.setSuffix(' Гц')
+            spn.setValue(int(value))
+            spn.setEnabled(False)
 
         # Выпадающие списки:
         # ------------------------------
@@ -163,6 +203,13 @@ class MainWindow(QtGui.QWidget):
         self.lst_mode.addItem('Усреднение', LEFT | RIGHT)
         self.lst_mode.addItem('По левой рамке', LEFT)
         self.lst_mode.addItem('По правой рамке', RIGHT)
+        self.lst_mode.addItem('Стерео: левая и правая рамки', STEREO)
+        self.lst_mode.addItem('Высота тона: усреднение', PITCH | LEFT | RIGHT)
+        self.lst_mode.addItem('Высота тона: по левой рамке', PITCH | LEFT)
+        self.lst_mode.addItem('Высота тона: по правой рамке', PITCH | RIGHT)
+        self.lst_mode.addItem('Высота тона: стерео', PITCH | STEREO)
+        self.connect(self.lst_mode, QtCore.SIGNAL('currentIndexChanged(int)'),
+                     self._mode_changed)
         # - частота дискретизации
         self.lst_framerate = QtGui.QComboBox(self)
         self.lst_framerate.addItem('8000 Гц (телефон)', 8000)
@@ -175,10 +222,51 @@ class MainWindow(QtGui.QWidget):
         self.lst_framerate.setCurrentIndex(3)
         # - глубина звучания (бит в сэмпле)
         self.lst_sampwidth = QtGui.QComboBox(self)
-        self.lst_sampwidth.addItem('8 бит', 1)
-        self.lst_sampwidth.addItem('16 бит', 2)
-        self.lst_sampwidth.addItem('32 бит', 4)
+        # Данные элементов - ключи tlm2wav_render.SAMPLE_FORMATS
+        self.lst_sampwidth.addItem('8 бит', '8')
+        self.lst_sampwidth.addItem('16 бит', '16')
+        self.lst_sampwidth.addItem('24 бит', '24')
+        self.lst_sampwidth.addItem('32 бит', '32')
+        self.lst_sampwidth.addItem('32 бит (float)', 'float32')
         self.lst_sampwidth.setCurrentIndex(1)
+        # - интерполяция телеметрии между отсчётами
+        #   (данные элементов - ключи tlm2wav_render.INTERPOLATIONS)
+        self.lst_interpolation = QtGui.QComboBox(self)
+        self.lst_interpolation.addItem('Линейная (быстро)', 'linear')
+        self.lst_interpolation.addItem('Кубическая (Эрмита)', 'cubic')
+        self.lst_interpolation.addItem('Sinc (ограничение полосы)', 'sinc')
+        self.lst_interpolation.setCurrentIndex(0)
+        # - скорость воспроизведения (меняется во время воспроизведения,
+        #   без пересоздания звука)
+        self.lst_speed = QtGui.QComboBox(self)
+        for speed in (0.25, 0.5, 1.0, 2.0, 4.0, 8.0):
+            self.lst_speed.addItem('Скорость \u00d7{0:g}'.format(speed), speed)
+        self.lst_speed.setCurrentIndex(2)
+        self.lst_speed.setToolTip(
+            'Скорость воспроизведения относительно созданного звука')
+        self.connect(self.lst_speed, QtCore.SIGNAL('currentIndexChanged(int)'),
+                     self._speed_changed)
+
+        # Флажки:
+        # ------------------------------
+        # - слежение за дописываемым файлом телеметрии
+        self.chk_follow = QtGui.QCheckBox('Следить за файлом', self)
+        self.chk_follow.setToolTip(
+            'Дочитывать данные, дописываемые в файл телеметрии во время опыта')
+        self.connect(self.chk_follow,
+                     QtCore.SIGNAL('toggled(bool)'), self._follow_toggled)
+        # - воспроизведение без создания звука
+        self.chk_live = QtGui.QCheckBox('Воспроизводить сразу', self)
+        self.chk_live.setToolTip(
+            'Вычислять звук из телеметрии во время воспроизведения, '
+            'не дожидаясь создания аудиофайла')
+        self.connect(self.chk_live,
+                     QtCore.SIGNAL('toggled(bool)'), self._live_toggled)
+        # Таймер проверки дописанных в файл данных
+        self._follow_timer = QtCore.QTimer(self)
+        self._follow_timer.setInterval(1000)
+        self.connect(self._follow_timer,
+                     QtCore.SIGNAL('timeout()'), self._follow_update)
 
         # Текст:
         # ------------------------------
@@ -200,6 +288,16 @@ class MainWindow(QtGui.QWidget):
         self.lbl_sampwidth = QtGui.QLabel('Глубина звучания:')
         self.lbl_sampwidth.setAlignment(
             QtCore.Qt.AlignRight | QtCore.Qt.AlignVCenter)
+        self.lbl_interpolation = QtGui.QLabel('Интерполяция:')
+        self.lbl_interpolation.setAlignment(
+            QtCore.Qt.AlignRight | QtCore.Qt.AlignVCenter)
+        self.lbl_pitch = QtGui.QLabel('Диапазон тона:')
+        self.lbl_pitch.setAlignment(
+            QtCore.Qt.AlignRight | QtCore.Qt.AlignVCenter)
+        # - объём загруженной телеметрии
+        self.lbl_tlm_info = QtGui.QLabel('')
+        self.lbl_tlm_info.setAlignment(
+            QtCore.Qt.AlignRight | QtCore.Qt.AlignVCenter)
 
         # Перекрывающиеся виджеты - демонстрируются поочерёдно
         # ----------------------------------------------------------------
@@ -214,6 +312,9 @@ class MainWindow(QtGui.QWidget):
         self.connect(self.slider,
                      QtCore.SIGNAL('sliderReleased()'),
                      self._slider_usr_released_handler)
+        self.connect(self.slider,
+                     QtCore.SIGNAL('sliderMoved(int)'),
+                     self._slider_usr_moved_handler)
         self.connect(self.slider,
                      QtCore.SIGNAL('valueChanged()'),
                      self._slider_val_changed_handler)
@@ -235,7 +336,7 @@ class MainWindow(QtGui.QWidget):
         # Поток воспроизведения аудиофайла
         # --------------------------------------------
         self.sound_player = QtSoundPlayer(
-            get_file_func=lambda: self.tmp_outfile,
+            get_sound_func=self.playback_source,
             get_start_pos_func=self.slider.value)
         self.connect(self.sound_player,
                      QtCore.SIGNAL('playing_ms(float)'),
@@ -274,6 +375,23 @@ class MainWindow(QtGui.QWidget):
         line += 1
         self.grid.addWidget(self.lbl_sampwidth, line, 0, 1, 2)
         self.grid.addWidget(self.lst_sampwidth, line, 2, 1, 2)
+        # интерполяция
+        line += 1
+        self.grid.addWidget(self.lbl_interpolation, line, 0, 1, 2)
+        self.grid.addWidget(self.lst_interpolation, line, 2, 1, 2)
+        # диапазон частот тона
+        line += 1
+        self.grid.addWidget(self.lbl_pitch, line, 0, 1, 2)
+        self.grid.addWidget(self.spn_pitch_min, line, 2)
+        self.grid.addWidget(self.spn_pitch_max, line, 3)
+        # слежение за файлом и объём загруженной телеметрии
+        line += 1
+        self.grid.addWidget(self.chk_follow, line, 0, 1, 2)
+        self.grid.addWidget(self.lbl_tlm_info, line, 2, 1, 2)
+        # воспроизведение без создания звука
+        line += 1
+        self.grid.addWidget(self.chk_live, line, 0, 1, 2)
+        self.grid.addWidget(self.lst_speed, line, 2, 1, 2)
         # Ползунок воспроизведения /    progress-bar
         line += 1
         self.grid.addWidget(self.slider_or_progress, line, 0, 1, 4)
@@ -300,6 +418,26 @@ class MainWindow(QtGui.QWidget):
         if tlm:
             self.btn_calib.setEnabled(True)
             self.btn_make_snd.setEnabled(True)
+            # Звук вычисляется во время воспроизведения - можно слушать
+            if self.live:
+                self._audio_btns_set_enabled(True)
+        self._update_tlm_info()
+        # Проверять дописанные данные, если файл открыт в режиме слежения
+        if tlm and tlm.following:
+            self._follow_timer.start()
+        else:
+            self._follow_timer.stop()
+
+    def _update_tlm_info(self):
+        # Отобразить объём загруженной телеметрии
+        if not self.telemetry:
+            self.lbl_tlm_info.setText('')
+            return
+        time = self.telemetry.get_tlm(TIME)
+        min = int(time[-1]/60)
+        sec = time[-1]-60*min
+        self.lbl_tlm_info.setText('{0} строк, {1:0=2}:{2:06.3f}'.format(
+            time.size, min, sec))
 
     @property
     def sens_left(self):
@@ -321,13 +459,42 @@ class MainWindow(QtGui.QWidget):
     def framerate(self):
         return self.lst_framerate.itemData(self.lst_framerate.currentIndex())
 
+    @property
+    def sample_format(self):
+        return tlm2wav_render.SAMPLE_FORMATS[
+            self.lst_sampwidth.itemData(self.lst_sampwidth.currentIndex())]
+
     @property
     def sampwidth(self):
-        return self.lst_sampwidth.itemData(self.lst_sampwidth.currentIndex())
+        return self.sample_format[0]
+
+    @property
+    def wave_format(self):
+        return self.sample_format[1]
 
     @property
-    def tmp_outfile(self):
-        return self._tmp_outfile
+    def live(self):
+        return self.chk_live.isChecked()
+
+    @property
+    def interpolation(self):
+        return self.lst_interpolation.itemData(
+            self.lst_interpolation.currentIndex())
+
+    @property
+    def speed(self):
+        return self.lst_speed.itemData(self.lst_speed.currentIndex())
+
+    @property
+    def pitch(self):
+        # Диапазон частот тона (наименьшая, наибольшая), Гц, в режиме высоты
+        # тона; None - значения телеметрии задают громкость
+        if not self.mode & PITCH:
+            return None
+        return (float(min(self.spn_pitch_min.value(),
+                          self.spn_pitch_max.value())),
+                float(max(self.spn_pitch_min.value(),
+                          self.spn_pitch_max.value())))
 
     @property
     def _str_playposition(self):
@@ -350,22 +517,85 @@ class MainWindow(QtGui.QWidget):
             "Text files (*.txt);;All Files (*)")
         if not filename:
             return
-
+        # Разобрать файл в отдельном потоке, отображая прогресс
+        self.load_tlm_thread.filename = filename
+        self.load_tlm_thread.follow = self.chk_follow.isChecked()
+        self.load_tlm_thread.observs = None
+        self.load_tlm_thread.start()
+
+    def _follow_toggled(self, checked):
+        # Включение/выключение слежения за файлом телеметрии
+        if not self.telemetry:
+            return
+        if not checked:
+            self._follow_timer.stop()
+        elif self.telemetry.following:
+            self._follow_timer.start()
+        elif not self.load_tlm_thread.isRunning():
+            # Перечитать открытый файл в режиме слежения,
+            # сохранив наблюдения (калибровочные интервалы)
+            self.load_tlm_thread.filename = self.telemetry.file
+            self.load_tlm_thread.follow = True
+            self.load_tlm_thread.observs = self.telemetry.observs
+            self.load_tlm_thread.start()
+
+    def _follow_update(self):
+        # Дочитать данные, дописанные в файл телеметрии
+        # (вызывается таймером в режиме слежения за файлом)
+        if not (self.telemetry and self.telemetry.following):
+            return
+        # Не изменять телеметрию, пока с ней работает поток создания аудио
+        if self.make_sound_thread.isRunning():
+            return
         try:
-            self.telemetry = Telemetry(filename)
-        except Exception as err:
+            nrows = self.telemetry.update()
+        except OSError:
+            return
+        if nrows == 0:
+            return
+        self._update_tlm_info()
+        # Дорисовать новые данные на графике
+        if self.calib_window:
+            if self.calib_window.isVisible():
+                self.calib_window.update_data()
+
+    def _load_tlm_start(self):
+        # Действия, выполняемые с началом загрузки телеметрии
+
+        # Переключить ползунок на прогресс-бар
+        self.slider_or_progress.setCurrentWidget(self.progressbar)
+        # Запретить открытие другого файла и создание аудиофайла до
+        # окончания загрузки
+        self.btn_file.setDisabled(True)
+        self.btn_make_snd.setDisabled(True)
+
+    def _load_tlm_finished(self):
+        # Действия, выполняемые по окончании потока загрузки телеметрии
+
+        # Переключить прогресс-бар на ползунок
+        self.slider_or_progress.setCurrentWidget(self.slider)
+        self.btn_file.setEnabled(True)
+        self.btn_make_snd.setEnabled(bool(self.telemetry))
+
+        filename = self.load_tlm_thread.filename
+        if self.load_tlm_thread.error is not None:
             flags = QtGui.QMessageBox.Retry
             flags |= QtGui.QMessageBox.Cancel
-            msg = "Не удалось открыть файл:\n" + str(err)
+            msg = "Не удалось открыть файл:\n" + str(
+                self.load_tlm_thread.error)
             response = QtGui.QMessageBox.warning(self, "Ошибка",
                                                  msg, flags)
             if response == QtGui.QMessageBox.Retry:
                 self.dlg_open()
+            return
 
-        if self.telemetry:
-            self.txt_file.setText(filename)
-            # Сохранить путь к последнему открытому файлу
-            self.lastfile = os.path.dirname(filename)
+        if self.load_tlm_thread.observs is not None:
+            self.load_tlm_thread.telemetry.observs = \
+                self.load_tlm_thread.observs
+        self.telemetry = self.load_tlm_thread.telemetry
+        self.txt_file.setText(filename)
+        # Сохранить путь к последнему открытому файлу
+        self.lastfile = os.path.dirname(filename)
 
         # Если открыто окно графика - обновить его
         if self.calib_window:
@@ -373,7 +603,7 @@ class MainWindow(QtGui.QWidget):
                 self.calib_window.update()
 
     def dlg_save(self):
-        """ Открыть файл телеметрии
+        """ Сохранить созданный звук в аудиофайл
         """
         # Получить имя файла для сохранения
         filename = QtGui.QFileDialog.getSaveFileName(
@@ -384,11 +614,9 @@ class MainWindow(QtGui.QWidget):
         # Если не указан файл - пользователь отменил сохранение
         if not filename:
             return
-        # Если выбран пересохраняемый файл - ничего не нужно делать.
-        if os.path.basename(filename) == self._tmp_outfile:
-            return
-        # Copy file to choosen destination
-        shutil.copyfile(self._tmp_outfile, filename)
+        # Звук всей записи (а не прослушиваемого участка) хранится в
+        # памяти (или вычисляется) - записать его в выбранный файл
+        self.record_sound().save(filename)
 
     def show_calib_window(self):
         if not self.calib_window:
@@ -400,6 +628,38 @@ class MainWindow(QtGui.QWidget):
             # # Перевести фокус, если показано
             # self.calib_window.activateWindow()
 
+    def _sound_key(self):
+        # Ключ кэша звука: содержимое телеметрии, интервалы калибровки и
+        # все параметры создания звука
+        return tlm2wav_render.SoundCache.key(
+            self.telemetry.content_key(),
+            list(self.telemetry.observs[CALIB]),
+            mode=self.mode,
+            sens_left=self.sens_left,
+            sens_right=self.sens_right,
+            multiplier=self.multiplier,
+            framerate=self.framerate,
+            sampwidth=self.sampwidth,
+            wave_format=self.wave_format,
+            interpolation=self.interpolation,
+            pitch=self.pitch and list(self.pitch))
+
+    def make_sound(self):
+        """ Создать звук из телеметрии (в потоке) или взять из кэша, если
+        звук с теми же параметрами уже создавался
+        """
+        key = self._sound_key()
+        sound = self.sound_cache.get(key)
+        if sound is None:
+            self.make_sound_thread.cache_key = key
+            self.make_sound_thread.start()
+            return
+        # Готовый звук - только активировать воспроизведение
+        self.sound = sound
+        self.btn_make_snd.setIcon(QtGui.QIcon('icons/appbar.sync.rest.png'))
+        self.btn_make_snd.setToolTip('Пересоздать аудиофайл')
+        self._audio_btns_set_enabled(True)
+
     def _make_sound_start(self):
         # Действия, выполняемые с началом создания аудиофайла
 
@@ -421,24 +681,74 @@ class MainWindow(QtGui.QWidget):
         self.btn_make_snd.setIcon(QtGui.QIcon('icons/appbar.sync.rest.png'))
         self.btn_make_snd.setToolTip('Пересоздать аудиофайл')
 
-        # Обновить состояние кнопок управления воспроизведением
-        # (в зависимости от успешности завершения потока создания)
+        # Принять созданный звук и обновить состояние кнопок управления
+        # воспроизведением (в зависимости от успешности завершения потока
+        # создания)
+        if not self.make_sound_thread.isaborted:
+            self.sound = self.make_sound_thread.sound
         self._audio_btns_set_enabled(not self.make_sound_thread.isaborted)
 
+    def playback_source(self):
+        """ Воспроизводимый звук: звук участка записи - при его
+        прослушивании (play_range), иначе - звук всей записи
+        (record_sound). None - воспроизводить нечего
+        """
+        if self.preview is not None:
+            return self.preview
+        return self.record_sound()
+
+    def record_sound(self):
+        """ Звук всей записи: вычисляемый во время воспроизведения
+        (tlm2wav_render.LiveSound) - в режиме "Воспроизводить сразу",
+        иначе - последний созданный. None - звук ещё не создан
+        """
+        if not (self.live and self.telemetry):
+            return self.sound
+        # Пересоздать источник только при изменении телеметрии,
+        # калибровки или параметров звука
+        key = self._sound_key()
+        if key != self._live_key:
+            tlm = self.telemetry
+            self._live_sound = tlm2wav_render.LiveSound(
+                tlm.sound_blocks(self.mode, self.sens_left, self.sens_right),
+                multiplier=self.multiplier,
+                framerate=self.framerate,
+                sampwidth=self.sampwidth,
+                wave_format=self.wave_format,
+                interpolation=self.interpolation,
+                pitch=self.pitch)
+            self._live_key = key
+        return self._live_sound
+
+    def _mode_changed(self, index):
+        # Диапазон частот тона задаётся только в режиме высоты тона
+        pitch = bool(self.mode & PITCH)
+        self.spn_pitch_min.setEnabled(pitch)
+        self.spn_pitch_max.setEnabled(pitch)
+
+    def _speed_changed(self, index):
+        # Новая скорость действует со следующей порции воспроизводимых фреймов
+        self.sound_player.speed = self.speed
+
+    def _live_toggled(self, checked):
+        # Переключение режима воспроизведения без создания звука
+        self.stop()
+        self._audio_btns_set_enabled(
+            self.playback_source() is not None)
+
     def get_timelength_ms(self):
-        """ Получить длину в милисекундах последнего созданного аудиофайла
+        """ Получить длину в милисекундах воспроизводимого звука
         """
-        if not os.path.exists(self.tmp_outfile):
+        source = self.playback_source()
+        if source is None:
             return 1
-        with wave.open(self.tmp_outfile, 'rb') as wav:
-            frames = wav.getnframes()
-            rate = wav.getframerate()
-            return frames / float(rate) * 1000
+        return source.duration_ms
 
     def _audio_btns_set_enabled(self, tf):
         # Активировать/деактивировать кнопки управления воспроизведением
         self.btn_playpause.setEnabled(tf)
-        self.btn_save.setEnabled(tf)
+        # Сохраняется только звук всей записи
+        self.btn_save.setEnabled(tf and self.record_sound() is not None)
         self.btn_stop.setEnabled(tf)
         self.slider.setEnabled(tf)
 
@@ -450,13 +760,19 @@ class MainWindow(QtGui.QWidget):
     def _slider_usr_released_handler(self):
         """ Вызывается после перетаскивания ползунка
         """
-        # ToDo: переаскивание ползунка не меняет текущей позиции восрпоизведения
         self._slider_update_tooltip()
-        # Если файл воспроизводился - перезапустить с новой позиции
-        if self.sound_player.is_playing():
-            self.sound_player.start()
+        # Продолжить воспроизведение (или паузу) с новой позиции
+        self.sound_player.seek(self.slider.value())
         print("slider released (by user)")
 
+    def _slider_usr_moved_handler(self, pos_ms):
+        """ Вызывается при перетаскивании ползунка: воспроизведение
+        следует за ползунком (перенос курсора, поток не пересоздаётся)
+        """
+        self._slider_update_tooltip()
+        if self.sound_player.is_playing():
+            self.sound_player.seek(pos_ms)
+
     def _slider_val_changed_handler(self):
         self._slider_update_tooltip()
         print("slider value changed (from inside)")
@@ -480,6 +796,9 @@ class MainWindow(QtGui.QWidget):
         """ Установить текущее положение воспроизведения на ползунке
         """
         # print('slider position update!')
+        if self.slider.isSliderDown():
+            # Положение задаёт пользователь, перетаскивающий ползунок
+            return
         self.slider.setValue(int(pos_ms))
         self._slider_update_tooltip()
 
@@ -487,42 +806,181 @@ class MainWindow(QtGui.QWidget):
         if self.sound_player.is_playing():
             self.sound_player.pause()
         else:
+            if self.live:
+                # Параметры звука могли измениться - обновить длину ползунка
+                self.slider.setMaximum(self.get_timelength_ms())
             self.sound_player.play()
 
+    def play_region(self, tstart, tend, loop=False):
+        """ Воспроизвести участок записи (например, калибровочный
+        интервал) - из того же звука, без пересоздания
+
+        :param tstart: начало участка - момент телеметрии, с
+        :param tend:   конец участка - момент телеметрии, с
+        :param loop:   повторять участок по кругу
+        """
+        if self.preview is not None:
+            # Интервал - время всей записи, а не участка
+            self.stop()
+        source = self.playback_source()
+        if source is None:
+            return
+        # Позиция участка - по множителю, с которым создан воспроизводимый
+        # звук (множитель в поле ввода мог измениться после создания)
+        multiplier = source.multiplier or self.multiplier
+        start_ms = tlm2wav_render.sound_ms(tstart, multiplier)
+        end_ms = tlm2wav_render.sound_ms(tend, multiplier)
+        self.slider.setValue(int(start_ms))
+        self.sound_player.play_region(start_ms, end_ms, loop)
+
+    def play_range(self, tstart, tend):
+        """ Создать звук только участка записи (например, видимого на
+        графике) при текущих установках и сразу воспроизвести его.
+        Телеметрия участка выбирается двоичным поиском по времени, поэтому
+        время создания зависит от длины участка, а не всей записи.
+        Громкость (высота тона) нормируется по участку.
+
+        :param tstart: начало участка - момент телеметрии, с
+        :param tend:   конец участка - момент телеметрии, с
+        """
+        tlm = self.telemetry
+        if not tlm:
+            return
+        tint = [tstart, tend]
+        try:
+            times = tlm.get_tlm(TIME, tints=tint)
+            values = tlm.sound_values(self.mode, self.sens_left,
+                                      self.sens_right, tints=tint)
+        except ValueError:
+            # Нет телеметрии на участке
+            return
+        if times.size < 2:
+            return
+        # Звук участка начинается с его начала
+        times = times - min(tstart, tend)
+        params = dict(multiplier=self.multiplier,
+                      framerate=self.framerate,
+                      sampwidth=self.sampwidth,
+                      wave_format=self.wave_format,
+                      interpolation=self.interpolation,
+                      pitch=self.pitch)
+        self.stop()
+        if self.live:
+            self.preview = tlm2wav_render.LiveSound(times, values, **params)
+        else:
+            self.preview = tlm2wav_render.render_sound(times, values,
+                                                       **params)
+        self._audio_btns_set_enabled(True)
+        self.slider.setValue(0)
+        self.sound_player.play()
+
     def stop(self):
         self.sound_player.stop()
+        self.sound_player.clear_region()
+        if self.preview is not None:
+            # Вернуться к звуку всей записи
+            self.preview = None
+            self._audio_btns_set_enabled(self.playback_source() is not None)
         self.slider.setSliderPosition(0)
         print('called MainWindow.stop()')
 
+    def closeEvent(self, event):
+        # Освободить устройство воспроизведения при закрытии окна
+        self.sound_player.close()
+        QtGui.QWidget.closeEvent(self, event)
+
 
 class SoundPlayer(object):
-    """ Плеер wav-файлов
+    """ Плеер звука: созданного в памяти (tlm2wav_render.Sound) или
+    вычисляемого во время воспроизведения (tlm2wav_render.LiveSound).
+    Фреймы читаются из звука по запросу потока воспроизведения - с позиции
+    курсора
+
+    Экземпляр PyAudio и поток воспроизведения создаются один раз (поток -
+    заново только при смене формата звука): остановка и пауза лишь
+    приостанавливают поток, а переход к другой позиции (seek) - перенос
+    курсора, который callback-функция подхватывает со следующей порции
+    фреймов.
+
+    Позиция воспроизведения определяется по фреймам, переданным
+    callback-функцией, и времени, когда их первый фрейм прозвучит на
+    выходе устройства (output_buffer_dac_time) - без отдельного таймера.
+
+    Скорость воспроизведения (speed) можно менять во время
+    воспроизведения: звук передискретизируется в callback-функции
+    (Sound.read_speed), пересоздавать его не нужно.
+
+    Воспроизведение можно ограничить областью звука (set_region,
+    play_region) - с повтором по кругу: по достижении конца области
+    курсор переносится в её начало прямо в callback-функции.
     """
-    def __init__(self, file, start_pos=0):
+    # Число последних порций фреймов, по которым определяется позиция
+    CLOCK_BUFFERS = 64
+
+    def __init__(self, sound, start_pos=0):
         """ Создать объект воспроизведения
-        :param file:        - путь к файлу
+        :param sound:       - звук (tlm2wav_render.Sound или LiveSound)
         :param start_pos:   - начальная позиция, милисекунд
         """
         object.__init__(self)
         # public:
-        self.file = file
+        self.sound = sound
         self.start_pos = start_pos
+        # Скорость воспроизведения: 1 - исходная, 2 - вдвое быстрее
+        self.speed = 1.0
         # private:
         self._pyaudio = None
         self._audiostream = None
-        self._data = []
-        self._sampwidth = None
-        self._nchannels = None
-        self._playtimer = ResumableTimer(1, self._timer_callback)
-
-    def _timer_callback(self):
-        """ Функцция вызывается таймером каждый такт
-        Переопределять в класах-потомках для дополнения
-        """
-        pass
+        # Формат открытого потока: (формат сэмплов, каналов, частота)
+        self._stream_format = None
+        # Задержка вывода открытого потока, секунд
+        self._latency = 0.0
+        # Номер следующего воспроизводимого фрейма (при скорости, отличной
+        # от 1, - дробный). Изменяется под блокировкой: callback-функцией
+        # (в потоке PyAudio) и seek()
+        self._cursor = 0
+        self._cursor_lock = threading.Lock()
+        # Часы воспроизведения - последние переданные порции фреймов
+        # (покрывают задержку вывода): (время вывода первого фрейма порции
+        # по часам потока, участки звука порции [(первый фрейм, число
+        # фреймов вывода), ...], скорость). Пусто - фреймы с начальной
+        # позиции ещё не передавались
+        self._clock = collections.deque(maxlen=self.CLOCK_BUFFERS)
+        # Область воспроизведения: (начало, конец, мс, повторять) или None -
+        # весь звук
+        self._region = None
+        # Воспроизведение приостановлено паузой (продолжается с курсора)
+        self._paused = False
 
     def get_playing_time_ms(self):
-        return self.start_pos + self._playtimer.time_elapsed*1000
+        """ Текущая позиция воспроизведения, мс - звучащий сейчас фрейм
+        """
+        sound = self.sound
+        with self._cursor_lock:
+            clock = list(self._clock)
+        if not clock or sound is None:
+            return self.start_pos
+        if self.is_playing():
+            now = self._audiostream.get_time()
+        else:
+            # Поток доиграл - позиция в конце последней порции
+            now = float('inf')
+        # Звучит последняя порция, вывод которой уже начался
+        for dac_time, segments, speed in reversed(clock):
+            if dac_time <= now:
+                break
+        else:
+            # Ещё звучит то, что было до запуска (перехода)
+            return self.start_pos
+        # Фреймов вывода, прозвучавших с начала порции (дальше переданной
+        # порции часы не уходят)
+        elapsed = (now - dac_time) * sound.framerate
+        for first, count in segments:
+            frame = first + min(elapsed, count) * speed
+            if elapsed < count:
+                break
+            elapsed -= count
+        return frame / float(sound.framerate) * 1000
 
     def is_playing(self):
         if self._audiostream:
@@ -531,55 +989,100 @@ class SoundPlayer(object):
             return False
 
     def play(self):
-        # Поток ещё не создан и не запущен
-        if self._audiostream is None:
-            print('SoundPlayer: создать новый поток')
-            self._run_new_stream()
-            return
-        # Поток создан, но остановлен паузой
-        if self._audiostream.is_stopped():
-            print('SoundPlayer: продолжить поток')
-            # продолжить выполнение потока
+        # Продолжить после паузы - с позиции курсора
+        if self._paused and self._audiostream is not None:
+            log.debug('SoundPlayer: продолжить поток')
+            self._paused = False
             self._audiostream.start_stream()
-            self._playtimer.resume()
             return
-        # Старый поток доиграл
-        if not self._audiostream.is_active():
-            print('SoundPlayer: Старый поток доиграл')
-            # Остановить старый потоку
-            self.stop()
-            # Запустить новый
-            self._run_new_stream()
+        # Поток уже играет сейчас
+        if self.is_playing():
             return
-        # Остальные ситуации: поток уже играет сейчас
+        # Начать воспроизведение с начальной позиции (поток - прежний,
+        # если формат звука не изменился)
+        log.debug('SoundPlayer: воспроизвести с начальной позиции')
+        self._run_new_stream()
+
+    def seek(self, pos_ms):
+        """ Перейти к позиции воспроизведения, мс
+
+        Поток воспроизведения не пересоздаётся: callback-функция продолжит
+        с новой позиции со следующей порции фреймов. Если воспроизведение
+        остановлено - позиция будет начальной при следующем запуске.
+        """
+        self.start_pos = pos_ms
+        sound = self.sound
+        if sound is None:
+            return
+        with self._cursor_lock:
+            self._cursor = int(pos_ms / 1000.0 * sound.framerate)
+            # До следующей порции фреймов позиция - новая
+            self._clock.clear()
+
+    def set_region(self, start_ms, end_ms, loop=False):
+        """ Ограничить воспроизведение областью звука
+
+        :param start_ms: начало области, мс
+        :param end_ms:   конец области, мс
+        :param loop:     повторять область по кругу (иначе -
+                         воспроизведение заканчивается в конце области)
+        """
+        with self._cursor_lock:
+            self._region = (min(start_ms, end_ms), max(start_ms, end_ms),
+                            loop)
+
+    def clear_region(self):
+        """ Воспроизводить весь звук
+        """
+        with self._cursor_lock:
+            self._region = None
+
+    def play_region(self, start_ms, end_ms, loop=False):
+        """ Воспроизвести область звука с её начала (см. set_region)
+        """
+        self.set_region(start_ms, end_ms, loop)
+        self.start_pos = min(start_ms, end_ms)
+        if self.is_playing() or self._paused:
+            self.seek(self.start_pos)
+        self.play()
 
     def stop(self):
-        print('called SoundPlayer.stop()')
+        log.debug('called SoundPlayer.stop()')
+        if self._audiostream is not None \
+                and not self._audiostream.is_stopped():
+            # Поток приостанавливается, но не закрывается
+            self._audiostream.stop_stream()
+        self._paused = False
+        with self._cursor_lock:
+            self._cursor = 0
+            self._clock.clear()
+
+    def pause(self):
+        log.debug('called SoundPlayer.pause()')
+        if self.is_playing():
+            # Остановка потока доигрывает переданные фреймы - позиция
+            # паузы - курсор
+            self._audiostream.stop_stream()
+            self._paused = True
+            with self._cursor_lock:
+                self.start_pos = \
+                    self._cursor / float(self.sound.framerate) * 1000
+                self._clock.clear()
+            log.debug('    audio paused')
+
+    def close(self):
+        """ Закрыть поток воспроизведения и освободить PyAudio
+        (при завершении программы)
+        """
+        self.stop()
         if self._audiostream is not None:
-            # stop stream
-            # self._audiostream.stop_stream() # это пауза
             self._audiostream.close()
             self._audiostream = None
-            # close PyAudio
+            self._stream_format = None
+        if self._pyaudio is not None:
             self._pyaudio.terminate()
             self._pyaudio = None
-            # clear data
-            self._data = []
-            self._sampwidth = None
-            self._nchannels = None
-            print('terminating audiostream')
-        self._playtimer.reset()
 
-    def pause(self):
-        print('called SoundPlayer.pause()')
-        if self._audiostream is not None:
-            # Пауза для таймера
-            self._playtimer.pause()
-            print('    timer paused')
-            # Пауза для потока
-            self._audiostream.stop_stream()
-            # ToDo: pause with stop_stream() does not return code execution to the main thread
-            print('    audio paused')
     def _get_data(self,
                   in_data,      # recorded data if input=True; else None
                   frame_count,  # The number of sample frames to be processed
@@ -594,103 +1097,171 @@ class SoundPlayer(object):
         """ Define callback for audio stream
         """
         flag = pyaudio.paContinue
-        # Определить чдлину запрашиваемого числа фреймов в байтах,
-        # умножив на кол-во байт в 1 фрейме:
-        # длина сэмпла [байт] * число каналов
-        nbytes = self._sampwidth * frame_count * self._nchannels
-        # print('Запрос к воспроизведению байтов: ' + str(nbytes))
-        # Обработка окончания данных
-        if nbytes > len(self._data):
-            nbytes = len(self._data)
+        sound = self.sound
+        # Время вывода первого фрейма порции (если устройство его не
+        # сообщает - по задержке потока)
+        dac_time = time_info.get('output_buffer_dac_time') \
+            or time_info.get('current_time', 0.0) + self._latency
+        # Участки звука порции - с позиции курсора до конца звука или
+        # области (при повторе - снова с начала области)
+        with self._cursor_lock:
+            cursor = self._cursor
+            speed = self.speed
+            start, stop, loop = 0, sound.nframes, False
+            if self._region is not None:
+                start_ms, stop_ms, loop = self._region
+                start = int(start_ms / 1000.0 * sound.framerate)
+                stop = min(int(stop_ms / 1000.0 * sound.framerate), stop)
+            segments = []
+            remaining = frame_count
+            while remaining:
+                count = min(remaining,
+                            max(int(math.ceil((stop - cursor) / speed)), 0))
+                if count:
+                    segments.append((cursor, count))
+                    cursor += count * speed
+                    remaining -= count
+                if not remaining or not loop or stop <= start:
+                    break
+                # Конец области - продолжить с её начала
+                cursor = start
+            self._cursor = cursor
+            if segments:
+                self._clock.append((dac_time, segments, speed))
+        # Фреймы участков - срезы буфера звука без копирования
+        # (LiveSound вычисляет их сейчас)
+        parts = []
+        for first, count in segments:
+            if speed == 1 and first == int(first):
+                parts.append(sound.read(int(first), count))
+            else:
+                # Другая скорость - передискретизация на лету
+                parts.append(sound.read_speed(first, count, speed))
+        if len(parts) == 1:
+            data = parts[0]
+        elif parts:
+            # Переход через конец области
+            data = np.concatenate(parts)
+        else:
+            data = sound.read(sound.nframes, 0)
+        # Обработка окончания данных (звука или области без повтора)
+        if remaining:
             flag = pyaudio.paComplete
             # Вызвать обработчик окончания воспроизведения
             self._sound_eof_handler()
-        # POP-first n-bytes
-        data, self._data = self._data[:nbytes], self._data[nbytes:]
         return data, flag
 
     def _sound_eof_handler(self):
         # Метод вызывается по окончании воспроизводимого файла
-        # (при извлечении последней порции данных из массива для воспроизведения)
-        # Ждать окончания работы потока
-        print('called _sound_eof_handler(): waiting last sounds....')
-        # while self._audiostream.is_active():
-        #     time.sleep(0.001)
-        # ToDo: бесконечна рекурсия, пришлось закомментировать пока.
-        # Остановить завершившийся поток воспроизведения
-        self.stop()
-
-    def _run_new_stream(self):
-        # Создать поток воспроизведения pyAudio в callback-режиме
-        print('called SoundPlayer._run_new_stream()')
-
-        # Определить параметры по аудиофайлу и считать данные для воспроизведения
-        with wave.open(self.file, 'rb') as wavf:
-            sampwidth = wavf.getsampwidth()
-            channels = wavf.getnchannels()
-            framerate = wavf.getframerate()
-            nframes = wavf.getnframes()
-            start_frame = self.start_pos / 1000.0 * framerate
-            start_byte = int(start_frame) * int(sampwidth)
-            if start_frame >= nframes:
-                # Воспроизводить нечего
-                return
-            # Считать все данные
-            data = wavf.readframes(nframes)
-        # Взять срез с требуемой позиции и до конца файла
-        self._data = data[start_byte:]
-        # Сохранить необходимую информацию о структуре фрейма
-        self._sampwidth = sampwidth
-        self._nchannels = channels
-
-        # instantiate PyAudio
-        self._pyaudio = pyaudio.PyAudio()
-        # open stream using callback
+        # (при извлечении последней порции данных из массива для
+        # воспроизведения) - в потоке PyAudio. Поток воспроизведения
+        # завершается сам (paComplete); следующий play() начнёт сначала
+        self._paused = False
+
+    def _open_stream(self, sound):
+        # Поток воспроизведения pyAudio в callback-режиме для формата звука:
+        # прежний, если формат не изменился
+        if self._pyaudio is None:
+            self._pyaudio = pyaudio.PyAudio()
+        if sound.wave_format == tlm2wav_render.WAVE_FORMAT_IEEE_FLOAT:
+            sample_format = pyaudio.paFloat32
+        else:
+            sample_format = self._pyaudio.get_format_from_width(
+                sound.sampwidth)
+        stream_format = (sample_format, sound.nchannels, sound.framerate)
+        if stream_format == self._stream_format:
+            if not self._audiostream.is_stopped():
+                # Доигравший поток (paComplete) - остановить перед запуском
+                self._audiostream.stop_stream()
+            return
+        if self._audiostream is not None:
+            self._audiostream.close()
+        log.debug('SoundPlayer: открыть поток %s', stream_format)
         self._audiostream = self._pyaudio.open(
-            format=self._pyaudio.get_format_from_width(sampwidth),
-            channels=channels,
-            rate=framerate,
+            format=sample_format,
+            channels=sound.nchannels,
+            rate=sound.framerate,
             output=True,
+            start=False,
             stream_callback=self._get_data)
-        # start the stream
-        # AudioStreamThread(self._audiostream).start()
+        self._stream_format = stream_format
+        self._latency = self._audiostream.get_output_latency()
+
+    def _run_new_stream(self):
+        # Запустить воспроизведение звука с начальной позиции
+        log.debug('called SoundPlayer._run_new_stream()')
+        sound = self.sound
+        if sound is None:
+            # Звук ещё не создан
+            return
+        region = self._region
+        if region is not None \
+                and not region[0] <= self.start_pos < region[1]:
+            # Начальная позиция вне области - воспроизводить с её начала
+            self.start_pos = region[0]
+        if self.start_pos / 1000.0 * sound.framerate >= sound.nframes:
+            # Воспроизводить нечего
+            return
+        self._open_stream(sound)
+        self._paused = False
+        # Воспроизводить с требуемой позиции
+        self.seek(self.start_pos)
         self._audiostream.start_stream()
-        # Запустить таймер воспроизведения
-        self._playtimer.start()
 
 
 class QtSoundPlayer(SoundPlayer, QtCore.QObject):
-    """ Плеер аудиофайлов адаптированный для привязки к внешним источникам
+    """ Плеер звука адаптированный для привязки к внешним источникам
     данных (элементам GUI и др.)
 
     Посылает сигналы
-    - о текущем времени воспроизведения:
+    - о текущем времени воспроизведения (во время воспроизведения - не
+    чаще раза в POSITION_INTERVAL мс, из потока Qt):
     QtCore.SIGNAL('playing_ms(float)')
     - об окончании воспроизведения
     QtCore.SIGNAL('eof()')
 
     """
-    # ToDo: добавить сигнал об окончании воспроизведения, по которому ползунок вернётся в начало
-    def __init__(self, get_file_func, get_start_pos_func):
+    # Период сигналов о текущем положении воспроизведения, мс
+    POSITION_INTERVAL = 40
+
+    def __init__(self, get_sound_func, get_start_pos_func):
         SoundPlayer.__init__(self,
-                             get_file_func(),
+                             get_sound_func(),
                              get_start_pos_func())
         QtCore.QObject.__init__(self)
         # Дополнительные поля связи с внешними источниками данных
-        self._get_file_func = get_file_func
+        self._get_sound_func = get_sound_func
         self._get_start_pos_func = get_start_pos_func
-        # Таймер сигнализации о текущем положени
-        self._playtimer.timeout = 0.05 # период срабатывания таймера, мс
-
-    def _timer_callback(self):
+        # Таймер сигнализации о текущем положении (работает только во
+        # время воспроизведения)
+        self._position_timer = QtCore.QTimer(self)
+        self._position_timer.setInterval(self.POSITION_INTERVAL)
+        self.connect(self._position_timer,
+                     QtCore.SIGNAL('timeout()'), self._emit_position)
+
+    def _emit_position(self):
         # Посылает сигнал содержащий данные о текущем положении воспроизведения
-        playing_pos = self.get_playing_time_ms()
-        self.emit(QtCore.SIGNAL('playing_ms(float)'), playing_pos)
+        if not self.is_playing():
+            self._position_timer.stop()
+            return
+        self.emit(QtCore.SIGNAL('playing_ms(float)'),
+                  self.get_playing_time_ms())
+
+    def play(self):
+        SoundPlayer.play(self)
+        if self.is_playing():
+            self._position_timer.start()
+
+    def pause(self):
+        SoundPlayer.pause(self)
+        self._position_timer.stop()
+        self.emit(QtCore.SIGNAL('playing_ms(float)'),
+                  self.get_playing_time_ms())
 
     def _update_dependencies(self):
         # Дополнительный метод, обновляющий поля класса в соответствии с
         # внешними источниками
-        self.file = self._get_file_func()
+        self.sound = self._get_sound_func()
         self.start_pos = self._get_start_pos_func()
 
     def _run_new_stream(self):
@@ -705,24 +1276,83 @@ class QtSoundPlayer(SoundPlayer, QtCore.QObject):
         self.emit(QtCore.SIGNAL('eof()'))
 
 
+class LoadTlmThread(QtCore.QThread):
+    """ Поток загрузки (разбора) файла телеметрии
+
+    Посылает сигналы о ходе разбора файла:
+    QtCore.SIGNAL('progress(int)') - процент разобранных байт файла
+    """
+    def __init__(self):
+        QtCore.QThread.__init__(self)
+        # Загружаемый файл и режим слежения за ним
+        # (задаются перед запуском потока)
+        self.filename = None
+        self.follow = False
+        # Наблюдения, переносимые в загруженную телеметрию (или None)
+        self.observs = None
+        # Результат: объект телеметрии или ошибка загрузки
+        self.telemetry = None
+        self.error = None
+        # Последний отправленный процент
+        self._percent = None
+
+    def __del__(self):
+        # Дождаться завершения загрузки перед уничтожением экземпляра
+        self.wait()
+
+    def run(self):
+        """ Загрузить телеметрию из файла self.filename
+        """
+        self.telemetry = None
+        self.error = None
+        self._percent = None
+        self.emit(QtCore.SIGNAL('progress(QString)'), "Загрузка телеметрии")
+        try:
+            self.telemetry = Telemetry(self.filename, progress=self._progress,
+                                       follow=self.follow)
+        except Exception as err:
+            self.error = err
+
+    def _progress(self, offset, size):
+        # Сигнал о ходе разбора - только при изменении процента
+        percent = int(offset / size * 100) if size else 100
+        if percent != self._percent:
+            self._percent = percent
+            self.emit(QtCore.SIGNAL('progress(int)'), percent)
+
 
 class MakeSoundThread(QtCore.QThread):
-    """ Поток создания аудиофайла из телеметрии
+    """ Поток создания звука из телеметрии (в памяти).
+    Созданный звук - поле sound (tlm2wav_render.Sound)
     """
     def __init__(self, get_tlm, get_sens_left, get_sens_right, get_mode,
-                 get_multiplier, get_framerate, get_sampwidth, get_outfile):
+                 get_multiplier, get_framerate, get_sampwidth,
+                 get_wave_format, get_interpolation, get_pitch=None,
+                 get_previous=None, sound_cache=None):
         """ Инициализация экземпляра потока
 
         Поля инициализируются функциями возвращающими ....
         :param get_tlm:        ...объект телеметрии
         :param get_sens_left:  ...номер "левого" датчика
         :param get_sens_right: ...номер "правого" датчика
-        :param get_mode:       ...режим расчёта. По лев.,прав, по среднему
-                           {LEFT, RIGHT, LEFT | RIGHT}
+        :param get_mode:       ...режим расчёта. По лев.,прав, по среднему,
+                           стерео {LEFT, RIGHT, LEFT | RIGHT, STEREO},
+                           с флагом PITCH - режим высоты тона
         :param get_multiplier: ...скорость воспроизведения
         :param get_framerate:  ...частота фреймов ауиофайла
         :param get_sampwidth:  ...глубина звука аудиофайла
-        :param get_outfile:    ...имя выходного аудиофайла
+        :param get_wave_format: ...формат сэмплов аудиофайла (целые или с
+                           плавающей точкой)
+        :param get_interpolation: ...способ интерполяции телеметрии
+                           (ключ tlm2wav_render.INTERPOLATIONS)
+        :param get_pitch:  ...диапазон частот тона (наименьшая, наибольшая),
+                           Гц, в режиме высоты тона; None - режим громкости
+        :param get_previous: ...ранее созданный звук: если он создан с теми
+                           же параметрами (изменилась только калибровка),
+                           пересоздаётся только изменившаяся часть
+        :param sound_cache: кэш созданных звуков (tlm2wav_render.SoundCache),
+                           в который помещается созданный звук - с ключом
+                           cache_key
         """
 
         QtCore.QThread.__init__(self)
@@ -733,8 +1363,18 @@ class MakeSoundThread(QtCore.QThread):
         self.get_multiplier = get_multiplier
         self.get_framerate = get_framerate
         self.get_sampwidth = get_sampwidth
-        self.get_outfile = get_outfile
+        self.get_wave_format = get_wave_format
+        self.get_interpolation = get_interpolation
+        self.get_pitch = get_pitch
+        self.get_previous = get_previous
         self.isaborted = False
+        # Созданный звук
+        self.sound = None
+        self.sound_cache = sound_cache
+        # Ключ созданного звука в кэше (задаётся перед запуском потока)
+        self.cache_key = None
+        # Последний отправленный процент
+        self._percent = None
 
     def __del__(self):
         """ Уничтожение экземпляра потока
@@ -768,7 +1408,7 @@ class MakeSoundThread(QtCore.QThread):
     def make_sound(self):
 
         self.emit(QtCore.SIGNAL('progress(QString)'), "Подготовка данных")
-        nchannels = 1  # MONO=1; STEREO=2
+        nchannels = 1  # MONO=1; для режима STEREO - 2 канала
         # Получить парамеры
         sens_left = self.get_sens_left()
         sens_right = self.get_sens_right()
@@ -776,79 +1416,43 @@ class MakeSoundThread(QtCore.QThread):
         multiplier = self.get_multiplier()
         framerate = self.get_framerate()
         sampwidth = self.get_sampwidth()
-        outfile = self.get_outfile()
+        wave_format = self.get_wave_format()
+        interpolation = self.get_interpolation()
+        pitch = self.get_pitch() if self.get_pitch else None
+        previous = self.get_previous() if self.get_previous else None
         tlm = self.get_tlm()
         self.emit(QtCore.SIGNAL('progress(QString)'),
                   "Преобразование телеметрии")
-        # Получить телеметрию
-        times = tlm.get_tlm(TIME).copy()
-        if mode == LEFT | RIGHT:
-            # Среднее по правой и левой
-            values = 0.5*(tlm.get_tlm(LEFT, sens_left, sens_right)
-                          + tlm.get_tlm(RIGHT, sens_left, sens_right)).copy()
-        else:
-            values = tlm.get_tlm(mode, sens_left, sens_right).copy()
-
-        # Максимальная громкость - максимальное число со знаком,
-        # которое может быть записано в сэмпл / в заданном числе байт 0x7F...FFF
-        max_vol = 2**(sampwidth*8-1)-1
-        # Исключение - 8битный сэмпл, который использует беззнаковые целые числа
-        if sampwidth == 1:
-            max_vol = 2**8-1
-            sample_fmt = struct.Struct('B')
-        # 16-битный
-        elif sampwidth == 2:
-            sample_fmt = struct.Struct('<h')
-        # 24-битный
-        elif sampwidth == 3:
-            raise NotImplementedError(
-                'Не реализована запись 24-битовых целых со знаком')
-        # 32-битный
-        elif sampwidth == 4:
-            sample_fmt = struct.Struct('<i')
-        else:
-            raise Exception(
-                'Некорректная длина сэмпла: должна быть 1, 2, 3, 4 Байта')
-
-        # Нормировать абсолютный максимум амплитуды к максимальной громкости
-        values = values/np.max(np.abs(values))*max_vol
-        # Привести массив времени к ускоренному виду
-        # - сжав в указанное число раз
-        times /= multiplier
-        # Создать функцию интерполирующую амплитуду телеметрии
-        # по заданному моменту времени
-        # interp = np.interp(times, values)
-
-        # Определить длительность и число фреймов
-        duration = np.max(times)  # длительность в секундах (после умножения)
-        nframes = int(duration*framerate)
-
-        # Создать аудио-файл
-        with wave.open(outfile, 'wb') as wav:
-            # Установить параметры
-            wav.setnchannels(nchannels)
-            wav.setsampwidth(sampwidth)
-            wav.setframerate(framerate)
-            # Записать фреймы звука
-            for frame in range(nframes):
-                # Сигнал о текущем прогрессе
-                # Подавать каждый 100-й фрейм
-                if frame % 100 == 0:
-                    self.emit(QtCore.SIGNAL('progress(int)'),
-                              int(frame/nframes*100))
-                # Прервать работу безопасно, если запрошена остановка
-                if self.isaborted:
-                    break
-                # Момент, соответствующий текущему фрейму
-                time = frame/framerate
-                # Амплитуда для этого фрейма
-                value = np.interp(time, times, values)
-                # Если 8-битный - амплитуда от 0 до 255,
-                if sampwidth == 1:
-                    # отрицательные инвертировать.
-                    value = np.abs(value)
-                # write the audio frames to file
-                wav.writeframesraw(sample_fmt.pack(int(value)))
+        # Создать звук в памяти
+        # (поблочно; прерывание проверяется перед каждым блоком).
+        # Телеметрия калибруется и усредняется по блокам строк при создании.
+        # Из предыдущего звука пересоздаётся только изменившаяся часть
+        self._percent = None
+        self.sound = tlm2wav_render.render_sound(
+            tlm.sound_blocks(mode, sens_left, sens_right),
+            multiplier=multiplier,
+            framerate=framerate,
+            sampwidth=sampwidth,
+            nchannels=nchannels,
+            wave_format=wave_format,
+            interpolation=interpolation,
+            pitch=pitch,
+            previous=previous,
+            progress=self._progress,
+            aborted=lambda: self.isaborted)
+        # Запомнить звук (только созданный полностью)
+        if self.sound_cache is not None and self.cache_key is not None \
+                and not self.isaborted:
+            self.emit(QtCore.SIGNAL('progress(QString)'),
+                      "Сохранение в кэш")
+            self.sound_cache.put(self.cache_key, self.sound)
+
+    def _progress(self, frames, nframes):
+        # Сигнал о ходе создания - только при изменении процента
+        percent = int(frames / nframes * 100) if nframes else 100
+        if percent != self._percent:
+            self._percent = percent
+            self.emit(QtCore.SIGNAL('progress(int)'), percent)
 
 
 class CalibWindow(QtGui.QDialog):
@@ -866,6 +1470,8 @@ class CalibWindow(QtGui.QDialog):
         # Графики
         self.ax = None
         self.tmp = None
+        # Кривые телеметрии на графике {LEFT/RIGHT/META: Line2D}
+        self.lines = {}
         # Прямоуголники калибровочных интервалов
         self.tint_rects = []
 
@@ -890,6 +1496,8 @@ class CalibWindow(QtGui.QDialog):
         self.chk_meta = QtGui.QCheckBox('Метки')
         self.chk_meta.setChecked(False)
         self.chk_meta.setStyleSheet("color: green")
+        self.chk_loop = QtGui.QCheckBox('Повторять')
+        self.chk_loop.setToolTip('Воспроизводить интервал по кругу')
 
         # Кнопки
         # - Перестроить
@@ -901,6 +1509,19 @@ class CalibWindow(QtGui.QDialog):
         self.btn_reset.setToolTip('Сбросить калибровку')
         self.connect(self.btn_reset,
                      QtCore.SIGNAL('clicked()'), self.reset_calib)
+        # - прослушать интервал
+        self.btn_listen = QtGui.QPushButton('Прослушать', self)
+        self.btn_listen.setToolTip(
+            'Воспроизвести выбранный в таблице интервал из созданного звука')
+        self.connect(self.btn_listen,
+                     QtCore.SIGNAL('clicked()'), self.listen_tint)
+        # - прослушать видимый участок
+        self.btn_listen_visible = QtGui.QPushButton('Прослушать видимое', self)
+        self.btn_listen_visible.setToolTip(
+            'Создать звук только видимого на графике участка записи '
+            'и воспроизвести его')
+        self.connect(self.btn_listen_visible,
+                     QtCore.SIGNAL('clicked()'), self.listen_visible)
         # - ок
         self.btn_ok = QtGui.QPushButton('OK', self)
         self.btn_ok.setToolTip('Принять калибровку')
@@ -941,6 +1562,13 @@ class CalibWindow(QtGui.QDialog):
         left_panel.addWidget(self.chk_right, 0)
         left_panel.addWidget(self.chk_meta, 0)
 
+        # Строка прослушивания интервала
+        listen_group = QtGui.QHBoxLayout()
+        listen_group.addWidget(self.btn_listen)
+        listen_group.addWidget(self.chk_loop)
+        left_panel.addLayout(listen_group, 0)
+        left_panel.addWidget(self.btn_listen_visible, 0)
+
         # Строка 3-х нижних кнопок
         btns_group = QtGui.QHBoxLayout()
         # btns_group.addStretch(1)
@@ -983,13 +1611,19 @@ class CalibWindow(QtGui.QDialog):
         # Дополнительно обновить график
         self.plot()
 
-    def plot(self):
-        # Получить текущие установки соответствтия датчиков левой и правой рамки
+    def _curve(self, param):
+        # Телеметрия кривой графика param = LEFT, RIGHT или META
+        # при текущих установках соответствия датчиков левой и правой рамки
         sens_left = self.parent().lst_left.itemData(
             self.parentWidget().lst_left.currentIndex())
         sens_right = self.parentWidget().lst_right.itemData(
             self.parentWidget().lst_right.currentIndex())
+        return self.parentWidget().telemetry.get_tlm(param,
+                                                     sens_left=sens_left,
+                                                     sens_right=sens_right,
+                                                     calib=True)
 
+    def plot(self):
         time = self.parentWidget().telemetry.get_tlm(TIME)
 
         matplotlib.rcParams['font.size'] = 14
@@ -1015,23 +1649,18 @@ class CalibWindow(QtGui.QDialog):
             self.ax.axis([0, time[-1], 0, 360])
 
         # plot telemetry data
+        self.lines = {}
         if self.chk_left.isChecked():
-            left = self.parentWidget().telemetry.get_tlm(LEFT,
-                                                         sens_left=sens_left,
-                                                         sens_right=sens_right,
-                                                         calib=True)
-            self.ax.plot(time, left, 'r-', linewidth=2.0, label='Левая')
+            self.lines[LEFT], = self.ax.plot(time, self._curve(LEFT), 'r-',
+                                             linewidth=2.0, label='Левая')
 
         if self.chk_right.isChecked():
-            right = self.parentWidget().telemetry.get_tlm(RIGHT,
-                                                          sens_left=sens_left,
-                                                          sens_right=sens_right,
-                                                          calib=True)
-            self.ax.plot(time, right, 'b-', linewidth=2.0, label='Правая')
+            self.lines[RIGHT], = self.ax.plot(time, self._curve(RIGHT), 'b-',
+                                              linewidth=2.0, label='Правая')
 
         if self.chk_meta.isChecked():
-            meta = self.parentWidget().telemetry.get_tlm(META)
-            self.ax.plot(time, meta, 'g-', linewidth=2.0, label='Маркер')
+            self.lines[META], = self.ax.plot(time, self._curve(META), 'g-',
+                                             linewidth=2.0, label='Маркер')
 
         # plot CALIB-tints rectangles
         self.plot_tint_rects(refresh=False)
@@ -1040,6 +1669,24 @@ class CalibWindow(QtGui.QDialog):
         # refresh canvas manually
         self.canvas.draw()
 
+    def update_data(self):
+        """ Обновить кривые графика по дописанной телеметрии
+        (без перестроения осей, интервалов и панели инструментов)
+        """
+        if self.ax is None or not self.lines:
+            self.plot()
+            return
+        time = self.parentWidget().telemetry.get_tlm(TIME)
+        # Правая граница оси времени следует за данными, если на графике
+        # был виден конец записи
+        xmin, xmax = self.ax.get_xlim()
+        time_prev = next(iter(self.lines.values())).get_xdata()
+        for param, line in self.lines.items():
+            line.set_data(time, self._curve(param))
+        if len(time_prev) == 0 or xmax >= time_prev[-1]:
+            self.ax.set_xlim(xmin, time[-1])
+        self.canvas.draw_idle()
+
     def plot_tint_rects(self, refresh=True):
         """ Добавление на график прямоугольников временных интервалов
         Обновляет график, если не указано иное
@@ -1073,6 +1720,23 @@ class CalibWindow(QtGui.QDialog):
             # refresh canvas
             self.canvas.draw()
 
+    def listen_tint(self):
+        # Воспроизвести выбранный (по умолчанию - первый) интервал
+        if len(self.calib_tints) == 0:
+            return
+        row = max(self.tbl_tints.currentRow(), 0)
+        tint = self.calib_tints[min(row, len(self.calib_tints) - 1)]
+        self.parentWidget().play_region(tint[0], tint[1],
+                                        self.chk_loop.isChecked())
+
+    def listen_visible(self):
+        # Воспроизвести участок записи, видимый на графике (после
+        # масштабирования панелью инструментов)
+        if self.ax is None:
+            return
+        xmin, xmax = self.ax.get_xlim()
+        self.parentWidget().play_range(max(xmin, 0.0), xmax)
+
     def new_tint(self, xmin, xmax):
         # Вызывается в результате графического добавления временных интрвалов
         self.calib_tints.append([xmin, xmax])
@@ -1159,199 +1823,4 @@ class TintsTable(QtGui.QTableWidget):
             pass
 
 
-class ResumableTimer(threading.Thread):
-    """ Таймер
-
-        Вызывает с периодом <timeout> переданную ему функцию <callback>.
-
-        Ведёт отсчёт времени работы (свойство <elpased_time>).
-        Может быть запущен заново или приостановлен
-        (методы run(), pause(), resume() )
-        Возобновляет работу с того положения внутри периода, заданного
-        аргументом <timeout> (секунд), в котором был остановлен
-        Остановка и возобновление таймера происходят мгновенно, но не прерывая
-        вызов callback, если он уже осуществляется.
-
-        Единицы измерения: секунды [s]
-        """
-
-    @enum.unique
-    class _States(enum.Enum):
-        """ Перечисление возможных состояний таймера
-        """
-        new = 0         # таймер ещё на запускался
-        started = 1     # таймер запущен впервые
-        paused = 2      # таймер останвовлен после запуска
-        continuing = 3  # таймер возобновлён после остановки
-
-    def __init__(self, timeout, callback):
-        # Инициализация потока для таймера
-        threading.Thread.__init__(self)
-        # Инициализация события остановки потока таймера
-        self._stopped = threading.Event()
-        # Период вызова callback`а
-        self._timeout = timeout
-        # Вызываемая в callback функция
-        self._callback = callback
-        # Инциализировать поля, характеризующие состояние таймера
-        self.__curr_state = None
-        self._time_elapsed = 0      # суммарное время предыдущих пусков таймера
-        self._time_start = None     # время пуска текущего таймера
-        self._time_pause = None     # время последней остановки таймера
-        self._time_remaining = 0.0  # оставшееся время до callback
-                                    # (для корректного пуска после паузы)
-        # Установить состояние таймера
-        self._state = self._States.new
-        # Свойство состояния при изменении осуществляет заполнение всей
-        # необходимой информациейполей, характеризующих состояние,
-
-    @property
-    def callback(self):
-        return self._callback
-
-    @callback.setter
-    def callback(self, callback_new):
-        if self._state == self._States.new:
-            self._callback = callback_new
-        else:
-            raise ValueError(
-                "It is forbidden to change callback after starting timer."
-                "Change callback before using the timer or use method reset()" \
-                " before callback changing")
-
-    @property
-    def timeout(self):
-        return self._timeout
-
-    @timeout.setter
-    def timeout(self, timeout_new):
-        if self._state == self._States.new:
-            self._timeout = timeout_new
-        else:
-            raise ValueError(
-                "It is forbidden to change timeout after starting timer."
-                "Change timeout before using the timer or use method reset()" \
-                " before timeout changing")
-
-    @property
-    def _state(self):
-        return self.__curr_state
-
-    @_state.setter
-    def _state(self, state):
-        if state == self._States.continuing:
-            print('continuing')
-            self._time_start = time.time()
-            self._time_pause = None
-            self._time_remaining = 0.0
-            # Сбросить флаг остановки таймера
-            self._stopped.clear()
-        elif state == self._States.new:
-            print('new')
-            self._time_elapsed = 0.0
-            self._time_start = None
-            self._time_pause = None
-            self._time_remaining = 0.0
-            # Сбросить флаг остановки таймера
-            self._stopped.clear()
-            # Обойти запрет повторного исопльзования потока
-            self._started.clear()
-            self._is_stopped = False
-        elif state == self._States.paused:
-            print('paused')
-            self._time_pause = time.time()
-            self._time_elapsed += self._time_pause - self._time_start
-            self._time_remaining = self._time_elapsed % self._timeout
-            # Установить флаг остановки таймера для прерывания петли
-            self._stopped.set()
-        elif state == self._States.started:
-            print('started')
-            self._time_start = time.time()
-            self._time_remaining = 0.0
-            # Сбросить флаг остановки таймера
-            self._stopped.clear()
-        else:
-            raise ValueError(
-                "state argument must be one of the fields in _States "\
-                "enumeration")
-        self.__curr_state = state
-
-    @property
-    def time_elapsed(self):
-        """ Суммарное время наработки таймера к настоящему моменту [секунд]
-        """
-        if self._state == self._States.continuing:
-            return self._time_elapsed + (time.time() - self._time_start)
-        elif self._state == self._States.new:
-            return 0.0
-        elif self._state == self._States.paused:
-            return self._time_elapsed
-        elif self._state == self._States.started:
-            return time.time() - self._time_start
-        else:
-            raise ValueError(
-                "Unexpected state."
-                "State must be one of the fields in _States enumeration")
-
-    def run(self):
-        """ Запуск или возобновление работы таймера
-        """
-        # Доработать прерванный промежуток времени
-        # (выполняется, если таймер приостанавливался)
-        if self._time_remaining > 0.0:
-            time.sleep(self._time_remaining)
-            self._callback()
-        # Установить новое состояние таймера
-        if self._state == self._States.new:
-            self._state = self._States.started
-        elif self._state == self._States.paused:
-            self._state = self._States.continuing
-        else:
-            raise ValueError(
-                "Unexpected timer state."
-                "To run timer the state must be <new> or <paused>")
-        # Войти в петлю периодических вызовов
-        while not self._stopped.wait(self._timeout):
-            # call a function
-            self._callback()
-
-    def pause(self):
-        """ Приостанавлиает таймер
-        Сохраняется частично истекший период между вызовами callback-функции.
-        """
-        # Установить состояние таймера
-        print('tpause=' + str(self._time_pause))
-        print('tstart=' + str(self._time_start))
-        self._state = self._States.paused
-
-    def resume(self):
-        """ Возобновляет работу приостановленного таймера.
-        Дорабатываетя частично истекший период между вызовами callback-функции.
-        """
-        if self._state == self._States.paused:
-            # Запустить заново
-            self.run()
-        elif self._state == self._States.started:
-            # Ничего не делать, если таймер уже работает
-            pass
-        else:
-            raise ValueError(
-                "Unexpected timer state."
-                "To resume timer the state must be <paused> or <started> "\
-                "(in this case nothing happens)")
-
-    def reset(self):
-        """ Сбросить таймер.
-
-        Останавливает таймер, если он был запщен и сбрасывает его состояние (в
-        т.ч. обнуляет накопленное время работы)
-        """
-        # Если таймер работает - остановить
-        self.pause()
-        # Ждать, пока не сработает флаг остановки таймера
-        while self.is_alive():
-            time.sleep(0.001)
-        # Сброс состояния таймера к состоянию "нового" таймера
-        self._state = self._States.new
-
 # ToDo: применить систему контроля версий и создать упрощённую стабильную версию, протестировать её отправку на github
@@ -50,7 +50,8 @@ setup(
     license='GPLv3.0',
     platforms='GNU/Linux, Microsoft Windows', # (Mac OS X is not tested.)
     # список всех файлов одиночных модулей:
-    py_modules=['qt_gui', 'tlm2wav'],
+    py_modules=['qt_gui', 'tlm2wav', 'tlm2wav_utils', 'tlm2wav_cache',
+                'tlm2wav_render', 'tlm2wav_parse'],
     # список файлов сценариев python
     scripts=['tlm2wav.pyw'],
     # список всех каталогов-модулей python (пакетов)
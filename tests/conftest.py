@@ -0,0 +1,45 @@
+# Модули программы лежат в корне репозитория - сделать их доступными тестам
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+DEMO = os.path.join(ROOT, 'input_demo.txt')
+
+
+def _line(time, *angles):
+    # Строка телеметрии в раскладке input_demo.txt (с переводом строки CRLF)
+    return ((time.ljust(45) + ''.join(angle.ljust(44) for angle in angles)
+             )[:176] + '\r').encode('utf8')
+
+
+# Строки неверного вида той же длины, что и остальные: лишние знаки в поле
+# времени и между столбцами углов. Разбираются регулярным выражением (или
+# отбрасываются) одинаково всеми способами разбора
+MALFORMED = [_line(time, '224°01´59´´', '263°45´35´´', '209°23´57´´')
+             for time in ('500*', '*500', '* 500', '5*00', '**500', '50 0',
+                          '500 *', ' *500')] + [
+    _line('14438', '224°01´59´´', '261°52´12´´ X', '209°34´30´´'),
+    _line('14548', '224°01´59´´ X', '261°52´12´´', '209°34´30´´'),
+    _line('14658', '224°01´59´´', '261°52´12´´', '209°34´30´´ X'),
+    _line('14768', '224°01´59´´', '261°52´12´´'.ljust(43) + 'X',
+          '209°34´30´´'),
+]
+
+
+@pytest.fixture(scope='session')
+def tlm_txt(tmp_path_factory):
+    # Начало демонстрационной телеметрии со строками неверного вида
+    with open(DEMO, 'rb') as f:
+        lines = f.read().split(b'\n')
+    head, body = lines[0], [line for line in lines[1:] if line.strip()]
+    body = body[:3000]
+    for i, line in enumerate(MALFORMED):
+        assert len(line) == len(body[0])
+        body[100 + 10 * i] = line
+    path = tmp_path_factory.mktemp('tlm') / 'tlm.txt'
+    path.write_bytes(b'\n'.join([head] + body) + b'\n')
+    return str(path)
@@ -0,0 +1,122 @@
+import gc
+import os
+import weakref
+
+import numpy as np
+
+import tlm2wav_cache
+import tlm2wav_render
+
+__author__ = 'Don D.S'
+
+
+def _columns(size):
+    return {0: np.arange(size, dtype=np.float64),
+            1: np.arange(size, dtype=np.int32)}
+
+
+def test_key_changes_with_file(tmp_path):
+    cache = tlm2wav_cache.TlmCache(str(tmp_path / 'cache'))
+    path = tmp_path / 'tlm.txt'
+    path.write_bytes(b'0 1 2 3\n' * 1000)
+    key = cache.key(str(path))
+    assert cache.key(str(path)) == key
+    assert cache.key(str(path), 'compact') != key
+    # Содержимое того же размера и с тем же временем изменения
+    stat = os.stat(str(path))
+    path.write_bytes(b'0 1 2 4\n' * 1000)
+    os.utime(str(path), ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert cache.key(str(path)) != key
+    # Дописанный файл
+    new_key = cache.key(str(path))
+    with open(str(path), 'ab') as f:
+        f.write(b'5 6 7 8\n')
+    assert cache.key(str(path)) != new_key
+
+
+def test_store_load(tmp_path):
+    cache = tlm2wav_cache.TlmCache(str(tmp_path))
+    assert cache.load('missing') is None
+    columns = _columns(100)
+    cache.store('key', columns)
+    loaded = cache.load('key')
+    assert sorted(loaded) == [0, 1]
+    for name, column in columns.items():
+        assert loaded[name].dtype == column.dtype
+        assert np.array_equal(loaded[name], column)
+    cache.remove('key')
+    assert cache.load('key') is None
+
+
+def test_eviction(tmp_path):
+    cache = tlm2wav_cache.TlmCache(str(tmp_path), limit=2**40)
+    for i, key in enumerate(['a', 'b', 'c']):
+        cache.store(key, _columns(10000))
+        # Время использования - по времени изменения meta.json
+        os.utime(os.path.join(str(tmp_path), key, 'meta.json'),
+                 (1000 + i, 1000 + i))
+    # Размеры записей различаются на несколько байт (meta.json)
+    sizes = {item['key']: item['size'] for item in cache.entries()}
+    # Использование записи 'a' - она вытесняется последней
+    cache.load('a')
+    cache.evict(limit=sizes['c'] + sizes['a'])
+    assert [item['key'] for item in cache.entries()] == ['c', 'a']
+    # Используемая сейчас запись не вытесняется даже при нулевом пределе
+    cache.evict(limit=0, keep='a')
+    assert [item['key'] for item in cache.entries()] == ['a']
+    # Запись в кэш вытесняет старые записи сверх предела
+    cache.limit = sizes['a']
+    cache.store('d', _columns(10000))
+    assert [item['key'] for item in cache.entries()] == ['d']
+    cache.clear()
+    assert cache.entries() == []
+
+
+def _sound(nframes, multiplier=None):
+    sound = tlm2wav_render.Sound(
+        np.arange(nframes * 4, dtype=np.uint8), 2, 2, 8000)
+    sound.multiplier = multiplier
+    return sound
+
+
+def test_sound_cache_memory_eviction():
+    cache = tlm2wav_render.SoundCache(memory_limit=2 * 4000, use_disk=False)
+    for key in ['a', 'b', 'c']:
+        cache.put(key, _sound(1000))
+    assert cache.get('a') is None
+    assert cache.get('b') is not None
+    cache.put('d', _sound(1000))
+    # Вытеснен давно не использовавшийся 'c'
+    assert cache.get('c') is None
+    assert cache.get('b') is not None and cache.get('d') is not None
+
+
+def test_sound_cache_disk(tmp_path):
+    key = tlm2wav_render.SoundCache.key('tlm', [(1, 2)], mode=1,
+                                        multiplier=50)
+    assert key != tlm2wav_render.SoundCache.key('tlm', [(1, 3)], mode=1,
+                                                multiplier=50)
+    sound = _sound(1000, multiplier=50)
+    tlm2wav_render.SoundCache(directory=str(tmp_path),
+                              use_disk=True).put(key, sound)
+    loaded = tlm2wav_render.SoundCache(directory=str(tmp_path),
+                                       use_disk=True).get(key)
+    assert np.array_equal(loaded.data, sound.data)
+    assert (loaded.nchannels, loaded.sampwidth, loaded.framerate,
+            loaded.wave_format, loaded.multiplier) == \
+        (2, 2, 8000, tlm2wav_render.WAVE_FORMAT_PCM, 50)
+
+
+def test_sound_cache_drops_source():
+    # Кэш не удерживает исходные данные звука (телеметрию)
+    times = np.linspace(0, 10, 100)
+    sound = tlm2wav_render.render_sound(times, np.sin(times), multiplier=1)
+    source = weakref.ref(sound.source.tlm)
+    cache = tlm2wav_render.SoundCache(use_disk=False)
+    cache.put('key', sound)
+    cached = cache.get('key')
+    assert cached.source is None and cached.multiplier == 1
+    assert np.shares_memory(cached.data, sound.data)
+    del sound
+    gc.collect()
+    assert source() is None
@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+
+import tlm2wav_parse
+
+__author__ = 'Don D.S'
+
+
+def _assert_same(tlm, reference):
+    assert sorted(tlm) == sorted(reference)
+    for key in reference:
+        assert tlm[key].dtype == reference[key].dtype
+        assert np.array_equal(tlm[key], reference[key])
+
+
+@pytest.mark.parametrize('compact', [False, True])
+def test_vectorized_equals_regex(tlm_txt, compact):
+    _assert_same(tlm2wav_parse.parse_tlm_txt(tlm_txt, jobs=1,
+                                             compact=compact),
+                 tlm2wav_parse.parse_tlm_txt_regex(tlm_txt, compact))
+
+
+@pytest.mark.parametrize('compact', [False, True])
+def test_parallel_equals_regex(tlm_txt, compact):
+    _assert_same(tlm2wav_parse.parse_tlm_txt(tlm_txt, jobs=2,
+                                             parallel_threshold=0,
+                                             compact=compact),
+                 tlm2wav_parse.parse_tlm_txt_regex(tlm_txt, compact))
+
+
+@pytest.mark.parametrize('sensors', [(1,), (3, 2), ()])
+def test_sensors_projection(tlm_txt, sensors):
+    # Столбцы выбранных датчиков - те же, что при разборе всех
+    tlm = tlm2wav_parse.parse_tlm_txt_regex(tlm_txt)
+    _assert_same(tlm2wav_parse.parse_tlm_txt(tlm_txt, jobs=1,
+                                             sensors=sensors),
+                 {key: tlm[key] for key in (tlm2wav_parse.TIME,) + sensors})
+
+
+@pytest.mark.parametrize('block_rows', [1000, 2**16])
+def test_streaming_equals_regex(tlm_txt, block_rows):
+    tlm = tlm2wav_parse.parse_tlm_txt_regex(tlm_txt)
+    blocks = list(tlm2wav_parse.iter_tlm_txt(tlm_txt, block_rows,
+                                             sensors=(1, 2)))
+    assert all(block.nrows == block_rows for block in blocks[:-1])
+    assert all(block.s3 is None for block in blocks)
+    for name, key in (('time', tlm2wav_parse.TIME), ('s1', 1), ('s2', 2)):
+        assert np.array_equal(
+            np.concatenate([getattr(block, name) for block in blocks]),
+            tlm[key])
+
+
+def test_compact_equals_float(tlm_txt):
+    # Компактные столбцы после перевода в секунды и градусы совпадают
+    # с разобранными сразу в float
+    tlm = tlm2wav_parse.parse_tlm_txt(tlm_txt, jobs=1)
+    compact = tlm2wav_parse.parse_tlm_txt(tlm_txt, jobs=1, compact=True)
+    assert np.allclose(compact[tlm2wav_parse.TIME] / 1000.0,
+                       tlm[tlm2wav_parse.TIME], rtol=0, atol=1e-9)
+    for key in (1, 2, 3):
+        assert np.allclose(compact[key] / 3600.0, tlm[key], rtol=0,
+                           atol=1e-9)
@@ -0,0 +1,141 @@
+import wave
+
+import numpy as np
+import pytest
+
+import tlm2wav_render
+
+__author__ = 'Don D.S'
+
+
+def _telemetry(size=2000, seed=0):
+    # Телеметрия: неравномерный шаг по времени, значения - углы
+    rng = np.random.default_rng(seed)
+    times = np.cumsum(rng.uniform(0.05, 0.15, size))
+    values = np.cumsum(rng.normal(0, 3, size))
+    return times, values
+
+
+@pytest.mark.parametrize('stereo', [False, True])
+def test_phase_accumulator_chunking(stereo):
+    # Фазы фреймов не зависят от разбиения фреймов на блоки
+    rng = np.random.default_rng(1)
+    amps = rng.uniform(-1, 1, 10000) * 32767
+    if stereo:
+        amps = amps + 1j * rng.uniform(-1, 1, amps.size) * 32767
+    whole = tlm2wav_render.PhaseAccumulator((200, 2000), 8000, 32767)(amps)
+    synth = tlm2wav_render.PhaseAccumulator((200, 2000), 8000, 32767)
+    bounds = [0, 1, 7, 1000, 1001, 4096, 9999, amps.size]
+    chunked = np.concatenate([synth(amps[a:b])
+                              for a, b in zip(bounds, bounds[1:])])
+    assert np.array_equal(whole, chunked)
+
+
+@pytest.mark.parametrize('interpolation', ['linear', 'cubic', 'sinc'])
+@pytest.mark.parametrize('stereo', [False, True])
+def test_live_sound_equals_rendered(interpolation, stereo):
+    # Звук, вычисляемый при чтении блоками разной длины, совпадает с
+    # созданным заранее (и в режиме высоты тона)
+    times, values = _telemetry()
+    if stereo:
+        values = (values, -0.5 * values)
+    params = dict(multiplier=20, framerate=8000, interpolation=interpolation,
+                  pitch=(200, 2000))
+    sound = tlm2wav_render.render_sound(times, values, chunk_frames=3001,
+                                        **params)
+    live = tlm2wav_render.LiveSound(times, values, lookahead=517, **params)
+    chunks = []
+    start = 0
+    for count in [1, 100, 1023, 5000] * 1000:
+        if start >= live.nframes:
+            break
+        chunks.append(np.array(live.read(start, count)))
+        start += count
+    assert np.array_equal(np.concatenate(chunks), sound.data)
+
+
+FORMATS = [(1, tlm2wav_render.WAVE_FORMAT_PCM),
+           (2, tlm2wav_render.WAVE_FORMAT_PCM),
+           (3, tlm2wav_render.WAVE_FORMAT_PCM),
+           (4, tlm2wav_render.WAVE_FORMAT_PCM),
+           (4, tlm2wav_render.WAVE_FORMAT_IEEE_FLOAT)]
+
+
+@pytest.mark.parametrize('sampwidth, wave_format', FORMATS)
+def test_encode_decode(sampwidth, wave_format):
+    max_vol = tlm2wav_render.max_volume(sampwidth, wave_format)
+    samples = np.linspace(-max_vol, max_vol, 1001)
+    data = tlm2wav_render.encode(samples, sampwidth, wave_format)
+    assert data.dtype == np.uint8 and data.size == samples.size * sampwidth
+    decoded = tlm2wav_render.decode(data, sampwidth, wave_format)
+    if wave_format == tlm2wav_render.WAVE_FORMAT_IEEE_FLOAT:
+        expected = samples.astype(np.float32)
+    elif sampwidth == 1:
+        # 8-битные - без знака (отрицательные инвертируются)
+        expected = np.trunc(np.abs(samples))
+    else:
+        expected = np.trunc(samples)
+    assert np.array_equal(decoded, expected)
+
+
+@pytest.mark.parametrize('sampwidth, wave_format', FORMATS)
+@pytest.mark.parametrize('nchannels', [1, 2])
+def test_wav_header(tmp_path, sampwidth, wave_format, nchannels):
+    nframes = 123
+    path = str(tmp_path / 'sound.wav')
+    header = tlm2wav_render.wav_header(nchannels, sampwidth, 8000, nframes,
+                                       wave_format)
+    with open(path, 'wb') as f:
+        f.write(header + bytes(nframes * nchannels * sampwidth))
+    assert tlm2wav_render.read_wav_params(path) == tlm2wav_render.WavParams(
+        nchannels, sampwidth, 8000, nframes, wave_format, len(header))
+    if wave_format == tlm2wav_render.WAVE_FORMAT_PCM:
+        with wave.open(path, 'rb') as w:
+            assert w.getparams()[:4] == (nchannels, sampwidth, 8000, nframes)
+
+
+@pytest.mark.parametrize('sampwidth, wave_format', FORMATS)
+@pytest.mark.parametrize('stereo', [False, True])
+@pytest.mark.parametrize('jobs', [1, 2])
+def test_render_wav_equals_saved_sound(tmp_path, sampwidth, wave_format,
+                                       stereo, jobs):
+    times, values = _telemetry()
+    if stereo:
+        values = (values, np.cos(values))
+    params = dict(multiplier=20, framerate=8000, sampwidth=sampwidth,
+                  nchannels=2, wave_format=wave_format, interpolation='cubic',
+                  chunk_frames=1000)
+    rendered = str(tmp_path / 'rendered.wav')
+    saved = str(tmp_path / 'saved.wav')
+    tlm2wav_render.render_wav(rendered, times, values, jobs=jobs,
+                              parallel_threshold=0, **params)
+    tlm2wav_render.render_sound(times, values, **params).save(saved)
+    with open(rendered, 'rb') as f1, open(saved, 'rb') as f2:
+        assert f1.read() == f2.read()
+
+
+@pytest.mark.parametrize('interpolation', ['linear', 'cubic', 'sinc'])
+@pytest.mark.parametrize('stereo', [False, True])
+def test_partial_rerender(interpolation, stereo):
+    # Пересоздание части звука после изменения значений совпадает с
+    # созданием звука заново целиком
+    times, values = _telemetry()
+    changed = values.copy()
+    changed[500:510] += 5
+    changed[1500] -= 5
+    if stereo:
+        values, changed = (values, -values), (changed, -values)
+    params = dict(multiplier=20, framerate=8000,
+                  interpolation=interpolation)
+    previous = tlm2wav_render.render_sound(times, values, **params)
+    totals = []
+    partial = tlm2wav_render.render_sound(
+        times, changed, previous=previous,
+        progress=lambda done, total: totals.append(total), **params)
+    full = tlm2wav_render.render_sound(times, changed, **params)
+    assert np.array_equal(partial.data, full.data)
+    assert 0 < totals[-1] < full.nframes
+    # previous не изменяется
+    assert np.array_equal(
+        previous.data, tlm2wav_render.render_sound(times, values,
+                                                   **params).data)
@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+
+pytest.importorskip('PyQt4')
+import tlm2wav_cache
+import tlm2wav_parse
+import tlm2wav_utils as u
+
+__author__ = 'Don D.S'
+
+
+def test_compact_telemetry(tlm_txt):
+    # Компактные столбцы телеметрии переводятся в секунды и градусы
+    # при обращении
+    tlm = u.Telemetry(tlm_txt, use_cache=False, jobs=1)
+    compact = u.Telemetry(tlm_txt, use_cache=False, jobs=1, compact=True)
+    for param in (u.TIME, u.LEFT, u.RIGHT):
+        assert np.allclose(compact.get_tlm(param), tlm.get_tlm(param),
+                           rtol=0, atol=1e-9)
+
+
+@pytest.mark.parametrize('param', [u.LEFT, u.RIGHT, u.LEFT | u.RIGHT,
+                                   u.STEREO])
+def test_sound_blocks_equal_sound_values(tlm_txt, param):
+    tlm = u.Telemetry(tlm_txt, use_cache=False, jobs=1)
+    tlm.observs[u.CALIB].append(u.TimeInterval(10, 20))
+    tlm.observs[u.CALIB].append(u.TimeInterval(200, 210))
+    blocks = tlm.sound_blocks(param)
+    values = tlm.sound_values(param)
+    assert blocks.size == tlm.get_tlm(u.TIME).size
+    assert np.array_equal(blocks.times(0, blocks.size), tlm.get_tlm(u.TIME))
+    if param == u.STEREO:
+        for block, column in zip(blocks.values(5, 1500), values):
+            assert np.array_equal(block, column[5:1500])
+    else:
+        assert np.array_equal(blocks.values(5, 1500), values[5:1500])
+
+
+def test_cached_telemetry_invalidated(tlm_txt, tmp_path, monkeypatch):
+    # Разобранная телеметрия берётся из кэша, пока файл не изменится
+    monkeypatch.setenv('TLM2WAV_CACHE_DIR', str(tmp_path / 'cache'))
+    monkeypatch.delenv('TLM2WAV_NO_CACHE', raising=False)
+    path = tmp_path / 'tlm.txt'
+    with open(tlm_txt, 'rb') as f:
+        lines = f.read().split(b'\n')
+    path.write_bytes(b'\n'.join(lines[:1000]) + b'\n')
+    first = u.Telemetry(str(path), use_cache=True, jobs=1)
+    assert len(tlm2wav_cache.TlmCache().entries()) == 1
+    again = u.Telemetry(str(path), use_cache=True, jobs=1)
+    assert isinstance(again.tlm[u.TIME], np.memmap)
+    assert again.content_key() == first.content_key()
+    path.write_bytes(b'\n'.join(lines[:2000]) + b'\n')
+    changed = u.Telemetry(str(path), use_cache=True, jobs=1)
+    assert np.array_equal(changed.get_tlm(u.TIME),
+                          tlm2wav_parse.parse_tlm_txt_regex(str(path))[u.TIME])
+    assert changed.content_key() != first.content_key()
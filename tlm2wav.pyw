@@ -5,6 +5,7 @@
 """
 
 import sys
+import multiprocessing
 from PyQt4 import QtGui, QtCore
 import qt_gui
 
@@ -29,4 +30,6 @@ def main():
 
 
 if __name__ == "__main__":
+    # Для параллельного разбора телеметрии в собранном pyinstaller'ом exe
+    multiprocessing.freeze_support()
     main()
@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+# -*- encoding: utf-8 -*-
+"""
+Замеры производительности программы tlm2wav.
+
+Пример запуска:
+$ python tlm2wav_bench.py parse --scale 1000
+$ python tlm2wav_bench.py render --framerate 44100
+$ python tlm2wav_bench.py interp --framerate 44100
+$ python tlm2wav_bench.py playback --minutes 1 10 30
+"""
+
+import argparse
+import os
+import struct
+import sys
+import tempfile
+import time
+import tracemalloc
+import wave
+import numpy as np
+import tlm2wav_parse
+import tlm2wav_render
+import tlm2wav_utils
+
+__author__ = 'Don D.S'
+
+# Файл телеметрии, используемый для замеров
+DEMO_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                         'input_demo.txt')
+
+
+def make_scaled_tlm(scale, src=DEMO_FILE, dst=None):
+    """ Создать файл телеметрии, увеличенный в заданное число раз
+    (строки данных исходного файла повторяются scale раз)
+
+    :param scale: во сколько раз увеличить файл
+    :param src:   исходный файл телеметрии
+    :param dst:   путь создаваемого файла. Если не задан - временный файл
+    :return:      путь к созданному файлу
+    """
+    with open(src, 'rb') as f:
+        header = f.readline()
+        body = f.read()
+    if dst is None:
+        fd, dst = tempfile.mkstemp(suffix='.txt', prefix='tlm2wav_bench_')
+        os.close(fd)
+    with open(dst, 'wb') as f:
+        f.write(header)
+        for _ in range(scale):
+            f.write(body)
+    return dst
+
+
+def timeit(func, *args, **kwargs):
+    """ Время выполнения функции, секунд, и её результат
+    """
+    time_start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return time.perf_counter() - time_start, result
+
+
+def bench_parse(scale=1000, regex=True, jobs=None, sensors=None):
+    """ Сравнить скорость разбора телеметрии (строк в секунду):
+    построчного регулярным выражением и векторного
+    (в одном и в нескольких процессах).
+
+    :param scale: во сколько раз увеличить input_demo.txt
+    :param regex: замерять также построчный разбор (медленный)
+    :param jobs:  число процессов параллельного разбора.
+                  По умолчанию - по числу процессоров
+    :param sensors: номера разбираемых датчиков (векторный разбор).
+                    По умолчанию - все
+    """
+    path = make_scaled_tlm(scale)
+    try:
+        size_mb = os.path.getsize(path) / 2**20
+        print('Файл: {0} ({1:.1f} МБ)'.format(path, size_mb))
+        parsers = [('vectorized',
+                    lambda path: tlm2wav_parse.parse_tlm_txt(
+                        path, jobs=1, sensors=sensors)),
+                   ('parallel',
+                    lambda path: tlm2wav_parse.parse_tlm_txt(
+                        path, jobs=jobs, parallel_threshold=0,
+                        sensors=sensors))]
+        if regex:
+            parsers.append(('regex', tlm2wav_parse.parse_tlm_txt_regex))
+        for name, parser in parsers:
+            seconds, tlm = timeit(parser, path)
+            rows = tlm[tlm2wav_parse.TIME].size
+            print('{0:>12}: {1:10d} строк за {2:8.3f} с - {3:12.0f} строк/с'
+                  .format(name, rows, seconds, rows / seconds))
+    finally:
+        os.remove(path)
+
+
+def render_wav_legacy(outfile, times, values, multiplier=200, framerate=8000,
+                      sampwidth=2, max_frames=None):
+    """ Прежний способ создания аудиофайла - по одному фрейму за раз
+    (np.interp и struct.pack на каждый фрейм). Для сравнения скорости.
+
+    :param max_frames: записать не более заданного числа фреймов
+    :return:           число записанных фреймов
+    """
+    sample_fmt = struct.Struct({1: 'B', 2: '<h', 4: '<i'}[sampwidth])
+    values = values/np.max(np.abs(values))*tlm2wav_render.max_volume(sampwidth)
+    times = times / multiplier
+    nframes = int(np.max(times)*framerate)
+    if max_frames is not None:
+        nframes = min(nframes, max_frames)
+    with wave.open(outfile, 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(sampwidth)
+        wav.setframerate(framerate)
+        for frame in range(nframes):
+            value = np.interp(frame/framerate, times, values)
+            if sampwidth == 1:
+                value = np.abs(value)
+            wav.writeframesraw(sample_fmt.pack(int(value)))
+    return nframes
+
+
+def bench_render(scale=1, multiplier=200, framerate=44100, sample_format='16',
+                 legacy_frames=200000, jobs=None):
+    """ Сравнить скорость создания аудиофайла (фреймов в секунду):
+    прежнего покадрового и векторного.
+
+    :param scale:         во сколько раз увеличить input_demo.txt
+    :param multiplier:    множитель скорости воспроизведения
+    :param framerate:     Гц, фреймов в секунду
+    :param sample_format: формат сэмплов - ключ
+                          tlm2wav_render.SAMPLE_FORMATS
+    :param legacy_frames: число фреймов, создаваемых прежним способом
+                          (он медленный; только 8, 16 и 32 бит). 0 - не
+                          замерять
+    :param jobs:          число процессов параллельного создания.
+                          По умолчанию - по числу процессоров
+    """
+    path = make_scaled_tlm(scale)
+    fd, outfile = tempfile.mkstemp(suffix='.wav', prefix='tlm2wav_bench_')
+    os.close(fd)
+    try:
+        tlm = tlm2wav_utils.Telemetry(path, use_cache=False)
+        times = tlm.get_tlm(tlm2wav_utils.TIME)
+        values = tlm.get_tlm(tlm2wav_utils.RIGHT)
+        sampwidth, wave_format = tlm2wav_render.SAMPLE_FORMATS[sample_format]
+        args = (outfile, times, values, multiplier, framerate, sampwidth)
+        renders = [('vectorized', lambda *args: tlm2wav_render.render_wav(
+                       *args, wave_format=wave_format)),
+                   ('parallel', lambda *args: tlm2wav_render.render_wav(
+                       *args, jobs=jobs, parallel_threshold=0,
+                       wave_format=wave_format))]
+        if legacy_frames and sample_format in ('8', '16', '32'):
+            renders.append(('legacy', lambda *args: render_wav_legacy(
+                *args, max_frames=legacy_frames)))
+        for name, render in renders:
+            seconds, nframes = timeit(render, *args)
+            print('{0:>12}: {1:10d} фреймов за {2:8.3f} с - '
+                  '{3:12.0f} фреймов/с'.format(name, nframes, seconds,
+                                               nframes / seconds))
+    finally:
+        os.remove(path)
+        os.remove(outfile)
+
+
+def bench_interp(scale=1, multiplier=200, framerate=44100, sample_format='16',
+                 interpolations=None):
+    """ Сравнить способы интерполяции: скорость создания аудиофайла
+    (фреймов в секунду и во сколько раз быстрее воспроизведения) и пиковый
+    расход памяти при создании (по tracemalloc - включая массивы numpy).
+
+    :param scale:          во сколько раз увеличить input_demo.txt
+    :param multiplier:     множитель скорости воспроизведения
+    :param framerate:      Гц, фреймов в секунду
+    :param sample_format:  формат сэмплов - ключ
+                           tlm2wav_render.SAMPLE_FORMATS
+    :param interpolations: названия способов интерполяции.
+                           По умолчанию - все tlm2wav_render.INTERPOLATIONS
+    """
+    path = make_scaled_tlm(scale)
+    fd, outfile = tempfile.mkstemp(suffix='.wav', prefix='tlm2wav_bench_')
+    os.close(fd)
+    try:
+        tlm = tlm2wav_utils.Telemetry(path, use_cache=False)
+        times = tlm.get_tlm(tlm2wav_utils.TIME)
+        values = tlm.get_tlm(tlm2wav_utils.RIGHT)
+        sampwidth, wave_format = tlm2wav_render.SAMPLE_FORMATS[sample_format]
+        for name in interpolations or tlm2wav_render.INTERPOLATIONS:
+            tracemalloc.start()
+            try:
+                seconds, nframes = timeit(
+                    tlm2wav_render.render_wav, outfile, times, values,
+                    multiplier, framerate, sampwidth,
+                    wave_format=wave_format, interpolation=name)
+                peak = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+            print('{0:>12}: {1:12.0f} фреймов/с, в {2:7.1f} раз быстрее '
+                  'воспроизведения, пик памяти {3:7.1f} МБ'.format(
+                      name, nframes / seconds,
+                      nframes / framerate / seconds, peak / 2**20))
+    finally:
+        os.remove(path)
+        os.remove(outfile)
+
+
+def _callback_latency(read, nframes, frame_count, callbacks):
+    # Время вызовов read(cursor, frame_count), мкс: callbacks вызовов,
+    # равномерно распределённых по звуку длиной nframes фреймов
+    latency = []
+    for cursor in np.linspace(0, nframes - frame_count, callbacks,
+                              dtype=np.int64):
+        time_start = time.perf_counter()
+        read(int(cursor), frame_count)
+        latency.append(time.perf_counter() - time_start)
+    return np.array(latency) * 1e6
+
+
+def bench_playback(minutes=(1, 10, 30), framerate=44100, frame_count=1024,
+                   callbacks=1000, legacy_callbacks=50):
+    """ Задержка callback-функции воспроизведения (мкс на вызов) в
+    зависимости от длины звука: чтение среза по курсору
+    (tlm2wav_render.Sound.read) и прежнее отрезание начала остатка данных
+    (data, rest = rest[:n], rest[n:] - копирует весь остаток).
+
+    Звук - 16 бит, моно.
+
+    :param minutes:          длины звука, минут
+    :param framerate:        Гц, фреймов в секунду
+    :param frame_count:      фреймов в одном вызове callback-функции
+    :param callbacks:        число замеряемых вызовов (по всему звуку)
+    :param legacy_callbacks: число замеряемых вызовов прежним способом
+                             (с начала звука; он медленный). 0 - не замерять
+    """
+    sampwidth = 2
+    nbytes = frame_count * sampwidth
+    for length in minutes:
+        data = np.zeros(int(length * 60 * framerate) * sampwidth,
+                        dtype=np.uint8)
+        sound = tlm2wav_render.Sound(data, 1, sampwidth, framerate)
+        latency = _callback_latency(sound.read, sound.nframes, frame_count,
+                                    callbacks)
+        print('{0:6g} мин {1:>8}: медиана {2:10.1f} мкс, максимум {3:10.1f} '
+              'мкс'.format(length, 'cursor', np.median(latency),
+                           latency.max()))
+        if not legacy_callbacks:
+            continue
+        rest = data.tobytes()
+        latency = []
+        for _ in range(legacy_callbacks):
+            time_start = time.perf_counter()
+            chunk, rest = rest[:nbytes], rest[nbytes:]
+            latency.append(time.perf_counter() - time_start)
+        latency = np.array(latency) * 1e6
+        print('{0:6g} мин {1:>8}: медиана {2:10.1f} мкс, максимум {3:10.1f} '
+              'мкс'.format(length, 'legacy', np.median(latency),
+                           latency.max()))
+        del rest
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Замеры производительности tlm2wav')
+    commands = parser.add_subparsers(dest='command')
+    cmd = commands.add_parser('parse', help='разбор *.txt телеметрии')
+    cmd.add_argument('--scale', type=int, default=1000,
+                     help='во сколько раз увеличить input_demo.txt')
+    cmd.add_argument('--no-regex', action='store_true',
+                     help='не замерять построчный разбор')
+    cmd.add_argument('--jobs', type=int, default=None,
+                     help='число процессов параллельного разбора')
+    cmd.add_argument('--sensors', type=int, nargs='+', default=None,
+                     choices=(1, 2, 3),
+                     help='номера разбираемых датчиков (по умолчанию - все)')
+    cmd = commands.add_parser('render', help='создание аудиофайла')
+    cmd.add_argument('--scale', type=int, default=1,
+                     help='во сколько раз увеличить input_demo.txt')
+    cmd.add_argument('--multiplier', type=int, default=200,
+                     help='множитель скорости воспроизведения')
+    cmd.add_argument('--framerate', type=int, default=44100,
+                     help='частота дискретизации, Гц')
+    cmd.add_argument('--format', default='16',
+                     choices=tuple(tlm2wav_render.SAMPLE_FORMATS),
+                     help='формат сэмплов: целые 8...32 бит или float32')
+    cmd.add_argument('--legacy-frames', type=int, default=200000,
+                     help='число фреймов, создаваемых прежним (покадровым) '
+                          'способом; 0 - не замерять')
+    cmd.add_argument('--jobs', type=int, default=None,
+                     help='число процессов параллельного создания')
+    cmd = commands.add_parser('interp', help='способы интерполяции')
+    cmd.add_argument('--scale', type=int, default=1,
+                     help='во сколько раз увеличить input_demo.txt')
+    cmd.add_argument('--multiplier', type=int, default=200,
+                     help='множитель скорости воспроизведения')
+    cmd.add_argument('--framerate', type=int, default=44100,
+                     help='частота дискретизации, Гц')
+    cmd.add_argument('--format', default='16',
+                     choices=tuple(tlm2wav_render.SAMPLE_FORMATS),
+                     help='формат сэмплов: целые 8...32 бит или float32')
+    cmd.add_argument('--interpolation', nargs='+', default=None,
+                     choices=tuple(tlm2wav_render.INTERPOLATIONS),
+                     help='способы интерполяции (по умолчанию - все)')
+    cmd = commands.add_parser('playback',
+                              help='задержка callback-функции воспроизведения')
+    cmd.add_argument('--minutes', type=float, nargs='+', default=[1, 10, 30],
+                     help='длины звука, минут')
+    cmd.add_argument('--framerate', type=int, default=44100,
+                     help='частота дискретизации, Гц')
+    cmd.add_argument('--frame-count', type=int, default=1024,
+                     help='фреймов в одном вызове callback-функции')
+    cmd.add_argument('--legacy-callbacks', type=int, default=50,
+                     help='число вызовов, замеряемых прежним способом '
+                          '(копирование остатка данных); 0 - не замерять')
+    args = parser.parse_args()
+    if args.command == 'parse':
+        bench_parse(args.scale, regex=not args.no_regex, jobs=args.jobs,
+                    sensors=args.sensors)
+    elif args.command == 'render':
+        bench_render(args.scale, args.multiplier, args.framerate,
+                     args.format, args.legacy_frames, args.jobs)
+    elif args.command == 'interp':
+        bench_interp(args.scale, args.multiplier, args.framerate,
+                     args.format, args.interpolation)
+    elif args.command == 'playback':
+        bench_playback(args.minutes, args.framerate, args.frame_count,
+                       legacy_callbacks=args.legacy_callbacks)
+    else:
+        parser.print_help()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
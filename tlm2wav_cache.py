@@ -0,0 +1,346 @@
+#!/usr/bin/env python3
+# -*- encoding: utf-8 -*-
+"""
+Кэш разобранной телеметрии программы tlm2wav.
+
+Столбцы телеметрии сохраняются в каталоге кэша в виде *.npy файлов
+(по одному файлу на столбец) и при повторном открытии того же файла
+телеметрии загружаются отображением в память - без повторного разбора.
+
+Запись кэша определяется ключом из пути, размера, времени изменения и
+хэша содержимого исходного файла. При превышении предельного размера кэша
+удаляются записи, дольше всех не использовавшиеся (LRU).
+
+Настройки через переменные окружения:
+    TLM2WAV_CACHE_DIR   - каталог кэша (по умолчанию ~/.cache/tlm2wav)
+    TLM2WAV_CACHE_LIMIT - предельный размер кэша, МБ (по умолчанию 2048)
+    TLM2WAV_NO_CACHE    - если задана (не пустая) - кэш не используется
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import time
+import numpy as np
+
+__author__ = 'Don D.S'
+
+# Предельный размер кэша по умолчанию, байт
+DEFAULT_LIMIT = 2048 * 2**20
+# Размер фрагмента файла для хэша содержимого, байт
+_HASH_BLOCK = 2**16
+# Число фрагментов из середины файла, включаемых в хэш содержимого
+_HASH_SAMPLES = 16
+# Файл с описанием записи кэша
+_META = 'meta.json'
+
+
+def default_dir():
+    """ Каталог кэша по умолчанию
+    """
+    directory = os.environ.get('TLM2WAV_CACHE_DIR')
+    if directory:
+        return directory
+    base = os.environ.get('XDG_CACHE_HOME',
+                          os.path.join(os.path.expanduser('~'), '.cache'))
+    return os.path.join(base, 'tlm2wav')
+
+
+def default_limit():
+    """ Предельный размер кэша по умолчанию, байт
+    """
+    limit = os.environ.get('TLM2WAV_CACHE_LIMIT')
+    if limit:
+        return int(float(limit) * 2**20)
+    return DEFAULT_LIMIT
+
+
+def enabled():
+    """ True, если использование кэша не запрещено переменной окружения
+    """
+    return not os.environ.get('TLM2WAV_NO_CACHE')
+
+
+class NpyWriter(object):
+    """ Запись одномерного *.npy файла блоками, когда число элементов
+    заранее неизвестно.
+
+    Место под заголовок резервируется в начале файла, заголовок
+    записывается при закрытии.
+    """
+    # Размер резервируемого заголовка, байт (кратен 64)
+    _HEADER_SIZE = 128
+
+    def __init__(self, path, dtype=np.float64):
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self.count = 0
+        self._file = open(path, 'wb')
+        self._file.write(b'\0' * self._HEADER_SIZE)
+
+    def write(self, values):
+        """ Дописать значения в конец файла
+        """
+        values = np.ascontiguousarray(values, dtype=self.dtype)
+        self._file.write(memoryview(values).cast('B'))
+        self.count += values.size
+
+    def close(self):
+        """ Записать заголовок и закрыть файл
+        """
+        if self._file.closed:
+            return
+        header = "{{'descr': {0!r}, 'fortran_order': False, 'shape': ({1},), }}"\
+            .format(np.lib.format.dtype_to_descr(self.dtype), self.count)
+        # magic + версия 1.0 + длина заголовка (2 байта) = 10 байт
+        header = header.ljust(self._HEADER_SIZE - 11) + '\n'
+        self._file.seek(0)
+        self._file.write(np.lib.format.magic(1, 0))
+        self._file.write(len(header).to_bytes(2, 'little'))
+        self._file.write(header.encode('latin1'))
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def write_columns(directory, names, blocks, dtypes=None):
+    """ Записать столбцы, поступающие блоками, в *.npy файлы каталога
+    (по файлу <имя>.npy на столбец) и загрузить их отображением в память.
+    В памяти одновременно находится только один блок.
+
+    :param directory: каталог для файлов столбцов
+    :param names:     имена (номера) столбцов
+    :param blocks:    итерируемая последовательность блоков - кортежей
+                      np.array-массивов в порядке names
+    :param dtypes:    типы значений столбцов. По умолчанию - float64
+    :return:          словарь {имя столбца: np.memmap}
+    """
+    if dtypes is None:
+        dtypes = [np.float64] * len(names)
+    writers = [NpyWriter(os.path.join(directory, str(name) + '.npy'), dtype)
+               for name, dtype in zip(names, dtypes)]
+    try:
+        for block in blocks:
+            for writer, values in zip(writers, block):
+                writer.write(values)
+    finally:
+        for writer in writers:
+            writer.close()
+    return load_columns(directory, names)
+
+
+def load_columns(directory, names):
+    """ Загрузить *.npy файлы столбцов каталога отображением в память
+
+    :return: словарь {имя столбца: np.memmap}
+    """
+    columns = {}
+    for name in names:
+        column = np.load(os.path.join(directory, str(name) + '.npy'),
+                         mmap_mode='r')
+        # Пустой файл не отображается в память
+        columns[name] = column if column.size else np.array(column)
+    return columns
+
+
+def content_hash(path):
+    """ Хэш содержимого файла.
+
+    Небольшие файлы хэшируются целиком. Для больших файлов хэшируются
+    начало, конец и равномерно расположенные фрагменты из середины -
+    этого достаточно, чтобы отличить перезаписанный файл, не читая его
+    полностью.
+
+    :param path: путь к файлу
+    :return:     шестнадцатеричная строка хэша
+    """
+    digest = hashlib.sha1()
+    size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        if size <= _HASH_BLOCK * (_HASH_SAMPLES + 2):
+            for chunk in iter(lambda: f.read(_HASH_BLOCK), b''):
+                digest.update(chunk)
+        else:
+            step = (size - _HASH_BLOCK) // (_HASH_SAMPLES + 1)
+            for i in range(_HASH_SAMPLES + 2):
+                f.seek(i * step)
+                digest.update(f.read(_HASH_BLOCK))
+    return digest.hexdigest()
+
+
+class TlmCache(object):
+    """ Кэш столбцов телеметрии на диске с вытеснением по LRU
+
+    Запись кэша - каталог <ключ> со столбцами <номер столбца>.npy
+    и файлом описания meta.json. Время изменения meta.json - время
+    последнего использования записи.
+    """
+    def __init__(self, directory=None, limit=None):
+        """
+        :param directory: каталог кэша. По умолчанию - default_dir()
+        :param limit:     предельный размер кэша, байт.
+                          По умолчанию - default_limit()
+        """
+        self.directory = directory or default_dir()
+        self.limit = default_limit() if limit is None else limit
+
+    def key(self, path, variant=None):
+        """ Ключ записи кэша для файла телеметрии
+        (по пути, размеру, времени изменения и хэшу содержимого)
+
+        :param path:    путь к файлу телеметрии
+        :param variant: строка, различающая записи одного файла, разобранного
+                        по-разному (например, 'compact')
+        """
+        stat = os.stat(path)
+        parts = [os.path.abspath(path),
+                 str(stat.st_size),
+                 str(stat.st_mtime_ns),
+                 content_hash(path)]
+        if variant:
+            parts.append(variant)
+        ident = '\n'.join(parts)
+        return hashlib.sha1(ident.encode('utf8')).hexdigest()
+
+    def _entry(self, key):
+        return os.path.join(self.directory, key)
+
+    def load(self, key):
+        """ Загрузить столбцы из кэша отображением в память
+
+        :param key: ключ записи кэша
+        :return:    словарь {номер (имя) столбца: np.memmap} или None,
+                    если записи нет
+        """
+        entry = self._entry(key)
+        try:
+            with open(os.path.join(entry, _META), encoding='utf8') as f:
+                meta = json.load(f)
+            # Номера столбцов телеметрии - числа, прочие имена - строки
+            columns = load_columns(
+                entry, [int(name) if name.isdigit() else name
+                        for name in meta['columns']])
+        except (OSError, ValueError, KeyError):
+            return None
+        # Отметить время использования записи
+        try:
+            os.utime(os.path.join(entry, _META))
+        except OSError:
+            pass
+        return columns
+
+    def store(self, key, columns, source=None):
+        """ Сохранить столбцы в кэш
+
+        :param key:     ключ записи кэша
+        :param columns: словарь {номер столбца: np.array}
+        :param source:  путь к исходному файлу (для справки)
+        :return:        словарь {номер столбца: np.memmap} из кэша
+        """
+        names = list(columns)
+        block = tuple(np.asarray(columns[name]) for name in names)
+        return self.store_blocks(key, names, [block], source,
+                                 dtypes=[column.dtype for column in block])
+
+    def store_blocks(self, key, names, blocks, source=None, dtypes=None):
+        """ Сохранить в кэш столбцы, поступающие блоками
+        (см. write_columns)
+
+        :param key:     ключ записи кэша
+        :param names:   номера столбцов
+        :param blocks:  итерируемая последовательность блоков - кортежей
+                        np.array-массивов в порядке names
+        :param source:  путь к исходному файлу (для справки)
+        :param dtypes:  типы значений столбцов. По умолчанию - float64
+        :return:        словарь {номер столбца: np.memmap} из кэша
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        entry = self._entry(key)
+        tmp = '{0}.tmp{1}'.format(entry, os.getpid())
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        try:
+            write_columns(tmp, names, blocks, dtypes)
+            meta = {'source': source and os.path.abspath(source),
+                    'columns': [str(name) for name in names],
+                    'created': time.time()}
+            with open(os.path.join(tmp, _META), 'w', encoding='utf8') as f:
+                json.dump(meta, f, ensure_ascii=False)
+            # Запись появляется в кэше целиком или не появляется вовсе
+            os.replace(tmp, entry)
+        except OSError:
+            shutil.rmtree(tmp, ignore_errors=True)
+            if not os.path.isdir(entry):
+                raise
+        except BaseException:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+        columns = load_columns(entry, names)
+        self.evict(keep=key)
+        return columns
+
+    def entries(self):
+        """ Список записей кэша, начиная с давно не использовавшихся
+
+        :return: список словарей с ключами
+                 'key', 'source', 'size' (байт), 'used' (время использования)
+        """
+        if not os.path.isdir(self.directory):
+            return []
+        out = []
+        for key in os.listdir(self.directory):
+            entry = self._entry(key)
+            meta_path = os.path.join(entry, _META)
+            if not os.path.isfile(meta_path):
+                continue
+            try:
+                with open(meta_path, encoding='utf8') as f:
+                    meta = json.load(f)
+                size = sum(os.path.getsize(os.path.join(entry, name))
+                           for name in os.listdir(entry))
+                used = os.path.getmtime(meta_path)
+            except (OSError, ValueError):
+                continue
+            out.append({'key': key, 'source': meta.get('source'),
+                        'size': size, 'used': used})
+        out.sort(key=lambda item: item['used'])
+        return out
+
+    def size(self):
+        """ Суммарный размер записей кэша, байт
+        """
+        return sum(item['size'] for item in self.entries())
+
+    def remove(self, key):
+        """ Удалить запись кэша
+        """
+        shutil.rmtree(self._entry(key), ignore_errors=True)
+
+    def evict(self, limit=None, keep=None):
+        """ Удалить давно не использовавшиеся записи, пока суммарный размер
+        кэша превышает предел
+
+        :param limit: предельный размер, байт. По умолчанию - self.limit
+        :param keep:  ключ записи, которую не удалять (используемой сейчас)
+        """
+        limit = self.limit if limit is None else limit
+        entries = self.entries()
+        total = sum(item['size'] for item in entries)
+        for item in entries:
+            if total <= limit:
+                break
+            if item['key'] == keep:
+                continue
+            self.remove(item['key'])
+            total -= item['size']
+
+    def clear(self):
+        """ Очистить кэш
+        """
+        for item in self.entries():
+            self.remove(item['key'])
@@ -0,0 +1,581 @@
+#!/usr/bin/env python3
+# -*- encoding: utf-8 -*-
+"""
+Разбор *.txt файлов телеметрии программы tlm2wav.
+
+Модуль зависит только от numpy (без PyQt4): разбор используется
+tlm2wav_utils, замерами производительности tlm2wav_bench и тестами.
+Столбцы фиксированной раскладки декодируются векторно, строки иной
+раскладки - регулярным выражением; большие файлы разбираются в нескольких
+процессах.
+"""
+
+import itertools
+import os
+import re
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+__author__ = 'Don D.S'
+
+# Ключ столбца времени в словаре телеметрии (tlm2wav_utils.TIME).
+# Ключи столбцов углов - номера датчиков 1, 2, 3
+TIME = 0b1000
+
+# Формат строки *.txt файла телеметрии
+_re_tlm_format = re.compile(
+    r"""[*]?[ ]?(?P<t>\d+)[ ]+                        # TIME VALUE [MS]
+    (?P<s3d>\d{3})°(?P<s3m>\d{2})´(?P<s3s>\d{2})´´[ ]+ # SENSOR 3 [DMS] мета
+    (?P<s2d>\d{3})°(?P<s2m>\d{2})´(?P<s2s>\d{2})´´[ ]+ # SENSOR 1 [DMS] лев
+    (?P<s1d>\d{3})°(?P<s1m>\d{2})´(?P<s1s>\d{2})´´[ ]+ # SENSOR 2 [DMS] прав
+    """, re.VERBOSE)
+# Тот же формат для поиска в байтах (для определения раскладки столбцов)
+_re_tlm_format_b = re.compile(_re_tlm_format.pattern.encode('utf8'),
+                              re.VERBOSE)
+# Шаблон столбца DDD°MM´SS´´ в байтах (в UTF-8 символы ° и ´ - по 2 байта)
+_DMS_TEMPLATE = '000°00´00´´'.encode('utf8')
+# Смещения цифр градусов, минут и секунд внутри столбца DMS
+_DMS_DIGITS = {'d': (0, 1, 2), 'm': (5, 6), 's': (9, 10)}
+# Порядок столбцов углов в строке: номер датчика по порядку следования
+_TLM_COLUMNS = (3, 2, 1)
+# Ключи словаря телеметрии в порядке столбцов *.txt файла
+TLM_KEYS = (TIME,) + _TLM_COLUMNS
+# Размер блока байт, считываемого из файла за один раз
+_PARSE_BLOCK_BYTES = 2 * 2**20
+# Размер файла (байт), начиная с которого разбор ведётся в нескольких
+# процессах
+PARALLEL_THRESHOLD = 64 * 2**20
+# Размер диапазона файла, разбираемого одним процессом за раз, байт
+_PARALLEL_RANGE_BYTES = 32 * 2**20
+# Диапазонов в разборе (и разобранных, но не выданных) на процесс
+_PARALLEL_RANGES_PER_JOB = 2
+# Максимальное число цифр времени, разбираемое векторно (без переполнения)
+_MAX_TIME_DIGITS = 18
+# Типы столбцов при компактном хранении:
+# время - целые миллисекунды, углы - целые угловые секунды
+_COMPACT_TIME_DTYPE = np.int64
+_COMPACT_ANGLE_DTYPE = np.int32
+# Делители, переводящие компактные значения в секунды и градусы
+_COMPACT_SCALE_TIME = 1000.0
+_COMPACT_SCALE_ANGLE = 3600.0
+
+
+def _tlm_keys(sensors=None):
+    """ Ключи загружаемых столбцов телеметрии в порядке следования
+    столбцов *.txt файла (время загружается всегда)
+
+    :param sensors: номера загружаемых датчиков (1, 2, 3).
+                    По умолчанию - все
+    :return:        кортеж ключей - подпоследовательность TLM_KEYS
+    """
+    if sensors is None:
+        return TLM_KEYS
+    unknown = set(sensors) - set(_TLM_COLUMNS)
+    if unknown:
+        raise ValueError(
+            'Неизвестные номера датчиков: {0}'.format(sorted(unknown)))
+    return (TIME,) + tuple(sens for sens in _TLM_COLUMNS if sens in sensors)
+
+
+def _tlm_dtypes(compact=False, sensors=None):
+    """ Типы столбцов телеметрии в порядке _tlm_keys(sensors)
+
+    :param compact: компактное хранение (целые мс и угловые секунды)
+    :param sensors: номера загружаемых датчиков. По умолчанию - все
+    """
+    keys = _tlm_keys(sensors)
+    if compact:
+        return tuple(_COMPACT_TIME_DTYPE if key == TIME
+                     else _COMPACT_ANGLE_DTYPE for key in keys)
+    return (np.float64,) * len(keys)
+
+
+def _empty_tlm(compact=False, sensors=None):
+    """ Кортеж пустых столбцов телеметрии в порядке _tlm_keys(sensors)
+    """
+    return tuple(np.array([], dtype=dtype)
+                 for dtype in _tlm_dtypes(compact, sensors))
+
+
+def _parse_tlm_lines(lines, compact=False):
+    """ Разбор строк телеметрии регулярным выражением (построчно).
+
+    :param lines:   последовательность строк (str)
+    :param compact: время - в целых мс, углы - в целых угловых секундах
+    :return:        кортеж списков (время, датчик 3, датчик 2, датчик 1)
+    """
+    t = []
+    s3 = []
+    s1 = []
+    s2 = []
+    for line in lines:
+        match = _re_tlm_format.search(line)
+        if not match:
+            continue
+        if compact:
+            t.append(int(match.group('t')))
+            for sens, column in (('s3', s3), ('s2', s2), ('s1', s1)):
+                column.append(int(match.group(sens + 'd'))*3600
+                              + int(match.group(sens + 'm'))*60
+                              + int(match.group(sens + 's')))
+            continue
+        t.append(int(match.group('t'))/1000)
+        s3.append(int(match.group('s3d'))
+                  + int(match.group('s3m'))/60.0
+                  + int(match.group('s3s'))/3600.0)
+        s2.append(int(match.group('s2d'))
+                  + int(match.group('s2m'))/60.0
+                  + int(match.group('s2s'))/3600.0)
+        s1.append(int(match.group('s1d'))
+                  + int(match.group('s1m'))/60.0
+                  + int(match.group('s1s'))/3600.0)
+    return t, s3, s2, s1
+
+
+def _tlm_layout(data):
+    """ Определить раскладку столбцов по первой распознанной строке.
+
+    :param data: bytes - блок текста телеметрии
+    :return:     кортеж (длина строки без перевода строки,
+                 (смещение столбца датчика 3, 2, 1)) или None
+    """
+    match = _re_tlm_format_b.search(data)
+    if not match:
+        return None
+    line_start = data.rfind(b'\n', 0, match.start()) + 1
+    line_end = data.find(b'\n', match.end())
+    if line_end < 0:
+        line_end = len(data)
+    if data[line_end-1:line_end] == b'\r':
+        line_end -= 1
+    offsets = tuple(match.start(name) - line_start
+                    for name in ('s3d', 's2d', 's1d'))
+    return line_end - line_start, offsets
+
+
+def _rows_table(buf, rows, length):
+    """ Представить строки одинаковой длины двумерным массивом байт.
+
+    Если строки следуют в буфере с постоянным шагом - возвращается
+    представление (без копирования), иначе - выборка байт строк.
+
+    :param buf:    np.array-массив байт (uint8)
+    :param rows:   индексы начал строк в buf
+    :param length: длина строк, байт
+    :return:       np.array-массив формы (число строк, length)
+    """
+    if rows.size == 0:
+        return np.empty((0, length), dtype=np.uint8)
+    step = rows[1] - rows[0] if rows.size > 1 else length
+    if step >= length and np.all(np.diff(rows) == step):
+        return np.lib.stride_tricks.as_strided(
+            buf[rows[0]:], shape=(rows.size, length),
+            strides=(step * buf.strides[0], buf.strides[0]),
+            writeable=False)
+    return buf[rows[:, None] + np.arange(length)]
+
+
+def _dms_mask(table, offset):
+    """ Маска строк, столбец DDD°MM´SS´´ которых соответствует шаблону
+
+    :param table:   np.array-массив байт строк формы (число строк, длина)
+    :param offset:  смещение столбца в строке, байт
+    """
+    ok = table[:, offset + len(_DMS_TEMPLATE)] == ord(' ')
+    for pos, byte in enumerate(_DMS_TEMPLATE):
+        if byte == ord('0'):
+            ok &= (table[:, offset+pos] - ord('0')) < 10
+        else:
+            ok &= table[:, offset+pos] == byte
+    return ok
+
+
+def _dms_column(table, offset, compact=False):
+    """ Декодировать столбец DDD°MM´SS´´ в градусы.
+
+    :param table:   np.array-массив байт строк формы (число строк, длина)
+    :param offset:  смещение столбца в строке, байт
+    :param compact: вернуть углы в целых угловых секундах
+    :return:        кортеж (маска строк, соответствующих шаблону столбца,
+                    np.array-массив углов в градусах)
+    """
+    ok = _dms_mask(table, offset)
+
+    def number(positions):
+        value = np.zeros(table.shape[0], dtype=np.int32)
+        for pos in positions:
+            value = value*10 + table[:, offset+pos] - ord('0')
+        return value
+
+    if compact:
+        return ok, (number(_DMS_DIGITS['d'])*3600
+                    + number(_DMS_DIGITS['m'])*60
+                    + number(_DMS_DIGITS['s']))
+    return ok, (number(_DMS_DIGITS['d'])
+                + number(_DMS_DIGITS['m'])/60.0
+                + number(_DMS_DIGITS['s'])/3600.0)
+
+
+def _time_column(window):
+    """ Декодировать столбец времени вида [*][ ]ЦИФРЫ[ ]+
+
+    :param window: np.array-массив байт столбца формы (число строк, ширина)
+    :return:       кортеж (маска строк, соответствующих шаблону столбца,
+                   np.array-массив целых значений времени)
+    """
+    # В конце - пробел
+    ok = window[:, -1] == ord(' ')
+    # Дальше проверяются только позиции от первой до последней, где хотя
+    # бы в одной строке не пробел (остальные - пробелы во всех строках)
+    used = np.flatnonzero(np.any(window != ord(' '), axis=0))
+    if used.size == 0:
+        return np.zeros_like(ok), np.zeros(window.shape[0], dtype=np.int64)
+    window = window[:, used[0]:used[-1]+1]
+    digits = (window - ord('0')) < 10
+    # Допустимы только цифры (одной группой), пробелы и '*'
+    ok &= np.all(digits | (window == ord(' ')) | (window == ord('*')), axis=1)
+    starts = np.count_nonzero(digits[:, 1:] & ~digits[:, :-1], axis=1) \
+        + digits[:, 0]
+    ok &= starts == 1
+    # '*' - только перед цифрами: после них до столбцов углов - пробелы
+    ok &= ~np.any((window == ord('*'))
+                  & np.logical_or.accumulate(digits, axis=1), axis=1)
+    ok &= np.count_nonzero(digits, axis=1) <= _MAX_TIME_DIGITS
+    # Число по схеме Горнера - только по позициям, где бывают цифры
+    value = np.zeros(window.shape[0], dtype=np.int64)
+    for pos in np.flatnonzero(np.any(digits, axis=0)):
+        value = np.where(digits[:, pos],
+                         value*10 + (window[:, pos] - ord('0')), value)
+    return ok, value
+
+
+def _parse_tlm_bytes(data, compact=False, sensors=None):
+    """ Векторный разбор блока телеметрии, состоящего из целых строк.
+
+    Строки, совпадающие по раскладке с первой распознанной строкой блока,
+    декодируются целыми столбцами numpy-массивов. Остальные строки
+    разбираются регулярным выражением.
+
+    Столбцы датчиков, не входящих в sensors, не декодируются - только
+    проверяются на соответствие шаблону, чтобы набор распознанных строк
+    не зависел от выбора датчиков.
+
+    :param data:    bytes - блок текста телеметрии из целых строк
+    :param compact: время - в целых мс, углы - в целых угловых секундах
+                    (типы столбцов - _COMPACT_TIME_DTYPE, _COMPACT_ANGLE_DTYPE)
+    :param sensors: номера загружаемых датчиков. По умолчанию - все
+    :return:        кортеж np.array-массивов в порядке _tlm_keys(sensors):
+                    (время, датчик 3, датчик 2, датчик 1)
+    """
+    keys = _tlm_keys(sensors)
+    buf = np.frombuffer(data, dtype=np.uint8)
+    # Границы строк
+    ends = np.flatnonzero(buf == ord('\n'))
+    if buf.size and buf[-1] != ord('\n'):
+        ends = np.append(ends, buf.size)
+    starts = np.empty_like(ends)
+    starts[:1] = 0
+    starts[1:] = ends[:-1] + 1
+    # Отбросить '\r' в конце строк
+    has_cr = np.zeros(ends.size, dtype=bool)
+    nonempty = ends > starts
+    has_cr[nonempty] = buf[ends[nonempty]-1] == ord('\r')
+    ends = ends - has_cr
+    lengths = ends - starts
+
+    # Строки, подходящие под раскладку, разбираются векторно
+    layout = _tlm_layout(data)
+    fast = np.zeros(ends.size, dtype=bool)
+    dtypes = _tlm_dtypes(compact, sensors)
+    out = list(_empty_tlm(compact, sensors))
+    if layout is not None:
+        length, offsets = layout
+        fast = lengths == length
+        rows = starts[fast]
+        table = _rows_table(buf, rows, length)
+        # Столбец времени - всё до первого столбца углов
+        ok, t = _time_column(table[:, :min(offsets)])
+        out = [t if compact else t / 1000]
+        for sens, offset in zip(_TLM_COLUMNS, offsets):
+            if sens not in keys:
+                ok &= _dms_mask(table, offset)
+                continue
+            ok_col, angle = _dms_column(table, offset, compact)
+            ok &= ok_col
+            out.append(angle)
+        # Между столбцами углов - только пробелы
+        for offset, following in zip(offsets, offsets[1:]):
+            ok &= np.all(table[:, offset+len(_DMS_TEMPLATE):following]
+                         == ord(' '), axis=1)
+        fast[fast] = ok
+        out = [arr[ok] for arr in out]
+
+    # Остальные строки - регулярным выражением
+    slow = np.flatnonzero(~fast & (lengths > 0))
+    if slow.size:
+        slow_lines = []
+        slow_inds = []
+        for ind in slow:
+            text = data[starts[ind]:ends[ind]].decode('utf8')
+            # Одиночные '\r' внутри - тоже переводы строк
+            for line in text.split('\r'):
+                slow_lines.append(line)
+                slow_inds.append(ind)
+        parsed = _parse_tlm_lines(slow_lines, compact)
+        parsed = [parsed[TLM_KEYS.index(key)] for key in keys]
+        if parsed[0]:
+            matched = [ind for ind, line in zip(slow_inds, slow_lines)
+                       if _re_tlm_format.search(line)]
+            # Восстановить исходный порядок строк
+            order = np.argsort(
+                np.concatenate((np.flatnonzero(fast), matched)),
+                kind='stable')
+            out = [np.concatenate((arr, vals))[order]
+                   for arr, vals in zip(out, parsed)]
+    return tuple(arr.astype(dtype, copy=False)
+                 for arr, dtype in zip(out, dtypes))
+
+
+def _iter_tlm_byte_blocks(f, block_bytes=_PARSE_BLOCK_BYTES, end=None):
+    """ Читать двоичный файл блоками, состоящими из целых строк.
+
+    :param f:           файл, открытый в режиме 'rb'
+    :param block_bytes: примерный размер блока, байт
+    :param end:         позиция в файле, до которой читать.
+                        По умолчанию - до конца файла
+    :return:            генератор кортежей (смещение блока в файле, bytes)
+    """
+    tail = b''
+    offset = f.tell()
+    while True:
+        if end is not None:
+            block_bytes = min(block_bytes, end - f.tell())
+        chunk = f.read(block_bytes) if block_bytes > 0 else b''
+        if not chunk:
+            break
+        chunk = tail + chunk
+        cut = chunk.rfind(b'\n') + 1
+        if cut == 0:
+            tail = chunk
+            continue
+        tail = chunk[cut:]
+        yield offset, chunk[:cut]
+        offset += cut
+    if tail:
+        yield offset, tail
+
+
+def _line_ranges(path_tlm, nranges):
+    """ Разбить файл на диапазоны байт, границы которых совпадают с
+    началами строк.
+
+    :param path_tlm: путь к файлу
+    :param nranges:  желаемое число диапазонов
+    :return:         список кортежей (начало, конец)
+    """
+    size = os.path.getsize(path_tlm)
+    bounds = [0]
+    with open(path_tlm, 'rb') as f:
+        for i in range(1, nranges):
+            f.seek(max(size * i // nranges, bounds[-1]))
+            # Граница - начало следующей строки
+            f.readline()
+            if f.tell() >= size:
+                break
+            if f.tell() > bounds[-1]:
+                bounds.append(f.tell())
+    bounds.append(size)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def _parse_tlm_range(path_tlm, start, end, compact=False, sensors=None):
+    """ Разобрать диапазон байт файла телеметрии
+    (выполняется в процессах ProcessPoolExecutor)
+
+    :return: кортеж np.array-массивов в порядке _tlm_keys(sensors)
+    """
+    with open(path_tlm, 'rb') as f:
+        f.seek(start)
+        blocks = [_parse_tlm_bytes(data, compact, sensors)
+                  for _, data in _iter_tlm_byte_blocks(f, end=end)]
+    if not blocks:
+        return _empty_tlm(compact, sensors)
+    return tuple(np.concatenate(column) for column in zip(*blocks))
+
+
+def _iter_tlm_blocks(path_tlm, progress=None, jobs=None,
+                     parallel_threshold=None, compact=False, sensors=None):
+    """ Разбор *.txt файла телеметрии блоками.
+
+    Файл размером не менее parallel_threshold разбирается параллельно в
+    нескольких процессах: диапазоны байт файла, выровненные по строкам,
+    разбираются независимо, блоки выдаются в порядке следования в файле.
+    Одновременно в разборе - не более _PARALLEL_RANGES_PER_JOB диапазонов
+    на процесс: следующий диапазон отправляется в разбор после выдачи
+    блока, поэтому память под ещё не выданные блоки ограничена.
+
+    :param path_tlm: путь к txt файлу с телеметрией
+    :param progress: функция progress(offset, size), вызываемая после
+                     разбора каждого блока: offset - разобрано байт,
+                     size - размер файла, байт
+    :param jobs:     число процессов разбора. По умолчанию - по числу
+                     процессоров
+    :param parallel_threshold: размер файла (байт), начиная с которого
+                     разбор ведётся в нескольких процессах.
+                     По умолчанию - PARALLEL_THRESHOLD
+    :param compact:  время - в целых мс, углы - в целых угловых секундах
+    :param sensors:  номера загружаемых датчиков. По умолчанию - все
+    :return:         генератор кортежей np.array-массивов в порядке
+                     _tlm_keys(sensors): (время, датчик 3, датчик 2, датчик 1)
+    """
+    size = os.path.getsize(path_tlm)
+    if jobs is None:
+        jobs = os.cpu_count() or 1
+    if parallel_threshold is None:
+        parallel_threshold = PARALLEL_THRESHOLD
+    if jobs > 1 and size >= parallel_threshold:
+        # Диапазонов больше, чем процессов, - для равномерной загрузки
+        # и ограничения памяти под ещё не выданные результаты
+        nranges = max(jobs, size // _PARALLEL_RANGE_BYTES)
+        ranges = _line_ranges(path_tlm, nranges)
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            ranges = iter(ranges)
+            pending = deque()
+
+            def submit(count):
+                # Отправить в разбор следующие count диапазонов
+                for start, end in itertools.islice(ranges, count):
+                    pending.append((end, executor.submit(
+                        _parse_tlm_range, path_tlm, start, end, compact,
+                        sensors)))
+
+            try:
+                submit(jobs * _PARALLEL_RANGES_PER_JOB)
+                while pending:
+                    end, future = pending.popleft()
+                    block = future.result()
+                    # Освободившееся место - следующему диапазону
+                    submit(1)
+                    yield block
+                    if progress is not None:
+                        progress(end, size)
+            finally:
+                # Разбор прерван (генератор закрыт) - не разбирать
+                # оставшиеся диапазоны
+                for _, future in pending:
+                    future.cancel()
+        return
+    with open(path_tlm, 'rb') as f:
+        for offset, data in _iter_tlm_byte_blocks(f):
+            yield _parse_tlm_bytes(data, compact, sensors)
+            if progress is not None:
+                progress(offset + len(data), size)
+
+
+# Блок телеметрии, выдаваемый iter_tlm_txt():
+# time, s1, s2, s3 - np.array-массивы времени и углов датчиков 1, 2, 3
+#                    (None - для незагружаемых датчиков);
+# offset - позиция в файле (байт), до которой файл прочитан и разобран;
+# nrows  - число строк телеметрии в блоке
+TlmBlock = namedtuple('TlmBlock', 'time s1 s2 s3 offset nrows')
+
+
+def iter_tlm_txt(path_tlm, block_rows=2**16, compact=False, sensors=None):
+    """ Поблочное считывание данных из *.txt файла телеметрии
+    (потоковый аналог parse_tlm_txt).
+
+    Блоки выдаются по мере чтения файла, в памяти одновременно находится
+    не более одного блока байт файла и одного блока строк.
+
+    :param path_tlm:   путь к txt файлу с телеметрией
+    :param block_rows: число строк телеметрии в блоке
+                       (в последнем блоке - сколько осталось)
+    :param compact:    время - в целых мс, углы - в целых угловых секундах
+    :param sensors:    номера загружаемых датчиков. По умолчанию - все
+    :return:           генератор блоков TlmBlock
+    """
+    keys = _tlm_keys(sensors)
+    fields = [key for key in (TIME, 1, 2, 3) if key in keys]
+    # Номера столбцов выдаваемого блока в кортеже _parse_tlm_bytes()
+    order = [keys.index(key) for key in fields]
+
+    def make_block(columns, offset, nrows):
+        values = dict(zip(fields, columns))
+        return TlmBlock(*[values.get(key) for key in (TIME, 1, 2, 3)],
+                        offset=offset, nrows=nrows)
+
+    pending = []
+    npending = 0
+    offset = 0
+    with open(path_tlm, 'rb') as f:
+        for offset, data in _iter_tlm_byte_blocks(f):
+            offset += len(data)
+            parsed = _parse_tlm_bytes(data, compact, sensors)
+            pending.append([parsed[i] for i in order])
+            npending += parsed[0].size
+            if npending < block_rows:
+                continue
+            block = [np.concatenate(column) for column in zip(*pending)]
+            nfull = npending - npending % block_rows
+            for start in range(0, nfull, block_rows):
+                yield make_block([column[start:start+block_rows]
+                                  for column in block],
+                                 offset, block_rows)
+            pending = [[column[nfull:] for column in block]]
+            npending -= nfull
+    if npending:
+        block = [np.concatenate(column) for column in zip(*pending)]
+        yield make_block(block, offset, npending)
+
+
+def parse_tlm_txt(path_tlm, progress=None, jobs=None,
+                  parallel_threshold=None, compact=False, sensors=None):
+    """ Считывание данных из *.txt файла телеметрии.
+    Возвращает numpy-массивы в словаре с ключами-константами:
+        TIME, 3, 2, 1 (или TIME и номера датчиков sensors)
+
+    Файл читается крупными блоками байт, столбцы фиксированной раскладки
+    декодируются векторно. Строки иной раскладки разбираются регулярным
+    выражением.
+
+    Пример *.txt файла с телеметрией:
+        Время    Угл. пр-ль 3  Угл. пр-ль 1  Угл/ пр-ль 2
+        * 0      086°07´58´´   234°24´15´´   269°20´26´´
+        500      086°07´58´´   227°46´06´´   274°44´45´´
+        ...
+
+    :param path_tlm: путь к txt файлу с телеметрией
+    :param progress: функция progress(offset, size) - см. _iter_tlm_blocks
+    :param jobs:     число процессов разбора. По умолчанию - по числу
+                     процессоров
+    :param parallel_threshold: размер файла (байт), начиная с которого
+                     разбор ведётся в нескольких процессах.
+                     По умолчанию - PARALLEL_THRESHOLD
+    :param compact:  компактное хранение: время - в целых мс (int64),
+                     углы - в целых угловых секундах (int32).
+                     По умолчанию - время в секундах, углы в градусах (float)
+    :param sensors:  номера датчиков (1, 2, 3), столбцы которых разбираются.
+                     Столбцы остальных датчиков пропускаются, не декодируясь.
+                     По умолчанию - все
+    """
+    keys = _tlm_keys(sensors)
+    blocks = list(_iter_tlm_blocks(path_tlm, progress, jobs,
+                                   parallel_threshold, compact, sensors))
+    if not blocks:
+        return dict(zip(keys, _empty_tlm(compact, sensors)))
+    return {key: np.concatenate([block[i] for block in blocks])
+            for i, key in enumerate(keys)}
+
+
+def parse_tlm_txt_regex(path_tlm, compact=False):
+    """ Построчное считывание *.txt файла телеметрии регулярным выражением.
+
+    Эталонная (медленная) реализация parse_tlm_txt.
+    Возвращает словарь того же вида.
+    """
+    with open(path_tlm, 'r', encoding='utf8') as f:
+        columns = _parse_tlm_lines(f, compact)
+    return {key: np.array(column, dtype=dtype)
+            for key, column, dtype in zip(TLM_KEYS, columns,
+                                          _tlm_dtypes(compact))}
@@ -0,0 +1,1419 @@
+#!/usr/bin/env python3
+# -*- encoding: utf-8 -*-
+"""
+Создание аудиофайла *.wav из телеметрии программы tlm2wav.
+
+Общий для командной строки и графической оболочки механизм. Аудиофайл
+создаётся блоками фреймов фиксированного размера: для каждого блока
+моменты фреймов строятся одним массивом, амплитуды вычисляются одним
+вызовом np.interp, сэмплы кодируются средствами numpy и записываются в
+файл одним вызовом. Телеметрия читается блоками строк, нужных для
+блока фреймов (TlmBlocks): нормируется и калибруется только этот блок.
+Расход памяти не зависит ни от длины аудиофайла, ни от длины телеметрии.
+
+Длинные аудиофайлы могут создаваться в нескольких процессах: заголовок
+файла записывается заранее (число фреймов известно), блоки фреймов
+создаются процессами независимо - прямо в свои участки файла,
+отображённого в память. Телеметрия передаётся процессам через общую
+память (без копирования каждому процессу).
+
+Поддерживаются сэмплы целые 8, 16, 24 и 32 бит и 32-битные с плавающей
+точкой (IEEE float) - все кодируются одной функцией encode().
+
+Звук может создаваться и в памяти (render_sound) - для воспроизведения
+без записи на диск; в файл он записывается только при сохранении
+(Sound.save), или вычисляться из телеметрии прямо во время воспроизведения
+(LiveSound) - без ожидания создания. Созданные звуки хранятся в кэше
+SoundCache: в памяти и на диске, с вытеснением давно не использовавшихся.
+
+Амплитуды фреймов между отсчётами телеметрии вычисляются выбранным
+способом интерполяции (INTERPOLATIONS): линейной (быстро, но с изломами,
+слышимыми при больших множителях скорости), кубической Эрмита или
+sinc-интерполяцией с окном (полифазной, с ограничением полосы).
+
+Значения телеметрии задают амплитуду звука (звуковая волна повторяет
+кривую угла) или, в режиме высоты тона (параметр pitch), - мгновенную
+частоту тона в заданном диапазоне. Тон синтезируется накоплением фазы
+(нарастающая сумма частоты/частоту дискретизации) и выборкой из таблицы
+синуса; фаза переносится между блоками фреймов.
+"""
+
+import functools
+import hashlib
+import json
+import os
+import struct
+import time
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+import tlm2wav_cache
+
+__author__ = 'Don D.S'
+
+# Число фреймов, создаваемых за раз
+CHUNK_FRAMES = 2**18
+# Число строк телеметрии, обрабатываемых за раз: при проходе по всей
+# телеметрии (поиск максимума, сравнение с прежней телеметрией) и (в
+# среднем) при создании блока фреймов
+CHUNK_ROWS = 2**18
+# Минимальный интервал между вызовами функции прогресса, с
+PROGRESS_INTERVAL = 0.1
+# Число фреймов, начиная с которого аудиофайл создаётся в нескольких
+# процессах (при меньшем запуск процессов не окупается)
+PARALLEL_THRESHOLD = 2**23
+# Полуширина окна sinc-интерполяции, отсчётов телеметрии
+SINC_HALF_WIDTH = 8
+# Число фаз (дробных положений между отсчётами) таблицы sinc-интерполяции
+SINC_PHASES = 256
+# Диапазон частот тона по умолчанию (режим высоты тона), Гц
+PITCH_RANGE = (200.0, 2000.0)
+# Число значений в таблице синуса (режим высоты тона)
+WAVETABLE_SIZE = 2**12
+# Число фреймов, вычисляемых LiveSound впрок (при воспроизведении)
+LOOKAHEAD_FRAMES = 2**13
+# Предельный размер кэша звуков в памяти по умолчанию, байт
+SOUND_MEMORY_LIMIT = 256 * 2**20
+# Предельный размер кэша звуков на диске по умолчанию, байт
+SOUND_DISK_LIMIT = 1024 * 2**20
+# Коды формата сэмплов WAV:
+WAVE_FORMAT_PCM = 0x0001         # целые числа
+WAVE_FORMAT_IEEE_FLOAT = 0x0003  # числа с плавающей точкой
+_WAVE_FORMAT_EXTENSIBLE = 0xFFFE  # код формата - в расширении заголовка
+
+# Форматы сэмплов по названию: (длина сэмпла, байт; код формата)
+SAMPLE_FORMATS = {'8': (1, WAVE_FORMAT_PCM),
+                  '16': (2, WAVE_FORMAT_PCM),
+                  '24': (3, WAVE_FORMAT_PCM),
+                  '32': (4, WAVE_FORMAT_PCM),
+                  'float32': (4, WAVE_FORMAT_IEEE_FLOAT)}
+
+# Типы numpy-массивов, в которые кодируются сэмплы:
+# 8-битные - беззнаковые, остальные - целые со знаком (little-endian),
+# 24-битные - через 32-битные
+_SAMPLE_DTYPES = {(1, WAVE_FORMAT_PCM): np.dtype('u1'),
+                  (2, WAVE_FORMAT_PCM): np.dtype('<i2'),
+                  (3, WAVE_FORMAT_PCM): np.dtype('<i4'),
+                  (4, WAVE_FORMAT_PCM): np.dtype('<i4'),
+                  (4, WAVE_FORMAT_IEEE_FLOAT): np.dtype('<f4')}
+
+# Параметры WAV файла (см. read_wav_params):
+# data_offset - смещение сэмплов в файле, байт
+WavParams = namedtuple('WavParams', 'nchannels sampwidth framerate nframes '
+                                    'wave_format data_offset')
+
+
+def check_format(sampwidth, wave_format=WAVE_FORMAT_PCM):
+    """ Проверить допустимость формата сэмплов
+
+    :param sampwidth:   длина сэмпла, байт (1, 2, 3, 4)
+    :param wave_format: WAVE_FORMAT_PCM или WAVE_FORMAT_IEEE_FLOAT
+    """
+    if wave_format == WAVE_FORMAT_IEEE_FLOAT:
+        if sampwidth != 4:
+            raise Exception('Некорректная длина сэмпла: с плавающей точкой '
+                            'записываются только 4 Байта')
+    elif wave_format != WAVE_FORMAT_PCM:
+        raise ValueError(
+            'Неизвестный формат сэмплов wave_format={0}'.format(wave_format))
+    elif sampwidth not in (1, 2, 3, 4):
+        raise Exception(
+            'Некорректная длина сэмпла: должна быть 1, 2, 3, 4 Байта')
+
+
+def max_volume(sampwidth, wave_format=WAVE_FORMAT_PCM):
+    """ Максимальная громкость - максимальное число со знаком,
+    которое может быть записано в сэмпл / в заданном числе байт 0x7F...FFF.
+    Исключение - 8-битный сэмпл, который использует беззнаковые целые числа,
+    и сэмпл с плавающей точкой (амплитуда от -1 до 1)
+
+    :param sampwidth:   длина сэмпла, байт
+    :param wave_format: WAVE_FORMAT_PCM или WAVE_FORMAT_IEEE_FLOAT
+    """
+    if wave_format == WAVE_FORMAT_IEEE_FLOAT:
+        return 1.0
+    if sampwidth == 1:
+        return 2**8-1
+    return 2**(sampwidth*8-1)-1
+
+
+def encode(samples, sampwidth, wave_format=WAVE_FORMAT_PCM):
+    """ Закодировать амплитуды в сэмплы аудиофайла
+
+    :param samples:     np.array-массив амплитуд, нормированных к
+                        max_volume()
+    :param sampwidth:   длина сэмпла, байт
+    :param wave_format: WAVE_FORMAT_PCM или WAVE_FORMAT_IEEE_FLOAT
+    :return:            np.array-массив байт (uint8) сэмплов - в том виде,
+                        в котором они записываются в файл
+    """
+    check_format(sampwidth, wave_format)
+    dtype = _SAMPLE_DTYPES[(sampwidth, wave_format)]
+    if wave_format == WAVE_FORMAT_IEEE_FLOAT:
+        # Без квантования - только приведение к float32
+        return samples.astype(dtype).view(np.uint8)
+    # Выбросы интерполяции за максимальную громкость - ограничить
+    # (иначе - переполнение целых)
+    max_vol = max_volume(sampwidth)
+    samples = np.clip(samples, -max_vol, max_vol)
+    # 8-битные - амплитуда от 0 до 255, отрицательные инвертировать
+    if sampwidth == 1:
+        samples = np.abs(samples)
+    # Отбросить дробную часть (как int())
+    samples = samples.astype(dtype)
+    if sampwidth == 3:
+        # 24-битные: 32-битные без старшего (в little-endian - последнего)
+        # байта
+        return samples.view(np.uint8).reshape(-1, 4)[:, :3].reshape(-1)
+    return samples.view(np.uint8)
+
+
+def decode(data, sampwidth, wave_format=WAVE_FORMAT_PCM):
+    """ Раскодировать сэмплы аудиофайла в амплитуды (обратное encode())
+
+    :param data:        байты сэмплов (np.array uint8, bytes)
+    :param sampwidth:   длина сэмпла, байт
+    :param wave_format: WAVE_FORMAT_PCM или WAVE_FORMAT_IEEE_FLOAT
+    :return:            np.array-массив амплитуд (float64)
+    """
+    check_format(sampwidth, wave_format)
+    data = np.frombuffer(data, dtype=np.uint8)
+    if sampwidth == 3:
+        # 24-битные: дописать младший нулевой байт и сдвинуть обратно -
+        # знак старшего байта сохраняется
+        padded = np.zeros((data.size // 3, 4), dtype=np.uint8)
+        padded[:, 1:] = data.reshape(-1, 3)
+        return (padded.view('<i4').reshape(-1) >> 8).astype(np.float64)
+    return data.view(_SAMPLE_DTYPES[(sampwidth, wave_format)])\
+        .astype(np.float64)
+
+
+def sound_ms(tlm_time, multiplier):
+    """ Время звука, мс, соответствующее моменту телеметрии
+    (звук создаётся из телеметрии, ускоренной в multiplier раз)
+
+    :param tlm_time:   момент телеметрии, с
+    :param multiplier: множитель скорости воспроизведения
+    """
+    return tlm_time / multiplier * 1000.0
+
+
+def frame_times(start, stop, framerate):
+    """ Моменты фреймов аудиофайла, с
+
+    :param start:     номер первого фрейма
+    :param stop:      номер фрейма, следующего за последним
+    :param framerate: Гц, фреймов в секунду
+    """
+    return np.arange(start, stop) / framerate
+
+
+def _positions(x, times):
+    # Положение моментов x среди отсчётов телеметрии: номер предшествующего
+    # отсчёта i (от 0 до times.size-2) и доля интервала до следующего
+    # (от 0 до 1; за пределами телеметрии - крайние значения)
+    i = np.searchsorted(times, x, side='right') - 1
+    np.clip(i, 0, times.size - 2, out=i)
+    t0 = times[i]
+    dt = times[i + 1] - t0
+    frac = np.zeros(x.size)
+    np.divide(x - t0, dt, out=frac, where=dt > 0)
+    np.clip(frac, 0.0, 1.0, out=frac)
+    return i, frac
+
+
+def _take(values, index):
+    # Значения по номерам отсчётов; за пределами - крайние значения
+    return values[np.clip(index, 0, values.size - 1)]
+
+
+def interp_linear(x, times, values, framerate):
+    """ Линейная интерполяция (np.interp)
+
+    :param x:         np.array-массив моментов фреймов, с
+    :param times:     np.array-массив моментов времени телеметрии, с
+                      (возрастающий)
+    :param values:    np.array-массив значений телеметрии (действительных
+                      или комплексных)
+    :param framerate: Гц, фреймов в секунду
+    :return:          np.array-массив амплитуд фреймов
+    """
+    return np.interp(x, times, values)
+
+
+def interp_cubic(x, times, values, framerate):
+    """ Кубическая интерполяция Эрмита (сплайн Катмулла-Рома): производные
+    в отсчётах - по соседним отсчётам. Отсчёты телеметрии считаются
+    равноотстоящими (шаг телеметрии почти постоянный), положение фрейма
+    между отсчётами - по времени.
+
+    Параметры - как у interp_linear()
+    """
+    if times.size < 2:
+        return interp_linear(x, times, values, framerate)
+    i, t = _positions(x, times)
+    y0 = _take(values, i - 1)
+    y1 = values[i]
+    y2 = values[i + 1]
+    y3 = _take(values, i + 2)
+    return y1 + 0.5*t*((y2 - y0)
+                       + t*((2*y0 - 5*y1 + 4*y2 - y3)
+                            + t*(3*(y1 - y2) + y3 - y0)))
+
+
+def _blackman(z):
+    # Окно Блэкмана на отрезке -1...1
+    return np.where(np.abs(z) < 1,
+                    0.42 + 0.5*np.cos(np.pi*z) + 0.08*np.cos(2*np.pi*z), 0)
+
+
+@functools.lru_cache(maxsize=8)
+def _sinc_table(half_width, phases, cutoff):
+    # Полифазная таблица весов sinc-интерполяции с окном Блэкмана.
+    # cutoff - частота среза относительно частоты Найквиста телеметрии
+    # (меньше 1 - при прореживании, окно расширяется в 1/cutoff раз).
+    # Возвращает смещения отсчётов относительно предшествующего фрейму
+    # и веса: строка - смещение, столбец - фаза (доля интервала)
+    half = int(np.ceil(half_width / cutoff))
+    offsets = np.arange(-half + 1, half + 1)
+    dist = offsets[:, None] - np.arange(phases + 1)[None, :] / phases
+    weights = cutoff * np.sinc(cutoff * dist) * _blackman(dist / half)
+    # Постоянный сигнал проходит без искажений
+    weights /= weights.sum(axis=0)
+    return offsets, weights
+
+
+def _sinc_cutoff(size, duration, framerate):
+    # Частота среза sinc-интерполяции (см. _sinc_table) для size отсчётов
+    # телеметрии на промежутке duration, с.
+    # Отсчётов телеметрии на фрейм
+    step = (size - 1) / duration / framerate
+    # Частота среза - с округлением, чтобы таблица весов использовалась
+    # повторно
+    return min(1.0, np.ceil(64 / step) / 64) if step > 1 else 1.0
+
+
+def interp_sinc(x, times, values, framerate,
+                half_width=SINC_HALF_WIDTH, phases=SINC_PHASES, cutoff=None):
+    """ Sinc-интерполяция с окном (полифазная): восстановление сигнала с
+    ограниченной полосой. Веса отсчётов берутся из таблицы для phases
+    дробных положений между отсчётами. Если отсчётов телеметрии на фрейм
+    больше одного (большой множитель скорости), полоса сужается до частоты
+    Найквиста аудиофайла - без наложения спектров. Отсчёты телеметрии
+    считаются равноотстоящими, как в interp_cubic().
+
+    Параметры - как у interp_linear(), а также
+    :param half_width: полуширина окна, отсчётов телеметрии
+    :param phases:     число фаз таблицы весов
+    :param cutoff:     частота среза относительно частоты Найквиста
+                       телеметрии. По умолчанию - по отсчётам times (если
+                       times - часть телеметрии, задаётся по всей)
+    """
+    if times.size < 2:
+        return interp_linear(x, times, values, framerate)
+    if cutoff is None:
+        cutoff = _sinc_cutoff(times.size, times[-1] - times[0], framerate)
+    offsets, weights = _sinc_table(half_width, phases, cutoff)
+    i, t = _positions(x, times)
+    phase = np.rint(t * phases).astype(np.intp)
+    amps = np.zeros(x.size, dtype=values.dtype)
+    for offset, row in zip(offsets, weights):
+        amps += row[phase] * _take(values, i + offset)
+    return amps
+
+
+# Способы интерполяции по названию
+INTERPOLATIONS = {'linear': interp_linear,
+                  'cubic': interp_cubic,
+                  'sinc': interp_sinc}
+
+
+def _support(interpolation, cutoff):
+    # Число отсчётов телеметрии по каждую сторону от интервала между
+    # отсчётами, от которых зависят амплитуды фреймов этого интервала.
+    # cutoff - частота среза sinc-интерполяции (None - не определена:
+    # меньше 2 отсчётов на промежутке времени)
+    if interpolation == 'cubic':
+        return 2
+    if interpolation == 'sinc' and cutoff is not None:
+        return int(np.ceil(SINC_HALF_WIDTH / cutoff))
+    return 1
+
+
+# Таблица синуса на периоде (с повтором первого значения в конце - для
+# интерполяции без переноса номера)
+_WAVETABLE = np.sin(np.linspace(0, 2*np.pi, WAVETABLE_SIZE + 1))
+
+
+def wavetable(phases):
+    """ Значения синуса по таблице (с линейной интерполяцией между
+    значениями таблицы)
+
+    :param phases: np.array-массив фаз, рад (не отрицательных)
+    :return:       np.array-массив значений от -1 до 1
+    """
+    pos = phases * (WAVETABLE_SIZE / (2*np.pi))
+    index = pos.astype(np.intp)
+    frac = pos - index
+    index &= WAVETABLE_SIZE - 1
+    return _WAVETABLE[index] + frac*(_WAVETABLE[index + 1]
+                                     - _WAVETABLE[index])
+
+
+class PhaseAccumulator(object):
+    """ Синтез тона, частота которого задаётся значениями телеметрии
+    (режим высоты тона).
+
+    Значения от -max_volume() до max_volume() отображаются на частоты
+    диапазона pitch по логарифмической шкале (равные изменения угла -
+    равные музыкальные интервалы). Фаза - нарастающая сумма
+    частота/framerate по фреймам; фаза после последнего фрейма блока
+    сохраняется и продолжается в следующем блоке, поэтому блоки должны
+    обрабатываться по порядку. Сохраняемая фаза не приводится к периоду
+    (к периоду приводится только фаза каждого фрейма), поэтому фазы фреймов
+    не зависят от того, как фреймы разбиты на блоки.
+    """
+    def __init__(self, pitch, framerate, max_vol, phase=0.0):
+        """
+        :param pitch:     диапазон частот (наименьшая, наибольшая), Гц
+        :param framerate: Гц, фреймов в секунду
+        :param max_vol:   максимальная громкость - max_volume()
+        :param phase:     фаза первого фрейма, рад (для стерео -
+                          комплексное число: фазы каналов 1 и 2)
+        """
+        fmin, fmax = pitch
+        if not 0 < fmin <= fmax:
+            raise ValueError('Некорректный диапазон частот тона: '
+                             '{0}...{1} Гц'.format(fmin, fmax))
+        self.fmin = float(fmin)
+        self.fmax = float(fmax)
+        self.framerate = framerate
+        self.max_vol = max_vol
+        self.phase = phase
+
+    def frequencies(self, amps):
+        """ Мгновенные частоты тона, Гц, для нормированных значений amps
+        """
+        return self.fmin * (self.fmax/self.fmin) ** ((amps/self.max_vol + 1)/2)
+
+    def _channel(self, amps, phase):
+        # Амплитуды тона одного канала и фаза после последнего фрейма.
+        # Фаза фрейма - сумма шагов предыдущих фреймов, прибавляемых по
+        # одному к фазе phase: суммы те же, что и без разбиения на блоки
+        phases = np.empty(amps.size + 1)
+        phases[0] = phase
+        phases[1:] = self.frequencies(amps) * (2*np.pi/self.framerate)
+        np.cumsum(phases, out=phases)
+        return (wavetable(np.mod(phases[:-1], 2*np.pi)) * self.max_vol,
+                phases[-1])
+
+    def __call__(self, amps):
+        """ Амплитуды тона для очередного блока фреймов
+
+        :param amps: np.array-массив значений телеметрии на фреймах,
+                     нормированных к max_volume() (для стерео -
+                     комплексных)
+        :return:     np.array-массив амплитуд того же типа
+        """
+        if np.iscomplexobj(amps):
+            phase = complex(self.phase)
+            left, phase_left = self._channel(amps.real, phase.real)
+            right, phase_right = self._channel(amps.imag, phase.imag)
+            self.phase = complex(phase_left, phase_right)
+            out = np.empty(amps.size, dtype=np.complex128)
+            out.real = left
+            out.imag = right
+            return out
+        out, self.phase = self._channel(amps, self.phase)
+        return out
+
+
+def wav_header(nchannels, sampwidth, framerate, nframes,
+               wave_format=WAVE_FORMAT_PCM):
+    """ Заголовок WAV файла с заданным числом фреймов
+
+    Для целых сэмплов (PCM) - 44 байта, как у модуля wave. Для сэмплов с
+    плавающей точкой блок fmt дополняется полем cbSize и добавляется
+    обязательный для них блок fact.
+
+    :param nchannels:   число каналов
+    :param sampwidth:   длина сэмпла, байт
+    :param framerate:   Гц, фреймов в секунду
+    :param nframes:     число фреймов
+    :param wave_format: WAVE_FORMAT_PCM или WAVE_FORMAT_IEEE_FLOAT
+    :return:            bytes; данные в файле следуют сразу за заголовком
+    """
+    data_size = nframes * nchannels * sampwidth
+    fmt = struct.pack('<HHIIHH', wave_format, nchannels, framerate,
+                      framerate * nchannels * sampwidth,  # байт в секунду
+                      nchannels * sampwidth,              # байт во фрейме
+                      sampwidth * 8)                      # бит в сэмпле
+    chunks = b''
+    if wave_format != WAVE_FORMAT_PCM:
+        fmt += struct.pack('<H', 0)
+        chunks = struct.pack('<4sII', b'fact', 4, nframes)
+    chunks = struct.pack('<4sI', b'fmt ', len(fmt)) + fmt + chunks
+    riff_size = 4 + len(chunks) + 8 + data_size
+    return (struct.pack('<4sI4s', b'RIFF', riff_size, b'WAVE') + chunks
+            + struct.pack('<4sI', b'data', data_size))
+
+
+def read_wav_params(path):
+    """ Прочитать параметры WAV файла (целые сэмплы или с плавающей точкой;
+    модуль wave последние не читает)
+
+    :param path: путь к WAV файлу
+    :return:     WavParams
+    """
+    fmt = None
+    with open(path, 'rb') as f:
+        riff, _, wave_id = struct.unpack('<4sI4s', f.read(12))
+        if riff != b'RIFF' or wave_id != b'WAVE':
+            raise Exception('Файл не является аудиофайлом WAV')
+        while True:
+            head = f.read(8)
+            if len(head) < 8:
+                raise Exception('В аудиофайле WAV нет данных')
+            name, size = struct.unpack('<4sI', head)
+            if name == b'fmt ':
+                fmt = f.read(size)
+                wave_format, nchannels, framerate, _, _, bits = \
+                    struct.unpack('<HHIIHH', fmt[:16])
+                if wave_format == _WAVE_FORMAT_EXTENSIBLE:
+                    # Код формата - первые 2 байта GUID подформата
+                    wave_format, = struct.unpack('<H', fmt[24:26])
+                size -= len(fmt)
+            elif name == b'data':
+                if fmt is None:
+                    raise Exception('В аудиофайле WAV нет блока fmt')
+                sampwidth = (bits + 7) // 8
+                return WavParams(nchannels, sampwidth, framerate,
+                                 size // (nchannels * sampwidth),
+                                 wave_format, f.tell())
+            # Блоки выравниваются по чётной длине
+            f.seek(size + size % 2, 1)
+
+
+class TlmBlocks(object):
+    """ Телеметрия для создания звука, читаемая блоками строк.
+
+    Звук создаётся блоками фреймов, и для каждого блока читаются только
+    строки телеметрии, от которых зависят его фреймы: массивов во всю
+    длину телеметрии при создании звука не появляется (если их не хранит
+    сам источник). Этот класс выдаёт срезы массивов; потомки вычисляют
+    моменты времени и значения строк из столбцов телеметрии (например,
+    с калибровкой - tlm2wav_utils.SoundValues).
+    """
+    # Значения - пары (левый канал, правый канал)
+    stereo = False
+
+    def __init__(self, times, values):
+        """
+        :param times:  np.array-массив моментов времени телеметрии, с
+                       (возрастающий)
+        :param values: np.array-массив значений телеметрии или пара
+                       массивов (левый канал, правый канал) - для стерео
+        """
+        if isinstance(values, (tuple, list)):
+            if len(values) != 2:
+                raise ValueError('Стерео: ожидается пара массивов значений '
+                                 '(левый канал, правый канал)')
+            self.stereo = True
+        self._times = times
+        self._values = values
+
+    @property
+    def size(self):
+        """ Число строк телеметрии
+        """
+        return len(self._times)
+
+    def times(self, start, stop):
+        """ Моменты времени строк start...stop-1, с
+
+        :return: np.array-массив
+        """
+        return self._times[start:stop]
+
+    def values(self, start, stop):
+        """ Значения строк start...stop-1
+
+        :return: np.array-массив или для стерео пара np.array-массивов
+        """
+        if self.stereo:
+            return tuple(channel[start:stop] for channel in self._values)
+        return self._values[start:stop]
+
+    def search(self, t):
+        """ Номер первой строки, момент времени которой больше t
+
+        :param t: момент времени, с
+        """
+        return int(np.searchsorted(self._times, t, side='right'))
+
+
+def _row_chunks(size):
+    # Диапазоны строк (start, stop) для прохода по всей телеметрии
+    return ((start, min(start + CHUNK_ROWS, size))
+            for start in range(0, size, CHUNK_ROWS))
+
+
+def _tlm_blocks(times, values):
+    # Телеметрия, читаемая блоками: times - TlmBlocks или массив времени
+    if isinstance(times, TlmBlocks):
+        return times
+    return TlmBlocks(times, values)
+
+
+class _ScaledTlm(object):
+    """ Телеметрия, подготовленная к созданию звука: значения нормируются
+    к максимальной громкости, время сжимается в multiplier раз - по
+    блокам строк, для каждого создаваемого блока фреймов
+    """
+    def __init__(self, tlm, peak, max_vol, multiplier, framerate,
+                 interpolation):
+        """
+        :param tlm:        TlmBlocks
+        :param peak:       абсолютный максимум значений (_peak)
+        :param max_vol:    максимальная громкость - max_volume()
+        Остальные параметры - как у render_wav()
+        """
+        self.tlm = tlm
+        self.peak = peak
+        self.max_vol = max_vol
+        self.multiplier = multiplier
+        self.framerate = framerate
+        self.interpolation = interpolation
+        # Частота среза sinc-интерполяции - по всей телеметрии
+        self.cutoff = None
+        # Число фреймов, на которые в среднем приходится CHUNK_ROWS строк
+        # (None - без ограничения)
+        self.chunk_frames = None
+        first = last = 0
+        if tlm.size >= 2:
+            first = tlm.times(0, 1)[0] / multiplier
+            last = tlm.times(tlm.size - 1, tlm.size)[0] / multiplier
+        if last > first:
+            self.cutoff = _sinc_cutoff(tlm.size, last - first, framerate)
+            self.chunk_frames = max(1, int(
+                CHUNK_ROWS * (last - first) * framerate / (tlm.size - 1)))
+        self.support = _support(interpolation, self.cutoff)
+
+    def nframes(self):
+        """ Число фреймов звука (проход по всей телеметрии)
+        """
+        # Длительность в секундах (после сжатия)
+        duration = max(np.max(self.tlm.times(start, stop) / self.multiplier)
+                       for start, stop in _row_chunks(self.tlm.size))
+        return int(duration*self.framerate)
+
+    def time(self, row):
+        """ Момент времени строки row после сжатия, с
+        """
+        return self.tlm.times(row, row + 1)[0] / self.multiplier
+
+    def rows(self, start, stop):
+        """ Строки телеметрии, от которых зависят амплитуды фреймов
+        start...stop-1
+
+        :return: кортеж (np.array-массив моментов времени после сжатия,
+                 np.array-массив нормированных значений - действительных
+                 или для стерео комплексных)
+        """
+        # Строки - с запасом на отсчёты, от которых зависит интерполяция,
+        # и на округление при сравнении с несжатым временем
+        pad = self.support + 2
+        lo = self.tlm.search(start / self.framerate * self.multiplier)
+        hi = self.tlm.search((stop - 1) / self.framerate * self.multiplier)
+        lo = max(lo - 1 - pad, 0)
+        hi = min(hi + pad, self.tlm.size)
+        times = self.tlm.times(lo, hi) / self.multiplier
+        values = self.tlm.values(lo, hi)
+        if self.tlm.stereo:
+            # Каналы - действительная и мнимая части одного массива:
+            # np.interp выполняет поиск индексов один раз на оба канала
+            left, right = (channel/self.peak*self.max_vol
+                           for channel in values)
+            values = np.empty(left.size, dtype=np.complex128)
+            values.real = left
+            values.imag = right
+        else:
+            values = values/self.peak*self.max_vol
+        return times, values
+
+
+def _render_frames(tlm, start, stop, sampwidth, nchannels,
+                   wave_format=WAVE_FORMAT_PCM, synth=None):
+    # Байты сэмплов фреймов start...stop-1 (по nchannels сэмплов во фрейме).
+    # tlm - _ScaledTlm: значения действительные (один канал) или
+    # комплексные (стерео) - только строк, нужных для этих фреймов.
+    # synth - PhaseAccumulator для режима высоты тона (блоки - по порядку)
+    if tlm.chunk_frames is not None and stop - start > tlm.chunk_frames:
+        # При большом множителе скорости на фрейм приходится много строк:
+        # строк на блок - не больше CHUNK_ROWS (в среднем)
+        return np.concatenate([
+            _render_frames(tlm, first, min(first + tlm.chunk_frames, stop),
+                           sampwidth, nchannels, wave_format, synth)
+            for first in range(start, stop, tlm.chunk_frames)])
+    times, values = tlm.rows(start, stop)
+    interpolate = INTERPOLATIONS[tlm.interpolation]
+    kwargs = {}
+    if tlm.interpolation == 'sinc':
+        # Частота среза - по всей телеметрии, а не по выбранным строкам
+        kwargs['cutoff'] = tlm.cutoff
+    # Амплитуды фреймов - одним вызовом интерполяции
+    amps = interpolate(frame_times(start, stop, tlm.framerate), times,
+                       values, tlm.framerate, **kwargs)
+    if synth is not None:
+        amps = synth(amps)
+    if np.iscomplexobj(amps):
+        # Стерео: действительная часть - канал 1, мнимая - канал 2.
+        # В памяти они уже чередуются - как сэмплы каналов во фреймах
+        amps = amps.view(np.float64)
+    elif nchannels > 1:
+        amps = np.repeat(amps, nchannels)
+    return encode(amps, sampwidth, wave_format)
+
+
+class _ProgressThrottle(object):
+    """ Вызов функции прогресса не чаще PROGRESS_INTERVAL
+    (и обязательно - по завершении)
+    """
+    def __init__(self, progress):
+        self.progress = progress
+        self._time = time.monotonic()
+
+    def __call__(self, frames, nframes):
+        if self.progress is None:
+            return
+        now = time.monotonic()
+        if frames == nframes or now - self._time >= PROGRESS_INTERVAL:
+            self._time = now
+            self.progress(frames, nframes)
+
+
+# Данные процесса, создающего фреймы (см. _render_worker_init)
+_worker = {}
+
+
+def _render_worker_init(outfile, data_offset, shared, scale, params):
+    """ Подготовка процесса ProcessPoolExecutor к созданию фреймов:
+    подключение к общей памяти с телеметрией
+
+    :param outfile:     путь к создаваемому аудиофайлу
+    :param data_offset: смещение сэмплов в файле, байт
+    :param shared:      кортеж описаний массивов в общей памяти
+                        (имя, число элементов, тип) - моменты времени и
+                        значения (для стерео - два массива)
+    :param scale:       словарь параметров _ScaledTlm (peak, max_vol,
+                        multiplier, framerate, interpolation)
+    :param params:      словарь параметров _render_frames (sampwidth,
+                        nchannels, wave_format)
+    """
+    _worker['outfile'] = outfile
+    _worker['data_offset'] = data_offset
+    _worker['params'] = params
+    _worker['shm'] = [shared_memory.SharedMemory(name=name)
+                      for name, _, _ in shared]
+    times, *values = [np.ndarray(size, dtype=dtype, buffer=shm.buf)
+                      for shm, (_, size, dtype)
+                      in zip(_worker['shm'], shared)]
+    tlm = TlmBlocks(times, tuple(values) if len(values) == 2 else values[0])
+    _worker['tlm'] = _ScaledTlm(tlm, **scale)
+
+
+def _render_worker_range(start, stop):
+    """ Создать фреймы start...stop-1 прямо в участке аудиофайла,
+    отображённом в память (выполняется в процессах ProcessPoolExecutor)
+
+    :return: stop
+    """
+    params = _worker['params']
+    samples = _render_frames(_worker['tlm'], start, stop, **params)
+    frame_bytes = params['nchannels'] * params['sampwidth']
+    out = np.memmap(_worker['outfile'], dtype=np.uint8, mode='r+',
+                    offset=_worker['data_offset'] + start * frame_bytes,
+                    shape=samples.shape)
+    out[:] = samples
+    out.flush()
+    del out
+    return stop
+
+
+def _shared_copy(tlm):
+    """ Копия телеметрии в общей памяти - моменты времени и значения (для
+    стерео - оба канала), заполняемая по блокам строк
+
+    :param tlm: TlmBlocks
+    :return:    список кортежей (SharedMemory,
+                описание (имя, число элементов, тип))
+    """
+    def columns(start, stop):
+        values = tlm.values(start, stop)
+        return (tlm.times(start, stop),) \
+            + (values if tlm.stereo else (values,))
+
+    shared = []
+    arrays = []
+    for column in columns(0, 1):
+        dtype = np.dtype(column.dtype)
+        shm = shared_memory.SharedMemory(
+            create=True, size=max(tlm.size * dtype.itemsize, 1))
+        shared.append((shm, (shm.name, tlm.size, dtype.str)))
+        arrays.append(np.ndarray(tlm.size, dtype=dtype, buffer=shm.buf))
+    for start, stop in _row_chunks(tlm.size):
+        for array, column in zip(arrays, columns(start, stop)):
+            array[start:stop] = column
+    return shared
+
+
+def _truncate_wav(f, written, nchannels, sampwidth, framerate,
+                  wave_format):
+    # Оставить в файле f (открытом на запись) только первые written фреймов
+    header = wav_header(nchannels, sampwidth, framerate, written,
+                        wave_format)
+    f.seek(0)
+    f.write(header)
+    f.truncate(len(header) + written * nchannels * sampwidth)
+
+
+def _render_wav_parallel(outfile, tlm, nframes, sampwidth, nchannels,
+                         wave_format, progress, aborted, chunk_frames,
+                         jobs):
+    # Создание аудиофайла в нескольких процессах (см. render_wav)
+    framerate = tlm.framerate
+    header = wav_header(nchannels, sampwidth, framerate, nframes,
+                        wave_format)
+    # Заголовок - заранее, место под данные - выделить сразу
+    with open(outfile, 'wb') as f:
+        f.write(header)
+        f.truncate(len(header) + nframes * nchannels * sampwidth)
+    shared = _shared_copy(tlm.tlm)
+    written = 0
+    try:
+        scale = {'peak': tlm.peak, 'max_vol': tlm.max_vol,
+                 'multiplier': tlm.multiplier, 'framerate': framerate,
+                 'interpolation': tlm.interpolation}
+        params = {'sampwidth': sampwidth, 'nchannels': nchannels,
+                  'wave_format': wave_format}
+        with ProcessPoolExecutor(
+                max_workers=jobs, initializer=_render_worker_init,
+                initargs=(outfile, len(header),
+                          [desc for _, desc in shared],
+                          scale, params)) as executor:
+            futures = [executor.submit(_render_worker_range, start,
+                                       min(start + chunk_frames, nframes))
+                       for start in range(0, nframes, chunk_frames)]
+            # Блоки учитываются по порядку: записанная часть файла -
+            # всегда его начало
+            for future in futures:
+                if aborted is not None and aborted():
+                    for pending in futures:
+                        pending.cancel()
+                    break
+                written = future.result()
+                progress(written, nframes)
+    finally:
+        for shm, _ in shared:
+            shm.close()
+            shm.unlink()
+    if written < nframes:
+        # Прервано - оставить в файле только созданное начало
+        with open(outfile, 'r+b') as f:
+            _truncate_wav(f, written, nchannels, sampwidth, framerate,
+                          wave_format)
+    return written
+
+
+def _synth(pitch, framerate, sampwidth, wave_format):
+    # Синтез тона для режима высоты тона (None - режим амплитуды)
+    if pitch is None:
+        return None
+    return PhaseAccumulator(pitch, framerate,
+                            max_volume(sampwidth, wave_format))
+
+
+def _peak(tlm):
+    # Абсолютный максимум значений TlmBlocks (для стерео - по обоим
+    # каналам) - проходом по блокам строк
+    peak = None
+    for start, stop in _row_chunks(tlm.size):
+        values = tlm.values(start, stop)
+        for channel in (values if tlm.stereo else (values,)):
+            chunk_peak = np.max(np.abs(channel))
+            if peak is None or chunk_peak > peak:
+                peak = chunk_peak
+    return peak
+
+
+def _prepare(times, values, multiplier, framerate, sampwidth, nchannels,
+             wave_format, interpolation):
+    # Проверка параметров и подготовка телеметрии к созданию звука
+    # (см. render_wav): нормирование значений и сжатие времени - по
+    # блокам строк, при создании фреймов (_ScaledTlm).
+    # Возвращает (_ScaledTlm, nchannels, nframes)
+    check_format(sampwidth, wave_format)
+    if interpolation not in INTERPOLATIONS:
+        raise ValueError('Неизвестный способ интерполяции: {0}'.format(
+            interpolation))
+    tlm = _tlm_blocks(times, values)
+    if tlm.stereo:
+        nchannels = 2
+    # Нормировать абсолютный максимум амплитуды к максимальной громкости
+    # (для стерео - по обоим каналам)
+    tlm = _ScaledTlm(tlm, _peak(tlm), max_volume(sampwidth, wave_format),
+                     multiplier, framerate, interpolation)
+    return tlm, nchannels, tlm.nframes()
+
+
+def render_wav(outfile, times, values=None, multiplier=200, framerate=8000,
+               sampwidth=2, nchannels=1, progress=None, aborted=None,
+               chunk_frames=CHUNK_FRAMES, jobs=1, parallel_threshold=None,
+               wave_format=WAVE_FORMAT_PCM, interpolation='linear',
+               pitch=None):
+    """ Создать аудиофайл из телеметрии
+
+    :param outfile:    путь к создаваемому аудиофайлу
+    :param times:      np.array-массив моментов времени телеметрии, с,
+                       или TlmBlocks - вся телеметрия (values не задаётся)
+    :param values:     np.array-массив значений телеметрии или пара
+                       массивов (левый канал, правый канал) - для стерео.
+                       Пара нормируется к общему максимуму; амплитуды обоих
+                       каналов вычисляются за один проход интерполяции
+                       (по общим индексам), сэмплы каналов чередуются
+    :param multiplier: множитель скорости воспроизведения звука по
+                       телеметрии
+    :param framerate:  Гц, фреймов в секунду:
+                       ..., 8000, 11025, 16000, 22050, 44100, ...
+    :param sampwidth:  Байт, длина сэмпла:
+                       2B = 16 bit per sample (1, 2, 3, 4 B)
+    :param nchannels:  число каналов (в каждый записывается один и тот же
+                       звук). Для пары массивов values - всегда 2
+    :param progress:   функция progress(frames, nframes), вызываемая после
+                       записи блока фреймов (не чаще PROGRESS_INTERVAL и
+                       обязательно после последнего блока): frames - записано
+                       фреймов, nframes - всего фреймов
+    :param aborted:    функция без аргументов, проверяемая перед каждым
+                       блоком: если вернёт True - создание прерывается
+                       (аудиофайл остаётся корректным, но неполным)
+    :param chunk_frames: число фреймов, создаваемых за раз
+    :param jobs:       число процессов создания аудиофайла.
+                       None - по числу процессоров
+    :param parallel_threshold: число фреймов, начиная с которого аудиофайл
+                       создаётся в нескольких процессах.
+                       По умолчанию - PARALLEL_THRESHOLD
+    :param wave_format: WAVE_FORMAT_PCM - целые сэмплы;
+                       WAVE_FORMAT_IEEE_FLOAT - 32-битные с плавающей точкой
+                       (без квантования, амплитуда нормируется к 1)
+    :param interpolation: способ интерполяции - ключ INTERPOLATIONS:
+                       'linear', 'cubic', 'sinc'
+    :param pitch:      режим высоты тона: диапазон частот тона
+                       (наименьшая, наибольшая), Гц, - значения задают
+                       частоту тона (см. PhaseAccumulator). None - значения
+                       задают амплитуду. Фаза тона переносится из блока в
+                       блок, поэтому в режиме высоты тона аудиофайл
+                       создаётся в одном процессе
+    :return:           число записанных фреймов
+    """
+    tlm, nchannels, nframes = _prepare(
+        times, values, multiplier, framerate, sampwidth, nchannels,
+        wave_format, interpolation)
+    synth = _synth(pitch, framerate, sampwidth, wave_format)
+    progress = _ProgressThrottle(progress)
+    if jobs is None:
+        jobs = os.cpu_count() or 1
+    if parallel_threshold is None:
+        parallel_threshold = PARALLEL_THRESHOLD
+    if jobs > 1 and nframes >= parallel_threshold and synth is None:
+        return _render_wav_parallel(outfile, tlm, nframes, sampwidth,
+                                    nchannels, wave_format, progress,
+                                    aborted, chunk_frames, jobs)
+    written = 0
+    with open(outfile, 'wb') as f:
+        # Заголовок - заранее (число фреймов известно)
+        f.write(wav_header(nchannels, sampwidth, framerate, nframes,
+                           wave_format))
+        for start in range(0, nframes, chunk_frames):
+            # Прервать работу безопасно, если запрошена остановка
+            if aborted is not None and aborted():
+                break
+            stop = min(start + chunk_frames, nframes)
+            f.write(_render_frames(tlm, start, stop, sampwidth, nchannels,
+                                   wave_format, synth))
+            written = stop
+            progress(written, nframes)
+        if written < nframes:
+            # Прервано - исправить число фреймов в заголовке
+            _truncate_wav(f, written, nchannels, sampwidth, framerate,
+                          wave_format)
+    return written
+
+
+class Sound(object):
+    """ Звук в памяти: сэмплы в том виде, в котором они записываются в
+    WAV файл, и параметры формата
+    """
+    def __init__(self, data, nchannels, sampwidth, framerate,
+                 wave_format=WAVE_FORMAT_PCM):
+        """
+        :param data:        np.array-массив байт (uint8) сэмплов
+        :param nchannels:   число каналов
+        :param sampwidth:   длина сэмпла, байт
+        :param framerate:   Гц, фреймов в секунду
+        :param wave_format: WAVE_FORMAT_PCM или WAVE_FORMAT_IEEE_FLOAT
+        """
+        self.data = data
+        self.nchannels = nchannels
+        self.sampwidth = sampwidth
+        self.framerate = framerate
+        self.wave_format = wave_format
+        # Множитель скорости, с которым звук создан из телеметрии (для
+        # пересчёта моментов телеметрии в позицию звука); None - неизвестен
+        self.multiplier = None
+        # Исходные данные звука, созданного render_sound()
+        # (для пересоздания только изменившейся части)
+        self.source = None
+
+    @property
+    def frame_bytes(self):
+        """ Байт во фрейме
+        """
+        return self.nchannels * self.sampwidth
+
+    @property
+    def nframes(self):
+        return self.data.size // self.frame_bytes
+
+    @property
+    def duration_ms(self):
+        """ Длительность, мс
+        """
+        return self.nframes / float(self.framerate) * 1000
+
+    def read(self, start, count):
+        """ Сэмплы фреймов start...start+count-1 (до конца звука)
+
+        Возвращается срез data без копирования: время чтения не зависит ни
+        от длины звука, ни от позиции. Срез - np.array, а не memoryview:
+        PyAudio принимает из callback-функции только буферы, доступные
+        только для чтения без освобождения (bytes, np.array), memoryview
+        он отвергает.
+
+        :param start: номер первого фрейма
+        :param count: число фреймов
+        :return:      np.array-массив байт (uint8) - срез data; короче
+                      count фреймов - в конце звука
+        """
+        frame_bytes = self.frame_bytes
+        return self.data[start * frame_bytes:(start + count) * frame_bytes]
+
+    def read_speed(self, position, count, speed):
+        """ Сэмплы count фреймов звука, воспроизводимого с другой скоростью:
+        фреймы берутся с шагом speed начиная с дробной позиции position,
+        между фреймами звука - линейной интерполяцией. Высота звука
+        меняется вместе со скоростью (как у магнитофона).
+
+        :param position: номер первого фрейма (дробный)
+        :param count:    число фреймов
+        :param speed:    скорость (> 0): 1 - исходная, 2 - вдвое быстрее
+        :return:         np.array-массив байт (uint8) сэмплов; короче count
+                         фреймов - в конце звука
+        """
+        positions = position + speed * np.arange(count)
+        positions = positions[:np.searchsorted(positions, self.nframes)]
+        if not positions.size:
+            return self.read(self.nframes, 0)
+        first = int(positions[0])
+        samples = decode(self.read(first, int(positions[-1]) + 2 - first),
+                         self.sampwidth, self.wave_format)
+        samples = samples.reshape(-1, self.nchannels)
+        positions -= first
+        i = positions.astype(np.intp)
+        frac = (positions - i)[:, np.newaxis]
+        amps = samples[i] * (1 - frac) \
+            + samples[np.minimum(i + 1, len(samples) - 1)] * frac
+        return encode(amps.reshape(-1), self.sampwidth, self.wave_format)
+
+    def header(self):
+        """ Заголовок WAV файла (см. wav_header)
+        """
+        return wav_header(self.nchannels, self.sampwidth, self.framerate,
+                          self.nframes, self.wave_format)
+
+    def save(self, outfile):
+        """ Записать в WAV файл
+
+        :param outfile: путь к создаваемому аудиофайлу
+        """
+        with open(outfile, 'wb') as f:
+            f.write(self.header())
+            f.write(self.data)
+
+
+class LiveSound(Sound):
+    """ Звук, вычисляемый из телеметрии по мере чтения (воспроизведения):
+    ничего не создаётся заранее, поэтому воспроизведение начинается сразу,
+    а переход к любому месту ничего не стоит.
+
+    Фреймы вычисляются блоками не короче lookahead фреймов - следующие
+    запросы последовательного воспроизведения берутся из уже вычисленного
+    блока.
+    """
+    def __init__(self, times, values=None, multiplier=200, framerate=8000,
+                 sampwidth=2, nchannels=1, wave_format=WAVE_FORMAT_PCM,
+                 interpolation='linear', lookahead=LOOKAHEAD_FRAMES,
+                 pitch=None):
+        """
+        Параметры - как у render_wav(), а также
+        :param lookahead: число фреймов, вычисляемых за раз
+
+        В режиме высоты тона фаза тона продолжается при последовательном
+        чтении; после перехода к другому месту тон начинается с нулевой
+        фазы.
+        """
+        self._tlm, nchannels, self._nframes = _prepare(
+            times, values, multiplier, framerate, sampwidth, nchannels,
+            wave_format, interpolation)
+        Sound.__init__(self, None, nchannels, sampwidth, framerate,
+                       wave_format)
+        self.multiplier = multiplier
+        self.interpolation = interpolation
+        self.lookahead = lookahead
+        self.pitch = pitch
+        self._synth = _synth(pitch, framerate, sampwidth, wave_format)
+        # Вычисленный впрок блок фреймов и номер его первого фрейма
+        self._block = np.empty(0, dtype=np.uint8)
+        self._block_start = 0
+
+    @property
+    def nframes(self):
+        return self._nframes
+
+    def _render(self, start, stop):
+        # Байты сэмплов фреймов start...stop-1
+        return _render_frames(self._tlm, start, stop, self.sampwidth,
+                              self.nchannels, self.wave_format, self._synth)
+
+    def read(self, start, count):
+        stop = min(start + count, self.nframes)
+        if start >= stop:
+            return self._block[:0]
+        frame_bytes = self.frame_bytes
+        block_stop = self._block_start + self._block.size // frame_bytes
+        if not self._block_start <= start <= block_stop:
+            # Переход к другому месту: вычисленный блок не нужен
+            self._block = self._block[:0]
+            self._block_start = block_stop = start
+            if self._synth is not None:
+                self._synth.phase = 0.0
+        if stop > block_stop:
+            # Дописать к непрочитанному остатку блока новые фреймы - с
+            # запасом на следующие запросы (фаза тона продолжается)
+            tail = self._block[(start - self._block_start) * frame_bytes:]
+            new_stop = min(block_stop + max(stop - block_stop,
+                                            self.lookahead), self.nframes)
+            self._block = np.concatenate(
+                (tail, self._render(block_stop, new_stop)))
+            self._block_start = start
+        offset = (start - self._block_start) * frame_bytes
+        return self._block[offset:offset + (stop - start) * frame_bytes]
+
+    def save(self, outfile):
+        # Сохраняемый звук - с начала (фаза тона - с нуля)
+        synth, self._synth = self._synth, _synth(
+            self.pitch, self.framerate, self.sampwidth, self.wave_format)
+        try:
+            with open(outfile, 'wb') as f:
+                f.write(self.header())
+                for start in range(0, self.nframes, CHUNK_FRAMES):
+                    f.write(self._render(
+                        start, min(start + CHUNK_FRAMES, self.nframes)))
+        finally:
+            self._synth = synth
+
+
+# Исходные данные звука (см. render_sound): телеметрия до нормирования
+# (TlmBlocks), абсолютный максимум значений и параметры создания
+_RenderSource = namedtuple('_RenderSource', 'tlm peak params')
+
+
+def _changed_rows(old, new):
+    # Признаки изменения значений телеметрии (для пары массивов - в любом
+    # из них)
+    if isinstance(new, (tuple, list)):
+        return np.logical_or(*(a != b for a, b in zip(old, new)))
+    return old != new
+
+
+def _changed_groups(old, new, support):
+    # Группы изменившихся строк [(первая, последняя), ...], отстоящие друг
+    # от друга больше чем на 2*support строк (сравнение - по блокам
+    # строк). None - изменилось время
+    groups = []
+    for start, stop in _row_chunks(new.size):
+        if not np.array_equal(old.times(start, stop),
+                              new.times(start, stop)):
+            return None
+        rows = np.flatnonzero(_changed_rows(old.values(start, stop),
+                                            new.values(start, stop)))
+        if rows.size == 0:
+            continue
+        rows += start
+        gaps = np.flatnonzero(np.diff(rows) > 2 * support)
+        for first, last in zip(rows[np.concatenate(([0], gaps + 1))],
+                               rows[np.concatenate((gaps, [rows.size - 1]))]):
+            if groups and first - groups[-1][1] <= 2 * support:
+                groups[-1] = (groups[-1][0], last)
+            else:
+                groups.append((first, last))
+    return groups
+
+
+def _changed_frames(previous, source, tlm, nframes):
+    # Диапазоны фреймов [(start, stop), ...], амплитуды которых зависят от
+    # значений телеметрии, изменившихся с создания звука previous.
+    # tlm - _ScaledTlm создаваемого звука.
+    # None - звук нужно создать заново целиком
+    old = previous.source if previous is not None else None
+    if old is None or old.params != source.params \
+            or old.peak != source.peak or source.params['pitch'] is not None \
+            or old.tlm.size != source.tlm.size \
+            or old.tlm.stereo != source.tlm.stereo:
+        return None
+    support = tlm.support
+    groups = _changed_groups(old.tlm, source.tlm, support)
+    if groups is None:
+        return None
+    framerate = tlm.framerate
+    size = source.tlm.size
+    ranges = []
+    for first, last in groups:
+        # Фреймы интервалов между отсчётами, зависящих от изменившихся
+        # (за пределами телеметрии - от крайних значений)
+        lo, hi = first - support, last + support
+        start = 0 if lo <= 0 else int(np.floor(tlm.time(lo) * framerate))
+        stop = nframes if hi >= size - 1 \
+            else min(nframes, int(np.ceil(tlm.time(hi) * framerate)) + 1)
+        if ranges and start <= ranges[-1][1]:
+            ranges[-1] = (ranges[-1][0], max(ranges[-1][1], stop))
+        elif start < stop:
+            ranges.append((start, stop))
+    return ranges
+
+
+def render_sound(times, values=None, multiplier=200, framerate=8000,
+                 sampwidth=2, nchannels=1, progress=None, aborted=None,
+                 chunk_frames=CHUNK_FRAMES, wave_format=WAVE_FORMAT_PCM,
+                 interpolation='linear', previous=None, pitch=None):
+    """ Создать звук из телеметрии в памяти (без записи в файл).
+    Параметры - как у render_wav(). Сэмплы создаются блоками прямо в
+    выделенный заранее массив.
+
+    Если задан previous - звук, созданный ранее с теми же параметрами из
+    телеметрии с теми же моментами времени (например, до изменения
+    калибровки), - пересоздаются только фреймы, зависящие от изменившихся
+    значений; остальные берутся из previous (сам previous не изменяется).
+    Если изменился абсолютный максимум значений (по нему нормируется
+    амплитуда) - звук создаётся заново целиком. В режиме высоты тона
+    (pitch) изменение частоты сдвигает фазу всего последующего звука,
+    поэтому он всегда создаётся целиком.
+
+    :param previous: Sound или None
+    :return: Sound; при прерывании - с уже созданным началом звука
+             (при пересоздании части - previous)
+    """
+    params = {'multiplier': multiplier, 'framerate': framerate,
+              'sampwidth': sampwidth, 'nchannels': nchannels,
+              'wave_format': wave_format, 'interpolation': interpolation,
+              'pitch': pitch}
+    tlm, nchannels, nframes = _prepare(
+        times, values, multiplier, framerate, sampwidth, nchannels,
+        wave_format, interpolation)
+    source = _RenderSource(tlm.tlm, tlm.peak, params)
+    synth = _synth(pitch, framerate, sampwidth, wave_format)
+    progress = _ProgressThrottle(progress)
+    frame_bytes = nchannels * sampwidth
+    ranges = _changed_frames(previous, source, tlm, nframes)
+    partial = ranges is not None
+    if not partial:
+        ranges = [(0, nframes)]
+        data = np.empty(nframes * frame_bytes, dtype=np.uint8)
+    else:
+        # Пересоздать часть звука - в копии: previous может
+        # воспроизводиться или храниться в кэше
+        data = np.array(previous.data, dtype=np.uint8)
+    total = sum(stop - start for start, stop in ranges)
+    done = 0
+    for range_start, range_stop in ranges:
+        for start in range(range_start, range_stop, chunk_frames):
+            # Прервать работу безопасно, если запрошена остановка
+            if aborted is not None and aborted():
+                if partial:
+                    return previous
+                sound = Sound(data[:start * frame_bytes], nchannels,
+                              sampwidth, framerate, wave_format)
+                sound.multiplier = multiplier
+                return sound
+            stop = min(start + chunk_frames, range_stop)
+            data[start * frame_bytes:stop * frame_bytes] = _render_frames(
+                tlm, start, stop, sampwidth, nchannels, wave_format, synth)
+            done += stop - start
+            progress(done, total)
+    sound = Sound(data, nchannels, sampwidth, framerate, wave_format)
+    sound.multiplier = multiplier
+    sound.source = source
+    return sound
+
+
+class SoundCache(object):
+    """ Кэш созданных звуков (Sound) с адресацией по содержимому: ключ -
+    хэш содержимого телеметрии, параметров создания звука и интервалов
+    калибровки (см. key()).
+
+    Два уровня, каждый - с вытеснением давно не использовавшихся записей
+    (LRU) при превышении предельного размера:
+     - в памяти - словарь звуков;
+     - на диске - записи tlm2wav_cache.TlmCache в подкаталоге sounds
+       каталога кэша (сэмплы и параметры формата - *.npy файлами).
+       Звук, найденный на диске, загружается отображением в память и
+       переносится в кэш в памяти.
+
+    Настройки через переменные окружения:
+        TLM2WAV_SOUND_MEMORY_LIMIT - предельный размер в памяти, МБ
+                                     (по умолчанию 256)
+        TLM2WAV_SOUND_CACHE_LIMIT  - предельный размер на диске, МБ
+                                     (по умолчанию 1024)
+        TLM2WAV_NO_CACHE           - если задана (не пустая) - кэш на диске
+                                     не используется
+    """
+    def __init__(self, memory_limit=None, directory=None, disk_limit=None,
+                 use_disk=None):
+        """
+        :param memory_limit: предельный размер кэша в памяти, байт
+        :param directory:    каталог кэша на диске. По умолчанию -
+                             подкаталог sounds tlm2wav_cache.default_dir()
+        :param disk_limit:   предельный размер кэша на диске, байт
+        :param use_disk:     использовать кэш на диске. По умолчанию -
+                             tlm2wav_cache.enabled()
+        """
+        if memory_limit is None:
+            memory_limit = _env_limit('TLM2WAV_SOUND_MEMORY_LIMIT',
+                                      SOUND_MEMORY_LIMIT)
+        if disk_limit is None:
+            disk_limit = _env_limit('TLM2WAV_SOUND_CACHE_LIMIT',
+                                    SOUND_DISK_LIMIT)
+        if use_disk is None:
+            use_disk = tlm2wav_cache.enabled()
+        self.memory_limit = memory_limit
+        self._memory = OrderedDict()
+        self.disk = None
+        if use_disk:
+            self.disk = tlm2wav_cache.TlmCache(
+                directory or os.path.join(tlm2wav_cache.default_dir(),
+                                          'sounds'),
+                disk_limit)
+
+    @staticmethod
+    def key(tlm_key, calib=(), **params):
+        """ Ключ записи кэша
+
+        :param tlm_key: ключ содержимого телеметрии
+                        (tlm2wav_utils.Telemetry.content_key())
+        :param calib:   интервалы калибровки - последовательность пар
+                        (начало, конец), с
+        :param params:  параметры создания звука (режим, датчики, множитель,
+                        частота, формат сэмплов, интерполяция, ...) -
+                        значения, представимые в JSON
+        :return:        шестнадцатеричная строка хэша
+        """
+        ident = json.dumps({'tlm': tlm_key,
+                            'calib': [[float(t) for t in tint]
+                                      for tint in calib],
+                            'params': params}, sort_keys=True)
+        return hashlib.sha1(ident.encode('utf8')).hexdigest()
+
+    @property
+    def memory_size(self):
+        """ Размер звуков в кэше в памяти, байт
+        """
+        return sum(sound.data.nbytes for sound in self._memory.values())
+
+    def get(self, key):
+        """ Найти звук в кэше
+
+        :param key: ключ записи кэша (см. key())
+        :return:    Sound или None, если звука нет в кэше
+        """
+        sound = self._memory.get(key)
+        if sound is not None:
+            self._memory.move_to_end(key)
+            return sound
+        if self.disk is None:
+            return None
+        columns = self.disk.load(key)
+        if columns is None or 'data' not in columns \
+                or 'format' not in columns:
+            return None
+        nchannels, sampwidth, framerate, wave_format = \
+            (int(value) for value in columns['format'])
+        sound = Sound(columns['data'], nchannels, sampwidth, framerate,
+                      wave_format)
+        if 'multiplier' in columns:
+            sound.multiplier = float(columns['multiplier'][0])
+        self._remember(key, sound)
+        return sound
+
+    def put(self, key, sound):
+        """ Поместить звук в кэш (в памяти и на диске)
+
+        В кэше в памяти - звук без исходных данных (source): они ссылаются
+        на всю телеметрию, размер которой предел кэша не учитывает.
+        Пересоздание части звука ведётся от звука, созданного
+        render_sound(), а не взятого из кэша.
+
+        :param key:   ключ записи кэша (см. key())
+        :param sound: Sound
+        """
+        cached = Sound(sound.data, sound.nchannels, sound.sampwidth,
+                       sound.framerate, sound.wave_format)
+        cached.multiplier = sound.multiplier
+        self._remember(key, cached)
+        if self.disk is None:
+            return
+        columns = {'data': sound.data,
+                   'format': np.array([sound.nchannels, sound.sampwidth,
+                                       sound.framerate, sound.wave_format],
+                                      dtype=np.int64)}
+        if sound.multiplier is not None:
+            columns['multiplier'] = np.array([sound.multiplier],
+                                             dtype=np.float64)
+        try:
+            self.disk.store(key, columns)
+        except OSError:
+            # Кэш на диске недоступен - работать только с кэшем в памяти
+            pass
+
+    def _remember(self, key, sound):
+        # Добавить звук в кэш в памяти, вытеснив давно не использовавшиеся
+        self._memory[key] = sound
+        self._memory.move_to_end(key)
+        size = self.memory_size
+        while size > self.memory_limit and len(self._memory) > 1:
+            _, evicted = self._memory.popitem(last=False)
+            size -= evicted.data.nbytes
+
+    def clear(self):
+        """ Очистить кэш (в памяти и на диске)
+        """
+        self._memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
+
+
+def _env_limit(name, default):
+    # Предельный размер из переменной окружения (МБ), байт
+    limit = os.environ.get(name)
+    if limit:
+        return int(float(limit) * 2**20)
+    return default
@@ -7,15 +7,26 @@
 ограничены).
 """
 
+import hashlib
 import wave
 import math
 import struct
 import numpy as np
-import re
 import sys
 import os
+import time
+import argparse
+import shutil
+import tempfile
+import weakref
 from collections import defaultdict
 from PyQt4 import QtCore
+import tlm2wav_cache
+import tlm2wav_parse
+import tlm2wav_render
+from tlm2wav_parse import parse_tlm_txt, _tlm_keys, _tlm_dtypes, \
+    _parse_tlm_bytes, _iter_tlm_byte_blocks, _iter_tlm_blocks, \
+    _COMPACT_SCALE_TIME, _COMPACT_SCALE_ANGLE
 
 __author__ = 'Don D.S'
 
@@ -23,11 +34,23 @@ __author__ = 'Don D.S'
 LEFT = 0b0001   # значение соответствует индексу+1 в паре углов (лев, прав)
 RIGHT = 0b0010  # значение соответствует индексу+1 в паре углов (лев, прав)
 META = 0b0100
-TIME = 0b1000
+TIME = tlm2wav_parse.TIME  # 0b1000 - ключ столбца времени
+# Режим создания звука: левая рамка - в канал 1, правая - в канал 2
+STEREO = 0b10000
+# Режим высоты тона: значения телеметрии задают частоту тона, а не
+# амплитуду. Сочетается с LEFT, RIGHT, LEFT | RIGHT, STEREO
+PITCH = 0b100000
 
 # Метка опыта для калибровке датчиков
 CALIB = 'калибровка'
 
+# Способы хранения столбцов телеметрии:
+STORAGE_MEMORY = 'memory'   # в оперативной памяти
+STORAGE_MEMMAP = 'memmap'   # в файлах на диске, отображённых в память
+
+# Число строк телеметрии, обрабатываемых за раз при поблочных вычислениях
+CHUNK_ROWS = 2**20
+
 # Константы-индексы для временных интервалов
 TI_START = 0
 TI_END = 1
@@ -231,6 +254,41 @@ class TimeIntervalsList(QtCore.QObject):
         return out
 
 
+class _GrowingArray(object):
+    """ Одномерный np.array-массив, дополняемый в конец.
+
+    Ёмкость увеличивается удвоением, поэтому добавление значений обходится
+    в среднем в O(число добавляемых значений), в отличие от np.append,
+    копирующего весь массив при каждом вызове.
+    """
+    def __init__(self, dtype=np.float64, capacity=1024):
+        self._data = np.empty(capacity, dtype=dtype)
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def values(self):
+        """ Заполненная часть массива (без копирования)
+        """
+        return self._data[:self._size]
+
+    def extend(self, values):
+        """ Добавить значения в конец массива
+        """
+        size = self._size + len(values)
+        if size > self._data.size:
+            capacity = self._data.size
+            while capacity < size:
+                capacity *= 2
+            data = np.empty(capacity, dtype=self._data.dtype)
+            data[:self._size] = self.values
+            self._data = data
+        self._data[self._size:size] = values
+        self._size = size
+
+
 class Telemetry(object):
     """ Класс хранит телеметрическую информацию и словарь наблюдений
 
@@ -243,15 +301,179 @@ class Telemetry(object):
      - последовательности временных интервалов в телеметрии, которые
        соответствуют обозначенным в ключах опытах.
     """
-    def __init__(self, file):
+    def __init__(self, file, use_cache=None, storage=STORAGE_MEMORY,
+                 progress=None, jobs=None, follow=False, compact=False,
+                 sensors=None):
+        """
+        :param file:      путь к txt файлу с телеметрией
+        :param use_cache: использовать кэш разобранной телеметрии.
+                          По умолчанию - если не запрещено переменной
+                          окружения TLM2WAV_NO_CACHE
+        :param storage:   способ хранения столбцов телеметрии:
+                          STORAGE_MEMORY - в оперативной памяти,
+                          STORAGE_MEMMAP - в файлах на диске, отображённых в
+                          память (для записей, не помещающихся в память)
+        :param progress:  функция progress(offset, size), вызываемая по мере
+                          разбора файла: offset - разобрано байт,
+                          size - размер файла, байт
+        :param jobs:      число процессов разбора больших файлов.
+                          По умолчанию - по числу процессоров
+        :param follow:    режим слежения за дописываемым файлом: разбираются
+                          только целые строки, дописанные строки добавляются
+                          методом update(). Только для STORAGE_MEMORY, без
+                          кэша
+        :param compact:   компактное хранение столбцов: время - в целых мс,
+                          углы - в целых угловых секундах. Секунды и градусы
+                          вычисляются методом get_tlm() при обращении
+        :param sensors:   номера датчиков (1, 2, 3), столбцы которых
+                          загружаются (время загружается всегда).
+                          По умолчанию - все
+        """
         self.observs = defaultdict(TimeIntervalsList)
-        self.tlm = parse_tlm_txt(file)
+        self.file = file
+        self.following = follow
+        self.compact = compact
+        self.sensors = sensors
+        self._time_sorted = None
+        if follow:
+            if storage != STORAGE_MEMORY:
+                raise ValueError(
+                    'Режим слежения за файлом требует storage=STORAGE_MEMORY')
+            # Растущие столбцы и позиция в файле, до которой он разобран
+            self._columns = None
+            self._offset = 0
+            self.update(progress)
+        else:
+            self._stat_file()
+            workdir = None
+            if storage == STORAGE_MEMMAP:
+                # Каталог столбцов на случай работы без кэша.
+                # Удаляется вместе с объектом телеметрии
+                workdir = tempfile.mkdtemp(prefix='tlm2wav_')
+                weakref.finalize(self, shutil.rmtree, workdir, True)
+            self.tlm = load_tlm(file, use_cache, storage, workdir, progress,
+                                jobs, compact, sensors)
         if not self.__bool__():
             raise Exception('Не удалось распознать телеметрию.')
 
     def __bool__(self):
         return len(self.tlm[TIME]) > 0
 
+    def update(self, progress=None):
+        """ Дочитать строки, дописанные в файл после предыдущего разбора
+        (в режиме слежения за файлом follow=True)
+
+        Разбираются только целые строки (завершённые переводом строки).
+        Если файл стал короче разобранной части - он перечитывается заново.
+
+        :param progress: функция progress(offset, size) - см. _iter_tlm_blocks
+        :return:         число добавленных строк телеметрии
+        """
+        if not self.following:
+            raise ValueError('Телеметрия загружена не в режиме слежения '
+                             'за файлом (follow=True)')
+        size = self._stat_file()
+        if self._columns is None or size < self._offset:
+            # Первый разбор или файл перезаписан
+            self._columns = {
+                key: _GrowingArray(dtype) for key, dtype in
+                zip(_tlm_keys(self.sensors),
+                    _tlm_dtypes(self.compact, self.sensors))}
+            self._offset = 0
+            self._time_sorted = None
+        nrows = 0
+        with open(self.file, 'rb') as f:
+            f.seek(self._offset)
+            for offset, data in _iter_tlm_byte_blocks(f, end=size):
+                # Незавершённая строка в конце файла ещё дописывается
+                if not data.endswith(b'\n'):
+                    break
+                block = _parse_tlm_bytes(data, self.compact, self.sensors)
+                self._extend_sorted(block[0])
+                for key, values in zip(_tlm_keys(self.sensors), block):
+                    self._columns[key].extend(values)
+                nrows += block[0].size
+                self._offset = offset + len(data)
+                if progress is not None:
+                    progress(self._offset, size)
+        self.tlm = {key: column.values
+                    for key, column in self._columns.items()}
+        return nrows
+
+    def _extend_sorted(self, time):
+        # Обновить признак упорядоченности времени для дописанных значений
+        if self._time_sorted is None or time.size == 0:
+            return
+        prev = self._columns[TIME].values
+        if prev.size:
+            time = np.concatenate((prev[-1:], time))
+        self._time_sorted = self._time_sorted and bool(
+            np.all(np.diff(time) >= 0))
+
+    @property
+    def time_sorted(self):
+        """ True, если моменты времени телеметрии не убывают
+        """
+        if self._time_sorted is None:
+            time = self.tlm[TIME]
+            self._time_sorted = all(
+                np.all(np.diff(time[start:start+CHUNK_ROWS+1]) >= 0)
+                for start in range(0, time.size, CHUNK_ROWS))
+        return self._time_sorted
+
+    def _stat_file(self):
+        """ Запомнить размер, время изменения и хэш содержимого файла на
+        момент загрузки (для content_key)
+
+        :return: размер файла, байт
+        """
+        stat = os.stat(self.file)
+        self._file_ident = (str(stat.st_size), str(stat.st_mtime_ns),
+                            tlm2wav_cache.content_hash(self.file))
+        return stat.st_size
+
+    def content_key(self):
+        """ Ключ содержимого загруженной телеметрии: размер, время
+        изменения и хэш содержимого файла на момент загрузки (в режиме
+        слежения - последнего дочитывания), число загруженных строк и способ
+        хранения значений. Не зависит от пути к файлу; файл, изменённый
+        после загрузки, ключ не меняет.
+
+        :return: шестнадцатеричная строка хэша
+        """
+        ident = '\n'.join(self._file_ident
+                          + (str(len(self.tlm[TIME])),
+                             'compact' if self.compact else ''))
+        return hashlib.sha1(ident.encode('utf8')).hexdigest()
+
+    def _to_float(self, key, values):
+        """ Значения столбца телеметрии в секундах (TIME) или градусах
+
+        :param key:    ключ столбца в self.tlm
+        :param values: значения столбца (или их выборка)
+        :return:       np.array-массив; при хранении в float - values
+        """
+        if not self.compact:
+            return values
+        if key == TIME:
+            return values / _COMPACT_SCALE_TIME
+        return values / _COMPACT_SCALE_ANGLE
+
+    def _time_bound(self, value, side):
+        """ Граница промежутка времени в единицах столбца TIME
+
+        При компактном хранении граница переводится в целые мс так, чтобы
+        сравнение с ней целых значений времени было точным.
+
+        :param value: момент времени, с
+        :param side:  TI_START или TI_END
+        """
+        if not self.compact:
+            return value
+        # Округление устраняет погрешность представления секунд в double
+        value = round(value * _COMPACT_SCALE_TIME, 6)
+        return math.floor(value) if side == TI_START else math.ceil(value)
+
     def get_tlm(self, param, sens_left=2, sens_right=1, calib=True, tints=None):
         """ Возвращает указанную телеметрию с учётом калибровки
 
@@ -264,40 +486,80 @@ class Telemetry(object):
         :return: np.array
         """
         inds = None
-        tlm = None
         if tints:
             #  # Получить индексы телеметрии для указанных временных интервалов
             inds = self.get_inds(tints)
+        key = self._param_key(param, sens_left, sens_right)
+        tlm = self.tlm[key]
 
+        # Выборка до калибровки - калибруются только выбранные значения
+        if inds is not None:
+            tlm = tlm[inds]
+        if calib and (param == LEFT or param == RIGHT):
+            points = self._calib_points(param)
+            times = None
+            if points is not None:
+                times = self.tlm[TIME] if inds is None \
+                    else self.tlm[TIME][inds]
+            # Калибровать поблочно, не создавая промежуточных массивов
+            # во всю длину телеметрии
+            tlm_cal = np.empty(tlm.size)
+            for start in range(0, tlm.size, CHUNK_ROWS):
+                chunk = slice(start, start + CHUNK_ROWS)
+                tlm_cal[chunk] = self._calibrated(
+                    key, tlm[chunk],
+                    None if times is None else times[chunk], points)
+            return tlm_cal
+        else:
+            return self._to_float(key, tlm)
+
+    def _param_key(self, param, sens_left, sens_right):
+        """ Ключ столбца self.tlm для параметра телеметрии
+
+        :param param: TIME, LEFT, RIGHT или META
+        Остальные параметры - как у get_tlm()
+        """
+        key = None
         if param == TIME:
-            tlm = self.tlm[TIME]
+            key = TIME
 
         if param == META:
-            tlm = self.tlm[({1, 2, 3} - {sens_right, sens_left}).pop()]
+            key = ({1, 2, 3} - {sens_right, sens_left}).pop()
 
         if param == LEFT:
-            tlm = self.tlm[sens_left]
+            key = sens_left
         elif param == RIGHT:
-            tlm = self.tlm[sens_right]
+            key = sens_right
 
-        if tlm is None:
+        if key is None:
             raise ValueError(
                 'Неизвестное значение параметра param={0}'.format(param))
-
-        if calib and (param == LEFT or param == RIGHT):
-            calib = self.calib(mode=param)
-            tlm_cal = tlm - calib
-            inds_g = np.where(tlm_cal > 180)[0]
-            tlm_cal[inds_g] = 360 - tlm_cal[inds_g]
-            inds_l = np.where(tlm_cal < -180)[0]
-            tlm_cal[inds_l] = 360 + tlm_cal[inds_l]
-            if inds is not None:
-                tlm_cal = tlm_cal[inds]
-            return tlm_cal
+        if key not in self.tlm:
+            raise ValueError(
+                'Телеметрия датчика {0} не загружена'.format(key))
+        return key
+
+    def _calibrated(self, key, values, times, points):
+        """ Калиброванные значения блока строк столбца датчика, градусы
+
+        :param key:    ключ столбца в self.tlm
+        :param values: значения столбца (блок строк)
+        :param times:  значения столбца TIME тех же строк (без калибровки -
+                       не используются)
+        :param points: опорные точки калибровки - _calib_points()
+                       (None - без калибровки)
+        :return:       np.array-массив
+        """
+        if points is None:
+            values = np.array(self._to_float(key, values), dtype=np.float64)
         else:
-            if inds is not None:
-                tlm = tlm[inds]
-            return tlm
+            values = self._to_float(key, values) - np.interp(
+                self._to_float(TIME, times), *points)
+        inds_g = values > 180
+        values[inds_g] = 360 - values[inds_g]
+        inds_l = values < -180
+        values[inds_l] = 360 + values[inds_l]
+        return values
 
     def get_inds(self, tints):
         """ Получить индексы значений в телеметрии,
@@ -313,46 +575,39 @@ class Telemetry(object):
         if (isinstance(tints[0], float) or isinstance(tints[0], int)) \
                 and len(tints) == 2:
             # Имеем дело с одним промежутком [s1, e1]
-            inds = np.where(
-                np.logical_and(self.get_tlm(TIME) > tints[TI_START],
-                               self.get_tlm(TIME) < tints[TI_END]))[0]
-        else:
-            # we have list of time intervals.
-            inds = np.array([])
-            for tint in tints:
-                inds_curr_tint = np.where(np.logical_and(
-                    self.get_tlm(TIME) > tint[TI_START],
-                    self.get_tlm(TIME) < tint[TI_END]))[0]
-                inds = np.append(inds, inds_curr_tint)
+            tints = [tints]
+        # we have list of time intervals.
+        inds = np.concatenate(
+            [np.array([], dtype=int)]
+            + [self._tint_inds(tint) for tint in tints])
         if inds.size == 0:
             raise ValueError(
                 "Нет телеметрии для указанного временного интервала \n\
                 {0}".format(tints))
         return inds.astype(int)
 
-    def calib(self, mode=LEFT | RIGHT, for_tint=None):
-        """Калибровочные значения для датчиков
-        получаемые интерполяцией между среднеинтегральными
-        значениями в периоды калибровки
-
-        :param mode: режим - по Л, по П или по обеим рамкам
-        :param for_tint: интервалы времени, для которых необходимо вернуть калибровочные значения
-        :return:     np.array-массив значений
-                     или для mode=LEFT | RIGHT кортеж пары np.array-массивов вида
-                     (np_array_Left, np_array_Right)
-        (которые необходимо вычесть из соответствующей телеметрии для калибровки)
+    def _tint_inds(self, tint):
+        # Индексы телеметрии строго внутри промежутка времени tint
+        time = self.tlm[TIME]
+        tstart = self._time_bound(tint[TI_START], TI_START)
+        tend = self._time_bound(tint[TI_END], TI_END)
+        if self.time_sorted:
+            # Двоичный поиск границ промежутка
+            start = np.searchsorted(time, tstart, side='right')
+            end = np.searchsorted(time, tend, side='left')
+            return np.arange(start, max(start, end))
+        return np.where(np.logical_and(time > tstart, time < tend))[0]
+
+    def _calib_points(self, mode):
+        """ Опорные точки калибровочной кривой для одной из рамок
+
+        :param mode: LEFT или RIGHT
+        :return:     кортеж np.array-массивов (моменты времени,
+                     калибровочные значения) для np.interp
+                     или None, если калибровочных периодов нет
         """
-        # Рекурсивная обработка вызова метода для обеих рамок
-        if mode == LEFT | RIGHT:
-            calibs_left = self.calib(LEFT)
-            calibs_right = self.calib(RIGHT)
-            return calibs_left, calibs_right
-        # ===============================================
-        # Обработка вызова для 1 из двух рамок (Л или П)
-        # ===============================================
         if CALIB not in self.observs or len(self.observs[CALIB]) == 0:
-            # Если калибровочных периодов нет - вернуть нули
-            return np.zeros(self.get_tlm(TIME).size)
+            return None
         # ---------------------------------------------------------------
         # Массивы для опорных точки интерполяции:
         # - моменты времени - середина калибровочных временных интервалов
@@ -368,15 +623,9 @@ class Telemetry(object):
             # в текущем интервале времени tint
             calib_points = np.append(calib_points, self.mean(observ=CALIB, tints=tint, mode=mode, calib=False))
         # ---------------------------------------------------------------
-        # Если всего одна точка:
+        # Если всего одна точка - калибровочное смещение постоянно
         if calib_points.size == 1:
-            # "Размножить" калибровочное смещение на все моменты времени
-            if not for_tint:
-                times = self.get_tlm(TIME)
-            # Или только на моменты времени в заданном интервале
-            else:
-                times = self.get_tlm(TIME, calib=False, tints=for_tint)
-            return np.ones(times.size)*calib_points[0]
+            return time_points, calib_points
         # ---------------------------------------------------------------
         # Чтобы не использовать дополнительно экстраполяцию:
         # - скопировать первую опорную точку на начало временного ряда
@@ -384,18 +633,44 @@ class Telemetry(object):
             time_points = np.insert(time_points, 0, 0)
             calib_points = np.insert(calib_points, 0, calib_points[0])
         # - скопировать последнюю опорную точку в конец временного ряда
-        if time_points[-1] != self.get_tlm(TIME)[-1]:
-            time_points = np.append(time_points, self.get_tlm(TIME)[-1])
+        time_last = self._to_float(TIME, self.tlm[TIME][-1:])[0]
+        if time_points[-1] != time_last:
+            time_points = np.append(time_points, time_last)
             calib_points = np.append(calib_points, calib_points[-1])
-        # ---------------------------------------------------------------
-        # Калибрующие значения на каждый момент времени
+        return time_points, calib_points
+
+    def calib(self, mode=LEFT | RIGHT, for_tint=None):
+        """Калибровочные значения для датчиков
+        получаемые интерполяцией между среднеинтегральными
+        значениями в периоды калибровки
+
+        :param mode: режим - по Л, по П или по обеим рамкам
+        :param for_tint: интервалы времени, для которых необходимо вернуть калибровочные значения
+        :return:     np.array-массив значений
+                     или для mode=LEFT | RIGHT кортеж пары np.array-массивов вида
+                     (np_array_Left, np_array_Right)
+        (которые необходимо вычесть из соответствующей телеметрии для калибровки)
+        """
+        # Рекурсивная обработка вызова метода для обеих рамок
+        if mode == LEFT | RIGHT:
+            calibs_left = self.calib(LEFT)
+            calibs_right = self.calib(RIGHT)
+            return calibs_left, calibs_right
+        # ===============================================
+        # Обработка вызова для 1 из двух рамок (Л или П)
+        # ===============================================
+        # Моменты времени - все или только в заданном интервале
         if not for_tint:
-            calibs = np.interp(self.get_tlm(TIME), time_points, calib_points)
-        # Калибрующие значения на каждый момент времени в указанном временном интервале
+            times = self.get_tlm(TIME)
         else:
             times = self.get_tlm(TIME, calib=False, tints=for_tint)
-            calibs = np.interp(times, time_points, calib_points)
-        return calibs
+        points = self._calib_points(mode)
+        if points is None:
+            # Если калибровочных периодов нет - вернуть нули
+            return np.zeros(times.size)
+        # Калибрующие значения на каждый момент времени
+        # (при одной опорной точке np.interp "размножает" её значение)
+        return np.interp(times, *points)
 
     def mean(self, observ, tints=None, mode=LEFT | RIGHT, calib=True):
         """ Расчитать среднее (среднеинтегральное) значение
@@ -423,6 +698,43 @@ class Telemetry(object):
             tlm = self.get_tlm(param=mode, calib=calib, tints=tints)
             return np.mean(tlm)
 
+    def sound_values(self, param=LEFT | RIGHT, sens_left=2, sens_right=1,
+                     tints=None):
+        """ Значения телеметрии, по которым создаётся звук
+
+        :param param:      {LEFT, RIGHT, LEFT | RIGHT, STEREO}
+                           (флаг PITCH не учитывается)
+        :param sens_left:  номер датчика левой рамки
+        :param sens_right: номер датчика правой рамки
+        :param tints:      временной интервал(ы) - как у get_tlm().
+                           Если не задан - вся телеметрия
+        :return:           np.array-массив значений или для STEREO пара
+                           np.array-массивов (левая рамка, правая рамка)
+        """
+        param &= ~PITCH
+        if param == STEREO:
+            return (self.get_tlm(LEFT, sens_left, sens_right, tints=tints),
+                    self.get_tlm(RIGHT, sens_left, sens_right, tints=tints))
+        if param == LEFT | RIGHT:
+            # Среднее по правой и левой
+            return 0.5*(self.get_tlm(LEFT, sens_left, sens_right,
+                                     tints=tints)
+                        + self.get_tlm(RIGHT, sens_left, sens_right,
+                                       tints=tints))
+        return self.get_tlm(param, sens_left, sens_right, tints=tints)
+
+    def sound_blocks(self, param=LEFT | RIGHT, sens_left=2, sens_right=1):
+        """ Вся телеметрия для создания звука - моменты времени и значения
+        sound_values(), вычисляемые блоками строк по мере создания звука
+        (см. SoundValues). Передаётся в tlm2wav_render.render_wav(),
+        render_sound() и LiveSound вместо массивов get_tlm(TIME) и
+        sound_values()
+
+        Параметры - как у sound_values()
+        :return: SoundValues
+        """
+        return SoundValues(self, param, sens_left, sens_right)
+
     def make_sound(self,
                    param=LEFT | RIGHT,
                    multiplier=200,
@@ -431,13 +743,20 @@ class Telemetry(object):
                    outfile='output.wav',
                    framerate=8000,
                    sampwidth=2,
-                   nchannels=1
+                   nchannels=1,
+                   jobs=1,
+                   wave_format=tlm2wav_render.WAVE_FORMAT_PCM,
+                   interpolation='linear',
+                   pitch_range=tlm2wav_render.PITCH_RANGE
                    ):
         """ Создать аудиофайл из телеметрии
 
         :param param:       телеметрия по которой генерируется аудиофайл:
-                            с левой/правой рамки или усреднить левую и правую:
-                            {LEFT, RIGHT, LEFT | RIGHT}
+                            с левой/правой рамки, усреднить левую и правую
+                            или стерео (левая - канал 1, правая - канал 2):
+                            {LEFT, RIGHT, LEFT | RIGHT, STEREO}.
+                            С флагом PITCH (например, PITCH | RIGHT)
+                            телеметрия задаёт высоту тона, а не амплитуду
         :param multiplier:  множитель скорости воспроизведения звука по
                             телеметрии
         :param sens_left:
@@ -447,90 +766,213 @@ class Telemetry(object):
                             ..., 8000, 11025, 16000, 22050, 44100, ...
         :param sampwidth:   Байт, длина сэмпла:
                             2B = 16 bit per sample (1, 2, 3, 4 B)
-        :param nchannels:   MONO=1; STEREO=2
+        :param nchannels:   MONO=1; STEREO=2 (для param=STEREO - всегда 2)
+        :param jobs:        число процессов создания длинных аудиофайлов.
+                            None - по числу процессоров
+        :param wave_format: сэмплы целые (tlm2wav_render.WAVE_FORMAT_PCM)
+                            или 32-битные с плавающей точкой
+                            (tlm2wav_render.WAVE_FORMAT_IEEE_FLOAT)
+        :param interpolation: способ интерполяции телеметрии между
+                            отсчётами: 'linear', 'cubic', 'sinc'
+                            (см. tlm2wav_render.INTERPOLATIONS)
+        :param pitch_range: диапазон частот тона (наименьшая, наибольшая),
+                            Гц, в режиме PITCH
         :return:
         """
-        # Получить телеметрию
-        times = self.get_tlm(TIME).copy()
-        if param == LEFT | RIGHT:
-            # Среднее по правой и левой
-            values = 0.5*(self.get_tlm(LEFT, sens_left, sens_right)
-                          + self.get_tlm(RIGHT, sens_left, sens_right)).copy()
-        else:
-            values = self.get_tlm(param, sens_left, sens_right).copy()
-
-        # Максимальная громкость - максимальное число со знаком,
-        # которое может быть записано в сэмпл / в заданном числе байт 0x7F...FFF
-        max_vol = 2**(sampwidth*8-1)-1
-        # Исключение - 8битный сэмпл, который использует беззнаковые целые числа
-        if sampwidth == 1:
-            max_vol = 2**8-1
-            sample_fmt = struct.Struct('B')
-        # 16-битный
-        elif sampwidth == 2:
-            sample_fmt = struct.Struct('<h')
-        # 24-битный
-        elif sampwidth == 3:
-            raise NotImplementedError(
-                'Не реализована запись 24-битовых целых со знаком')
-        # 32-битный
-        elif sampwidth == 4:
-            sample_fmt = struct.Struct('<i')
-        else:
-            raise Exception(
-                'Некорректная длина сэмпла: должна быть 1, 2, 3, 4 Байта')
-
-        # Нормировать абсолютный максимум амплитуды к максимальной громкости
-        values = values/np.max(np.abs(values))*max_vol
-        # Привести массив времени к ускоренному виду - сжав в указанное число раз
-        times /= multiplier
-
-        # Определить длительность и число фреймов
-        duration = np.max(times)  # длительность в секундах (после умножения)
-        nframes = int(duration*framerate)
-
-        # Создать аудио-файл
-        with wave.open(outfile, 'wb') as wav:
-            # Установить параметры
-            wav.setnchannels(nchannels)
-            wav.setsampwidth(sampwidth)
-            wav.setframerate(framerate)
-            # Записать фреймы звука
-            for frame in range(nframes):
-                # Момент, соответствующий текущему фрейму
-                time = frame/framerate
-                # Амплитуда для этого фрейма
-                value = np.interp(time)
-                # В этом случае амплитуда от 0 до 255,
-                # отрицательные инвертировать.
-                if sampwidth == 1:
-                    value = np.abs(value, times, values)
-                # write the audio frames to file
-                wav.writeframesraw(sample_fmt.pack(int(value)))
+        # Создать аудио-файл: телеметрия калибруется и усредняется по
+        # блокам строк при создании звука
+        tlm2wav_render.render_wav(outfile,
+                                  self.sound_blocks(param, sens_left,
+                                                    sens_right),
+                                  multiplier=multiplier,
+                                  framerate=framerate,
+                                  sampwidth=sampwidth,
+                                  nchannels=nchannels,
+                                  jobs=jobs,
+                                  wave_format=wave_format,
+                                  interpolation=interpolation,
+                                  pitch=pitch_range if param & PITCH
+                                  else None)
         return os.path.exists(outfile)
 
-def read_tlm(file, mode=LEFT | RIGHT, sens_left=2, sens_right=1):
+
+class SoundValues(tlm2wav_render.TlmBlocks):
+    """ Телеметрия для создания звука (см. Telemetry.sound_blocks).
+
+    Значения калибруются и усредняются по блокам строк - при создании
+    каждого блока фреймов, поэтому массивов во всю длину телеметрии не
+    создаётся: столбцы, отображённые в память (STORAGE_MEMMAP), читаются
+    с диска по мере создания звука.
+
+    Столбцы и опорные точки калибровки запоминаются при создании объекта:
+    последующие изменения калибровки и дочитывание файла (в режиме
+    слежения) на него не влияют.
+    """
+    def __init__(self, tlm, param=LEFT | RIGHT, sens_left=2, sens_right=1):
+        """
+        :param tlm: Telemetry
+        Остальные параметры - как у Telemetry.sound_values()
+        """
+        param &= ~PITCH
+        self.stereo = param == STEREO
+        # Среднее по правой и левой
+        self._average = param == LEFT | RIGHT
+        frames = (LEFT, RIGHT) if self.stereo or self._average else (param,)
+        self._tlm = tlm
+        self._time = tlm.tlm[TIME]
+        # Каналы: (ключ столбца, столбец, калибруется ли, опорные точки)
+        self._channels = []
+        for frame in frames:
+            key = tlm._param_key(frame, sens_left, sens_right)
+            calib = frame == LEFT or frame == RIGHT
+            self._channels.append(
+                (key, tlm.tlm[key], calib,
+                 tlm._calib_points(frame) if calib else None))
+
+    @property
+    def size(self):
+        return len(self._time)
+
+    def times(self, start, stop):
+        return self._tlm._to_float(TIME, self._time[start:stop])
+
+    def values(self, start, stop):
+        time = self._time[start:stop]
+        channels = [
+            self._tlm._calibrated(key, column[start:stop], time, points)
+            if calib else self._tlm._to_float(key, column[start:stop])
+            for key, column, calib, points in self._channels]
+        if self.stereo:
+            return tuple(channels)
+        if self._average:
+            return 0.5*(channels[0] + channels[1])
+        return channels[0]
+
+    def search(self, t):
+        return int(np.searchsorted(self._time,
+                                   self._tlm._time_bound(t, TI_START),
+                                   side='right'))
+
+
+def load_tlm(file, use_cache=None, storage=STORAGE_MEMORY, workdir=None,
+             progress=None, jobs=None, compact=False, sensors=None):
+    """ Загрузить телеметрию из кэша или разобрать *.txt файл
+    (и сохранить результат в кэш)
+
+    :param file:      путь к txt файлу с телеметрией
+    :param use_cache: использовать кэш разобранной телеметрии.
+                      По умолчанию - tlm2wav_cache.enabled()
+    :param storage:   STORAGE_MEMORY - столбцы в оперативной памяти;
+                      STORAGE_MEMMAP - столбцы записываются на диск по мере
+                      разбора и отображаются в память (без кэша - в каталог
+                      workdir)
+    :param workdir:   каталог для столбцов STORAGE_MEMMAP без кэша.
+                      По умолчанию - новый временный каталог
+    :param progress:  функция progress(offset, size) - см. _iter_tlm_blocks
+    :param jobs:      число процессов разбора - см. parse_tlm_txt
+    :param compact:   компактное хранение - см. parse_tlm_txt
+    :param sensors:   номера загружаемых датчиков - см. parse_tlm_txt
+    :return:          словарь вида parse_tlm_txt()
+    """
+    if storage not in (STORAGE_MEMORY, STORAGE_MEMMAP):
+        raise ValueError(
+            'Неизвестный способ хранения телеметрии storage={0}'.format(
+                storage))
+    if use_cache is None:
+        use_cache = tlm2wav_cache.enabled()
+    if not use_cache:
+        if storage == STORAGE_MEMMAP:
+            if workdir is None:
+                workdir = tempfile.mkdtemp(prefix='tlm2wav_')
+            return tlm2wav_cache.write_columns(
+                workdir, _tlm_keys(sensors),
+                _iter_tlm_blocks(file, progress, jobs, compact=compact,
+                                 sensors=sensors),
+                _tlm_dtypes(compact, sensors))
+        return parse_tlm_txt(file, progress, jobs, compact=compact,
+                             sensors=sensors)
+    cache = tlm2wav_cache.TlmCache()
+    # Компактные столбцы и столбцы части датчиков хранятся в кэше
+    # отдельными записями
+    variant = 'compact' if compact else None
+    key = cache.key(file, variant=variant)
+    tlm = cache.load(key)
+    if tlm is not None:
+        # Из записи со всеми столбцами выбираются нужные
+        return {name: tlm[name] for name in _tlm_keys(sensors)}
+    if sensors is not None:
+        variant = '{0}sensors={1}'.format(
+            variant + ',' if variant else '',
+            ''.join(str(sens) for sens in sorted(sensors)))
+        key = cache.key(file, variant=variant)
+        tlm = cache.load(key)
+        if tlm is not None:
+            return tlm
+    try:
+        if storage == STORAGE_MEMMAP:
+            return cache.store_blocks(
+                key, _tlm_keys(sensors),
+                _iter_tlm_blocks(file, progress, jobs, compact=compact,
+                                 sensors=sensors),
+                source=file, dtypes=_tlm_dtypes(compact, sensors))
+        tlm = parse_tlm_txt(file, progress, jobs, compact=compact,
+                            sensors=sensors)
+        cache.store(key, tlm, source=file)
+    except OSError:
+        # Недоступный кэш не мешает работе с телеметрией
+        if tlm is None:
+            return load_tlm(file, False, storage, workdir, progress, jobs,
+                            compact, sensors)
+    return tlm
+
+
+def read_tlm(file, mode=LEFT | RIGHT, sens_left=2, sens_right=1,
+             use_cache=None):
     """ Загрузить телеметрию
 
     :param file:  путь к txt файлу с телеметрией
-    :param mode:  загрузить информацию с левой/правой рамки
-                  или усреднить левую и правую:
-                  {LEFT, RIGHT, LEFT | RIGHT}
+    :param mode:  загрузить информацию с левой/правой рамки,
+                  усреднить левую и правую или обе рамки по отдельности:
+                  {LEFT, RIGHT, LEFT | RIGHT, STEREO}
     :param sens_left:   датчик, соответствующий левой рамке (1, 2, или 3)
     :param sens_right:  датчик, соответствующий правой рамке (1, 2, или 3)
+    :param use_cache:   использовать кэш разобранной телеметрии
     :return:      кортеж np.array-массивов вида (ВРЕМЯ, УГОЛ),
                   где 'угол' - в зависимости от значения аргумента 'mode'
+                  (для STEREO - пара массивов (левая рамка, правая рамка))
     """
-    tlm = parse_tlm_txt(file)
+    # Разбираются только столбцы датчиков, нужных для режима mode
+    tlm = load_tlm(file, use_cache,
+                   sensors=mode_sensors(mode, sens_left, sens_right))
     time = tlm[TIME]
-    left = tlm[sens_left]
-    right = tlm[sens_right]
+    mode &= ~PITCH
     if mode == LEFT:
-        return time, left
+        return time, tlm[sens_left]
     elif mode == RIGHT:
-        return time, right
+        return time, tlm[sens_right]
     elif mode == LEFT | RIGHT:
-        return time, (left+right)/2.0
+        return time, (tlm[sens_left]+tlm[sens_right])/2.0
+    elif mode == STEREO:
+        return time, (tlm[sens_left], tlm[sens_right])
+
+
+def mode_sensors(mode=LEFT | RIGHT, sens_left=2, sens_right=1):
+    """ Номера датчиков, телеметрия которых нужна в режиме mode
+
+    :param mode:       {LEFT, RIGHT, LEFT | RIGHT, STEREO}
+                       (флаг PITCH не учитывается)
+    :param sens_left:  датчик, соответствующий левой рамке (1, 2, или 3)
+    :param sens_right: датчик, соответствующий правой рамке (1, 2, или 3)
+    :return:           кортеж номеров датчиков
+    """
+    mode &= ~PITCH
+    if mode == LEFT:
+        return sens_left,
+    elif mode == RIGHT:
+        return sens_right,
+    elif mode == LEFT | RIGHT or mode == STEREO:
+        return sens_left, sens_right
+    raise ValueError('Неизвестный режим mode={0}'.format(mode))
 
 
 def make_demo():
@@ -579,89 +1021,112 @@ def make_demo():
             wav.writeframesraw(sample_fmt.pack(value))
 
 
-def parse_tlm_txt(path_tlm):
-    """ Считывание данных из *.txt файла телеметрии.
-    Возвращает numpy-массивы в словаре с ключами-константами:
-        TIME, 3, 2, 1
-
-    Пример *.txt файла с телеметрией:
-        Время    Угл. пр-ль 3  Угл. пр-ль 1  Угл/ пр-ль 2
-        * 0      086°07´58´´   234°24´15´´   269°20´26´´
-        500      086°07´58´´   227°46´06´´   274°44´45´´
-        ...
+def print_cache_info(cache):
+    """ Вывести содержимое кэша разобранной телеметрии
     """
-    re_tlm_format = re.compile(
-        r"""[*]?[ ]?(?P<t>\d+)[ ]+                        # TIME VALUE [MS]
-        (?P<s3d>\d{3})°(?P<s3m>\d{2})´(?P<s3s>\d{2})´´[ ]+ # SENSOR 3 [DMS] мета
-        (?P<s2d>\d{3})°(?P<s2m>\d{2})´(?P<s2s>\d{2})´´[ ]+ # SENSOR 1 [DMS] лев
-        (?P<s1d>\d{3})°(?P<s1m>\d{2})´(?P<s1s>\d{2})´´[ ]+ # SENSOR 2 [DMS] прав
-        """, re.VERBOSE)
-    # Output values
-    t = []
-    s3 = []
-    s1 = []
-    s2 = []
-    with open(path_tlm, 'r', encoding='utf8') as f:
-        for line in f:
-            match = re_tlm_format.search(line)
-            if not match:
-                continue
-            t.append(int(match.group('t'))/1000)
-            s3.append(int(match.group('s3d'))
-                      + int(match.group('s3m'))/60.0
-                      + int(match.group('s3s'))/3600.0)
-            s2.append(int(match.group('s2d'))
-                      + int(match.group('s2m'))/60.0
-                      + int(match.group('s2s'))/3600.0)
-            s1.append(int(match.group('s1d'))
-                      + int(match.group('s1m'))/60.0
-                      + int(match.group('s1s'))/3600.0)
-    return {TIME: np.array(t), 3: np.array(s3), 2: np.array(s2), 1: np.array(s1)}
+    entries = cache.entries()
+    print('Кэш телеметрии: {0}'.format(cache.directory))
+    for item in reversed(entries):
+        print('  {0} {1:10.1f} МБ  {2}'.format(
+            time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(item['used'])),
+            item['size'] / 2**20, item['source']))
+    print('Записей: {0}, всего {1:.1f} МБ из {2:.1f} МБ'.format(
+        len(entries), sum(item['size'] for item in entries) / 2**20,
+        cache.limit / 2**20))
 
 
 def main():
-    # Default arguments
-    src = 'input_demo.txt'
-    dst = 'output.wav'
-    mode = RIGHT
-    multiplier = 200
-    # Get command line args
-    if len(sys.argv) == 3:
-        src = sys.argv[1]
-        dst = sys.argv[2]
-    elif len(sys.argv) == 4:
-        src = sys.argv[1]
-        dst = sys.argv[2]
-        multiplier = int(sys.argv[3])
-    elif len(sys.argv) == 5:
-        src = sys.argv[1]
-        dst = sys.argv[2]
-        multiplier = int(sys.argv[3])
-        mode = int(sys.argv[4])
-    elif len(sys.argv) == 1:
-        pass
-    else:
-        print("Wrong args. Example of using:")
-        print(
-            "$ python tlm2wav_utils.py source.txt destination.wav 200 [1 or 2 or 3]")
-        print("\t200 - optional argument: multiplier"
-              "\n\t[1 or 2 or 3] - optional arguments."
-              "\n\t1 - use LEFT hand data."
-              "\n\t2 - use RIGHT hand data."
-              "\n\t3 - use mean value between LEFT and RIGHT hands.")
+    parser = argparse.ArgumentParser(
+        description='Создать аудиофайл *.wav из телеметрии *.txt',
+        epilog='Пример: $ python tlm2wav_utils.py source.txt destination.wav '
+               '200 2')
+    parser.add_argument('src', nargs='?', default='input_demo.txt',
+                        help='файл телеметрии')
+    parser.add_argument('dst', nargs='?', default='output.wav',
+                        help='создаваемый аудиофайл')
+    parser.add_argument('multiplier', nargs='?', type=int, default=200,
+                        help='множитель скорости воспроизведения')
+    parser.add_argument('mode', nargs='?', type=int, default=RIGHT,
+                        choices=tuple(
+                            mode | pitch
+                            for pitch in (0, PITCH)
+                            for mode in (LEFT, RIGHT, LEFT | RIGHT, STEREO)),
+                        metavar='mode',
+                        help='1 - по левой рамке, 2 - по правой рамке, '
+                             '3 - среднее по левой и правой рамкам, '
+                             '16 - стерео (левая рамка - канал 1, '
+                             'правая - канал 2); +32 - угол задаёт высоту '
+                             'тона, а не громкость (33, 34, 35, 48)')
+    parser.add_argument('--pitch-range', type=float, nargs=2,
+                        default=tlm2wav_render.PITCH_RANGE,
+                        metavar=('FMIN', 'FMAX'),
+                        help='диапазон частот тона, Гц, в режиме высоты тона '
+                             '(по умолчанию {0:g} {1:g})'.format(
+                                 *tlm2wav_render.PITCH_RANGE))
+    parser.add_argument('--no-cache', action='store_true',
+                        help='не использовать кэш разобранной телеметрии')
+    parser.add_argument('--storage', default=STORAGE_MEMORY,
+                        choices=(STORAGE_MEMORY, STORAGE_MEMMAP),
+                        help='хранение телеметрии: в памяти или в файлах, '
+                             'отображённых в память (для больших записей)')
+    parser.add_argument('--jobs', type=int, default=None,
+                        help='число процессов для разбора больших файлов '
+                             'и создания длинных аудиофайлов '
+                             '(по умолчанию - по числу процессоров)')
+    parser.add_argument('--format', default='16',
+                        choices=tuple(tlm2wav_render.SAMPLE_FORMATS),
+                        help='формат сэмплов: целые 8, 16, 24, 32 бит или '
+                             '32-битные с плавающей точкой (float32)')
+    parser.add_argument('--interpolation', default='linear',
+                        choices=tuple(tlm2wav_render.INTERPOLATIONS),
+                        help='интерполяция телеметрии между отсчётами: '
+                             'линейная, кубическая (Эрмита) или sinc '
+                             '(с ограничением полосы) - плавнее, но медленнее')
+    parser.add_argument('--compact', action='store_true',
+                        help='хранить время и углы целыми числами '
+                             '(мс и угловые секунды) - меньше памяти')
+    parser.add_argument('--cache-info', action='store_true',
+                        help='показать содержимое кэша и выйти')
+    parser.add_argument('--cache-clear', action='store_true',
+                        help='очистить кэш (телеметрии и звуков) и выйти')
+    args = parser.parse_args()
+
+    # Управление кэшем
+    if args.cache_info or args.cache_clear:
+        cache = tlm2wav_cache.TlmCache()
+        if args.cache_clear:
+            cache.clear()
+            print('Кэш телеметрии очищен: {0}'.format(cache.directory))
+            sounds = tlm2wav_render.SoundCache(use_disk=True)
+            sounds.clear()
+            print('Кэш звуков очищен: {0}'.format(sounds.disk.directory))
+        if args.cache_info:
+            print_cache_info(cache)
         return 0
 
     # Run...
     print("(!) Калибровка нулевого значения в телеметрии недоступна"
           "при работе в режиме командной строки.")
-    print('Создаётся аудиофайл "{0}" из телеметрии "{1}"...'.format(src, dst))
-    tlm = Telemetry(src)
-    tlm.make_sound(param=mode,
-                   multiplier=multiplier,
-                   sens_left=2,
-                   sens_right=1,
-                   outfile=dst)
-    print('Аудиофайл "{0}" успешно создан.'.format(dst))
+    print('Создаётся аудиофайл "{0}" из телеметрии "{1}"...'.format(
+        args.dst, args.src))
+    # Разбираются только столбцы датчиков, по которым создаётся звук
+    sens_left, sens_right = 2, 1
+    tlm = Telemetry(args.src, use_cache=False if args.no_cache else None,
+                    storage=args.storage, jobs=args.jobs,
+                    compact=args.compact,
+                    sensors=mode_sensors(args.mode, sens_left, sens_right))
+    sampwidth, wave_format = tlm2wav_render.SAMPLE_FORMATS[args.format]
+    tlm.make_sound(param=args.mode,
+                   multiplier=args.multiplier,
+                   sens_left=sens_left,
+                   sens_right=sens_right,
+                   outfile=args.dst,
+                   sampwidth=sampwidth,
+                   wave_format=wave_format,
+                   interpolation=args.interpolation,
+                   pitch_range=tuple(args.pitch_range),
+                   jobs=args.jobs)
+    print('Аудиофайл "{0}" успешно создан.'.format(args.dst))
     return 0
 
 